@@ -19,17 +19,340 @@
 # <pep8 compliant>
 
 import bpy
+import csv
+import fnmatch
+import hashlib
+import json
+import mmap
+import os
+import platform
+import re
+import shlex
+import shutil
+import subprocess
+import threading
 import time
+import wave
+import zlib
+from bisect import bisect_left
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
 from bpy.types import Operator
+from bpy.app.handlers import persistent
+from bpy_extras.io_utils import ExportHelper
 from operator import attrgetter
 from bpy.props import (
     IntProperty,
     BoolProperty,
     EnumProperty,
+    FloatProperty,
     StringProperty,
 )
 
 
+# -----------------------------------------------------------------------------
+# Timeline index
+#
+# Facts about the strips of the current editing level (used channels, strips
+# under a frame, selection count, gaps) are cached here instead of being
+# recomputed by every operator and panel draw. The index is split in parts
+# which are only rebuilt when their columns, re-read in bulk on every query,
+# differ from the cached ones. The load/undo handlers and the msgbus
+# subscriptions drop the parts those reads can't check (strip names).
+
+# Strip properties which move a strip in time or between channels.
+_INDEX_LAYOUT_PROPS = (
+    "name",
+    "channel",
+    "frame_start",
+    "frame_final_start",
+    "frame_final_end",
+    "frame_final_duration",
+    "frame_offset_start",
+    "frame_offset_end",
+)
+_INDEX_FLAG_PROPS = ("lock", "mute")
+
+
+def _strip_rna_types():
+    strip_types = []
+    for name in dir(bpy.types):
+        if not name.endswith("Sequence"):
+            continue
+        cls = getattr(bpy.types, name)
+        if isinstance(cls, type) and issubclass(cls, bpy.types.Sequence):
+            strip_types.append(cls)
+    return strip_types
+
+
+def _editing_sequences(scene):
+    ed = scene.sequence_editor if scene else None
+    if ed is None:
+        return None, None
+    if ed.meta_stack:
+        meta = ed.meta_stack[-1]
+        return meta.sequences, meta.name
+    return ed.sequences, None
+
+
+class TimelineIndex:
+    """Cached facts about the strips of the current editing level"""
+
+    def __init__(self):
+        # Increased every time a cached part is dropped, callers holding on to
+        # query results can compare it to know when they went stale.
+        self.version = 0
+        self._key = None
+        self._layout = None
+        self._flags = None
+        self._select = None
+
+    def tag(self, layout=True, flags=True):
+        if layout:
+            self._layout = None
+        if flags:
+            self._flags = None
+        self.version += 1
+
+    def _validate(self, scene):
+        sequences, level = _editing_sequences(scene)
+        if sequences is None:
+            if self._key is not None:
+                self._key = None
+                self.tag()
+            return None
+        key = (scene.name, level)
+        if key != self._key:
+            self._key = key
+            self.tag()
+        return sequences
+
+    def _layout_part(self, sequences):
+        # Strips moved from Python inside the running operator are neither
+        # published on the message bus nor seen by the depsgraph before it
+        # returns, so the columns are read on every query. Strips deleted and
+        # added in place of others can leave the columns equal, the pointers
+        # tell which strips they are. Names are only read when either changed.
+        count = len(sequences)
+        pointers = np.fromiter((s.as_pointer() for s in sequences), dtype=np.uintp, count=count)
+        channel = np.empty(count, dtype=np.int32)
+        start = np.empty(count, dtype=np.int32)
+        end = np.empty(count, dtype=np.int32)
+        sequences.foreach_get("channel", channel)
+        sequences.foreach_get("frame_final_start", start)
+        sequences.foreach_get("frame_final_end", end)
+        layout = self._layout
+        if (layout is None or not np.array_equal(pointers, layout["pointers"])
+                or not np.array_equal(channel, layout["channel"])
+                or not np.array_equal(start, layout["start"]) or not np.array_equal(end, layout["end"])):
+            if layout is not None:
+                self.version += 1
+            self._layout = {
+                "names": [s.name for s in sequences],
+                "pointers": pointers,
+                "channel": channel,
+                "start": start,
+                "end": end,
+            }
+        return self._layout
+
+    def _flags_part(self, sequences):
+        count = len(sequences)
+        lock = np.empty(count, dtype=bool)
+        mute = np.empty(count, dtype=bool)
+        sequences.foreach_get("lock", lock)
+        sequences.foreach_get("mute", mute)
+        flags = self._flags
+        if flags is None or not np.array_equal(lock, flags["lock"]) or not np.array_equal(mute, flags["mute"]):
+            if flags is not None:
+                self.version += 1
+            self._flags = {"lock": lock, "mute": mute}
+        return self._flags
+
+    def _select_part(self, sequences):
+        # Selection is changed by C operators which neither tag the depsgraph
+        # nor publish on the message bus, so it is re-read on every query.
+        # This is a single bulk read and only bumps the version on change.
+        select = np.empty(len(sequences), dtype=bool)
+        sequences.foreach_get("select", select)
+        if self._select is None or not np.array_equal(select, self._select):
+            self._select = select
+            self.version += 1
+        return self._select
+
+    def names(self, scene):
+        sequences = self._validate(scene)
+        if sequences is None:
+            return []
+        return list(self._layout_part(sequences)["names"])
+
+    def used_channels(self, scene):
+        sequences = self._validate(scene)
+        if sequences is None:
+            return []
+        return np.unique(self._layout_part(sequences)["channel"]).tolist()
+
+    def free_channel(self, scene):
+        """First channel above all strips, 1 on an empty timeline"""
+        channels = self.used_channels(scene)
+        return channels[-1] + 1 if channels else 1
+
+    def top_free_channel(self, scene, start, end, top=32):
+        """Highest channel without strips between start and end, None if there is none"""
+        sequences = self._validate(scene)
+        if sequences is None:
+            return top
+        layout = self._layout_part(sequences)
+        overlap = (layout["start"] < end) & (layout["end"] > start)
+        used = set(layout["channel"][overlap].tolist())
+        for channel in range(top, 0, -1):
+            if channel not in used:
+                return channel
+        return None
+
+    def strips_at_frame(self, scene, frame, include_end=False):
+        sequences = self._validate(scene)
+        if sequences is None:
+            return []
+        layout = self._layout_part(sequences)
+        if include_end:
+            mask = (layout["start"] <= frame) & (layout["end"] >= frame)
+        else:
+            mask = (layout["start"] <= frame) & (layout["end"] > frame)
+        names = layout["names"]
+        return [names[i] for i in np.flatnonzero(mask)]
+
+    def frame_hits(self, scene, frames, weights):
+        """Return [(name, hits, weight)] of strips covering any of the frames.
+
+        hits counts the frames a strip covers and weight sums their weights.
+        """
+        sequences = self._validate(scene)
+        if sequences is None or not len(frames):
+            return []
+        layout = self._layout_part(sequences)
+        order = np.argsort(frames, kind="stable")
+        frames = np.asarray(frames)[order]
+        cumulative = np.concatenate(([0.0], np.cumsum(np.asarray(weights, dtype=np.float64)[order])))
+        lo = np.searchsorted(frames, layout["start"], side="left")
+        hi = np.searchsorted(frames, layout["end"], side="left")
+        names = layout["names"]
+        return [
+            (names[i], int(hi[i] - lo[i]), float(cumulative[hi[i]] - cumulative[lo[i]]))
+            for i in np.flatnonzero(hi > lo)
+        ]
+
+    def selected_count(self, scene):
+        sequences = self._validate(scene)
+        if sequences is None:
+            return 0
+        return int(np.count_nonzero(self._select_part(sequences)))
+
+    def selected_channels(self, scene):
+        sequences = self._validate(scene)
+        if sequences is None:
+            return []
+        layout = self._layout_part(sequences)
+        return np.unique(layout["channel"][self._select_part(sequences)]).tolist()
+
+    def locked_names(self, scene):
+        sequences = self._validate(scene)
+        if sequences is None:
+            return []
+        names = self._layout_part(sequences)["names"]
+        return [names[i] for i in np.flatnonzero(self._flags_part(sequences)["lock"])]
+
+    def muted_names(self, scene):
+        sequences = self._validate(scene)
+        if sequences is None:
+            return []
+        names = self._layout_part(sequences)["names"]
+        return [names[i] for i in np.flatnonzero(self._flags_part(sequences)["mute"])]
+
+    def edit_points(self, scene):
+        """Sorted frames where a strip starts or ends"""
+        sequences = self._validate(scene)
+        if sequences is None:
+            return []
+        layout = self._layout_part(sequences)
+        return np.unique(np.concatenate((layout["start"], layout["end"]))).tolist()
+
+    def gaps(self, scene, channel):
+        """(start, end) frame ranges between the strips of a channel"""
+        sequences = self._validate(scene)
+        if sequences is None:
+            return []
+        layout = self._layout_part(sequences)
+        mask = layout["channel"] == channel
+        start = layout["start"][mask]
+        end = layout["end"][mask]
+        order = np.argsort(start, kind="stable")
+        start = start[order]
+        reach = np.maximum.accumulate(end[order])
+        gap = start[1:] > reach[:-1]
+        return list(zip(reach[:-1][gap].tolist(), start[1:][gap].tolist()))
+
+
+def _timeline_index_subscribe():
+    # Renames are the only change the bulk column reads don't catch.
+    bpy.msgbus.clear_by_owner(timeline_index)
+    for cls in _strip_rna_types():
+        bpy.msgbus.subscribe_rna(
+            key=(cls, "name"),
+            owner=timeline_index,
+            args=(),
+            notify=_timeline_index_notify,
+        )
+
+
+def _timeline_index_notify():
+    timeline_index.tag(layout=True, flags=False)
+
+
+@persistent
+def _timeline_index_load_post(*args):
+    timeline_index.tag()
+    # The message bus is cleared when a file is loaded.
+    _timeline_index_subscribe()
+
+
+@persistent
+def _timeline_index_undo(*args):
+    timeline_index.tag()
+
+
+timeline_index = TimelineIndex()
+
+
+# -----------------------------------------------------------------------------
+# Selection save/restore
+#
+# Operators which run other operators on one strip at a time save the
+# selection by strip name (Python references don't survive strips being cut or
+# deleted) and restore it with one bulk write of the select flags.
+
+def selection_save(sequences):
+    """Names of the selected strips of a strip collection"""
+    select = np.empty(len(sequences), dtype=bool)
+    sequences.foreach_get("select", select)
+    return [sequences[int(i)].name for i in np.flatnonzero(select)]
+
+
+def selection_mask(sequences, names):
+    wanted = set(names)
+    return np.fromiter((s.name in wanted for s in sequences), dtype=bool, count=len(sequences))
+
+
+def selection_restore(sequences, names, extend=False):
+    """Select the strips with the given names, strips which no longer exist are skipped"""
+    mask = selection_mask(sequences, names)
+    if extend:
+        select = np.empty(len(sequences), dtype=bool)
+        sequences.foreach_get("select", select)
+        mask |= select
+    sequences.foreach_set("select", mask)
+
+
 class SEQUENCER_OT_CrossfadeSounds(Operator):
     """Do cross-fading volume animation of two selected sound strips"""
 
@@ -123,6 +446,165 @@ class SEQUENCER_OT_CutMulticam(Operator):
         return {'FINISHED'}
 
 
+# Strip properties which only affect drawing or editing, not the rendered
+# image, so a bulk write of them doesn't need to free the sequencer cache.
+_BULK_NO_REFRESH = {
+    "select", "select_left_handle", "select_right_handle", "lock", "show_waveform",
+}
+
+
+def bulk_property_set(scene, data_path, value=True, toggle=False, selected_only=True,
+                      channel=0, strip_types=None, recursive=True):
+    """Set a boolean or numeric property of many strips at once.
+
+    Strips are filtered by selection, channel (0 for any) and type, strips
+    without the property are skipped. Strips are written per level, the top
+    level and the content of every meta strip, since those are the only strip
+    collections. A level where every strip has the property is written with a
+    single foreach_set, others strip by strip.
+    Returns the number of strips which were set.
+    """
+    if recursive:
+        levels = [scene.sequence_editor.sequences]
+        for sequences in levels:
+            levels.extend(s.sequences for s in sequences if s.type == 'META')
+    else:
+        levels = [_editing_sequences(scene)[0]]
+
+    prop = dtype = None
+    total = 0
+    written = False
+    for sequences in levels:
+        count = len(sequences)
+        if not count:
+            continue
+        has_prop = np.fromiter((data_path in s.bl_rna.properties for s in sequences), dtype=bool, count=count)
+        mask = has_prop.copy()
+        if selected_only:
+            select = np.empty(count, dtype=bool)
+            sequences.foreach_get("select", select)
+            mask &= select
+        if channel:
+            channels = np.empty(count, dtype=np.int32)
+            sequences.foreach_get("channel", channels)
+            mask &= channels == channel
+        if strip_types:
+            mask &= np.fromiter((s.type in strip_types for s in sequences), dtype=bool, count=count)
+
+        indices = np.flatnonzero(mask)
+        if not len(indices):
+            continue
+
+        if prop is None:
+            prop = sequences[int(indices[0])].bl_rna.properties[data_path]
+            dtype = {'BOOLEAN': bool, 'INT': np.int32, 'FLOAT': np.float32}.get(prop.type)
+            if dtype is None or prop.is_readonly or getattr(prop, "array_length", 0):
+                raise TypeError("'%s' is not a boolean or numeric strip property" % data_path)
+            if toggle and dtype is not bool:
+                raise TypeError("Only boolean properties can be toggled")
+
+        total += len(indices)
+        if has_prop.all():
+            column = np.empty(count, dtype=dtype)
+            sequences.foreach_get(data_path, column)
+            if toggle:
+                column[mask] = ~column[mask]
+            elif dtype is bool:
+                column[mask] = bool(value)
+            else:
+                column[mask] = np.clip(value, prop.hard_min, prop.hard_max)
+            sequences.foreach_set(data_path, column)
+            written = True
+        else:
+            for i in indices:
+                strip = sequences[int(i)]
+                if toggle:
+                    setattr(strip, data_path, not getattr(strip, data_path))
+                elif dtype is bool:
+                    setattr(strip, data_path, bool(value))
+                else:
+                    setattr(strip, data_path, type(getattr(strip, data_path))(value))
+
+    # foreach_set skips the RNA update callbacks.
+    if written:
+        if data_path in _INDEX_LAYOUT_PROPS or data_path in _INDEX_FLAG_PROPS:
+            timeline_index.tag()
+        if data_path not in _BULK_NO_REFRESH:
+            bpy.ops.sequencer.refresh_all()
+    return total
+
+
+class SEQUENCER_OT_BulkPropertySet(Operator):
+    """Set a property of all strips matching a filter"""
+
+    bl_idname = "sequencer.bulk_property_set"
+    bl_label = "Set Strip Property"
+    bl_options = {'REGISTER', 'UNDO'}
+
+    data_path: StringProperty(
+        name="Property",
+        description="Identifier of a boolean or numeric strip property",
+    )
+    action: EnumProperty(
+        name="Action", description="Action",
+        items=(
+            ('SET', "Set", "Set the property to the value"),
+            ('TOGGLE', "Toggle", "Toggle a boolean property per strip"),
+        ),
+    )
+    value: FloatProperty(
+        name="Value",
+        description="New value, booleans are set when not zero",
+        default=1.0,
+    )
+    selected_only: BoolProperty(
+        name="Only Selected",
+        default=True,
+        description="Only apply to selected strips",
+    )
+    channel: IntProperty(
+        name="Channel",
+        min=0, max=32,
+        default=0,
+        description="Only apply to strips in this channel, 0 for all channels",
+    )
+    strip_type: StringProperty(
+        name="Strip Type",
+        description="Only apply to strips of this type (e.g. MOVIE), empty for all types",
+    )
+    recursive: BoolProperty(
+        name="Include Meta Strips Content",
+        default=True,
+        description="Also apply to the strips inside meta strips",
+    )
+
+    @classmethod
+    def poll(cls, context):
+        return (context.scene and context.scene.sequence_editor)
+
+    def invoke(self, context, event):
+        return context.window_manager.invoke_props_dialog(self)
+
+    def execute(self, context):
+        value = self.value
+        if self.action == 'SET' and value == int(value):
+            value = int(value)
+        try:
+            bulk_property_set(
+                context.scene, self.data_path,
+                value=value,
+                toggle=self.action == 'TOGGLE',
+                selected_only=self.selected_only,
+                channel=self.channel,
+                strip_types={self.strip_type} if self.strip_type else None,
+                recursive=self.recursive,
+            )
+        except TypeError as ex:
+            self.report({'ERROR'}, str(ex))
+            return {'CANCELLED'}
+        return {'FINISHED'}
+
+
 class SEQUENCER_OT_DeinterlaceSelectedMovies(Operator):
     """Deinterlace all selected movie sources"""
 
@@ -135,9 +617,7 @@ class SEQUENCER_OT_DeinterlaceSelectedMovies(Operator):
         return (context.scene and context.scene.sequence_editor)
 
     def execute(self, context):
-        for s in context.scene.sequence_editor.sequences_all:
-            if s.select and s.type == 'MOVIE':
-                s.use_deinterlace = True
+        bulk_property_set(context.scene, "use_deinterlace", strip_types={'MOVIE'})
         return {'FINISHED'}
 
 
@@ -153,11 +633,9 @@ class SEQUENCER_OT_ReverseSelectedMovies(Operator):
         return (context.scene and context.scene.sequence_editor)
 
     def execute(self, context):
-        for s in context.scene.sequence_editor.sequences_all:
-            if s.select and s.type == 'MOVIE':
-                s.use_reverse_frames = True
+        bulk_property_set(context.scene, "use_reverse_frames", strip_types={'MOVIE'})
         return {'FINISHED'}
-        
+
 
 class SEQUENCER_OT_FlipXSelectedMovies(Operator):
     """Flip X of all selected movie sources"""
@@ -171,9 +649,7 @@ class SEQUENCER_OT_FlipXSelectedMovies(Operator):
         return (context.scene and context.scene.sequence_editor)
 
     def execute(self, context):
-        for s in context.scene.sequence_editor.sequences_all:
-            if s.select and s.type == 'MOVIE':
-                s.use_flip_x = True
+        bulk_property_set(context.scene, "use_flip_x", strip_types={'MOVIE'})
         return {'FINISHED'}
 
 
@@ -189,12 +665,10 @@ class SEQUENCER_OT_FlipYSelectedMovies(Operator):
         return (context.scene and context.scene.sequence_editor)
 
     def execute(self, context):
-        for s in context.scene.sequence_editor.sequences_all:
-            if s.select and s.type == 'MOVIE':
-                s.use_flip_y = True
+        bulk_property_set(context.scene, "use_flip_y", strip_types={'MOVIE'})
         return {'FINISHED'}
 
-        
+
 class SEQUENCER_OT_ShowWaveformSelectedSounds(Operator):
     """Toggle draw waveform of all selected audio sources"""
 
@@ -207,17 +681,10 @@ class SEQUENCER_OT_ShowWaveformSelectedSounds(Operator):
         return (context.scene and context.scene.sequence_editor)
 
     def execute(self, context):
+        bulk_property_set(context.scene, "show_waveform", toggle=True, strip_types={'SOUND'})
+        return {'FINISHED'}
 
-        for strip in context.scene.sequence_editor.sequences_all:
-            if strip.select and strip.type == 'SOUND':
-                if (strip.show_waveform is False):
-                    strip.show_waveform = True
-                elif (strip.show_waveform is True):
-                    strip.show_waveform = False    
-
-        return {'FINISHED'}     
 
-        
 class SEQUENCER_OT_SelectTimeCursor(bpy.types.Operator):
     """Select strips at current frame"""
     
@@ -238,36 +705,24 @@ class SEQUENCER_OT_SelectTimeCursor(bpy.types.Operator):
         return bpy.context.area.type=='SEQUENCE_EDITOR' and bpy.context.scene.sequence_editor is not None
 
     def execute(self, context):
-        cFrame = bpy.context.scene.frame_current
-        selStrips = []
-        lockNum = 0                                     
-        lockSelNum = 0                                      
-        reportMessage = ""
+        scene = context.scene
+        cFrame = scene.frame_current
+        sequences, _level = _editing_sequences(scene)
         if self.extent == "FALSE": bpy.ops.sequencer.select_all(action='DESELECT')
-        for strip in bpy.context.sequences:
-            if strip.lock and strip.select:                         
-                lockSelNum += 1
+        for name in timeline_index.strips_at_frame(scene, cFrame, include_end=True):
+            strip = sequences[name]
+            if strip.lock and not strip.select:
+                continue
+            strip.select = True
             try:
-                if strip.frame_final_end >= cFrame:
-                    if strip.frame_final_start <= cFrame:
-                        if strip.lock and not strip.select:
-                            lockNum += 1
-                        else:
-                            strip.select=True               
-                            selStrips.append(strip)
+                if strip.frame_final_end == cFrame:
+                    strip.select_right_handle = True
+                elif strip.frame_final_start == cFrame:
+                    strip.select_left_handle = True
             except:
                 pass
-        if selStrips != []:
-            for strip in selStrips:
-                try:
-                    if strip.frame_final_end == cFrame:
-                        strip.select_right_handle = True
-                    elif strip.frame_final_start == cFrame:
-                        strip.select_left_handle = True
-                except:
-                    pass
-            
-        return {"FINISHED"}     
+
+        return {"FINISHED"}
 
 
 class SEQUENCER_OT_SelectChannel(Operator):
@@ -282,20 +737,17 @@ class SEQUENCER_OT_SelectChannel(Operator):
         return (context.scene and context.scene.sequence_editor)
 
     def execute(self, context):
-        selection = bpy.context.selected_sequences
-        if not selection:
+        channels = set(timeline_index.selected_channels(context.scene))
+        if not channels:
             return {'CANCELLED'}
 
-        selection = sorted(selection, key=attrgetter('channel', 'frame_final_start'))
-
         sequences = bpy.context.scene.sequence_editor.sequences_all
-        
-        for s in selection:
-            for strip in sequences:        
-                if s.channel == strip.channel:      
-                    strip.select = strip.channel == s.channel
-                    
-        return {'FINISHED'}        
+
+        for strip in sequences:
+            if strip.channel in channels:
+                strip.select = True
+
+        return {'FINISHED'}
     
 
 class SEQUENCER_OT_SelectAllLockedStrips(bpy.types.Operator):
@@ -312,15 +764,13 @@ class SEQUENCER_OT_SelectAllLockedStrips(bpy.types.Operator):
         return False
 
     def execute(self, context):
-        lockedStrips = []
-        for strip in bpy.context.sequences:
-            if strip.lock:
-                lockedStrips.append(strip)
+        sequences, _level = _editing_sequences(context.scene)
+        lockedStrips = timeline_index.locked_names(context.scene)
         try:
             if lockedStrips != []:
                 bpy.ops.sequencer.select_all(action='DESELECT')
-                for strip in lockedStrips:
-                    strip.select = True
+                for name in lockedStrips:
+                    sequences[name].select = True
         except:
             pass
 
@@ -341,21 +791,504 @@ class SEQUENCER_OT_SelectAllMuteStrips(bpy.types.Operator):
         return False
 
     def execute(self, context):
-        muteStrips = []
-        for strip in bpy.context.sequences:
-            if strip.mute:
-                muteStrips.append(strip)
+        sequences, _level = _editing_sequences(context.scene)
+        muteStrips = timeline_index.muted_names(context.scene)
         try:
             if muteStrips != []:
                 bpy.ops.sequencer.select_all(action='DESELECT')
-                for strip in muteStrips:
-                    strip.select = True
+                for name in muteStrips:
+                    sequences[name].select = True
         except:
             pass
 
         return {'FINISHED'}
 
 
+# -----------------------------------------------------------------------------
+# Strip queries
+#
+# A small query language for selecting strips by their attributes, e.g.:
+#
+#   type == MOVIE and duration > 10s and modifiers > 2 and channel in 3..5
+#   name ~ "interview*" or prop.take >= 3
+#
+# Queries are compiled once into a predicate over columns of strip attributes,
+# the columns are read in bulk (foreach_get where possible) and only the ones
+# the query uses are read.
+
+_QUERY_TOKEN = re.compile(
+    r"\s*(?:"
+    r"(?P<number>\d+(?:\.\d+)?)(?P<unit>s|f)?\b|"
+    r"(?P<range>\.\.)|"
+    r"(?P<op>==|!=|<=|>=|<|>|~|=)|"
+    r"(?P<punct>[(),\[\]])|"
+    r"(?P<string>\"[^\"]*\"|'[^']*')|"
+    r"(?P<word>[A-Za-z_][A-Za-z0-9_]*(?:\.[A-Za-z_][A-Za-z0-9_]*)?)"
+    r")"
+)
+
+_QUERY_COLUMNS = {
+    "channel": ("channel", np.int32),
+    "start": ("frame_final_start", np.int32),
+    "end": ("frame_final_end", np.int32),
+    "duration": ("frame_final_duration", np.int32),
+    "select": ("select", bool),
+    "lock": ("lock", bool),
+    "mute": ("mute", bool),
+}
+
+_QUERY_OPS = {
+    "==": np.equal,
+    "=": np.equal,
+    "!=": np.not_equal,
+    "<": np.less,
+    "<=": np.less_equal,
+    ">": np.greater,
+    ">=": np.greater_equal,
+}
+
+
+def _query_tokenize(text):
+    tokens = []
+    pos = 0
+    text = text.rstrip()
+    while pos < len(text):
+        match = _QUERY_TOKEN.match(text, pos)
+        if match is None or match.end() == pos:
+            raise ValueError("Unexpected character %r in query" % text[pos:].strip()[:1])
+        pos = match.end()
+        kind = match.lastgroup if match.lastgroup != "unit" else "number"
+        if kind == "number":
+            tokens.append(("number", (float(match.group("number")), match.group("unit") or "f")))
+        elif kind == "string":
+            tokens.append(("string", match.group("string")[1:-1]))
+        else:
+            tokens.append((kind, match.group(kind)))
+    return tokens
+
+
+class _QueryParser:
+
+    def __init__(self, text):
+        self.tokens = _query_tokenize(text)
+        self.pos = 0
+
+    def peek(self, value=None):
+        if self.pos >= len(self.tokens):
+            return None
+        token = self.tokens[self.pos]
+        if value is not None and token[1] != value:
+            return None
+        return token
+
+    def take(self, value=None):
+        token = self.peek(value)
+        if token is None:
+            expected = repr(value) if value else "more input"
+            raise ValueError("Expected %s in query" % expected)
+        self.pos += 1
+        return token
+
+    def parse(self):
+        node = self.parse_or()
+        if self.peek() is not None:
+            raise ValueError("Unexpected %r in query" % (self.peek()[1],))
+        return node
+
+    def parse_or(self):
+        node = self.parse_and()
+        while self.peek("or"):
+            self.take()
+            node = ("or", node, self.parse_and())
+        return node
+
+    def parse_and(self):
+        node = self.parse_not()
+        while self.peek("and"):
+            self.take()
+            node = ("and", node, self.parse_not())
+        return node
+
+    def parse_not(self):
+        if self.peek("not"):
+            self.take()
+            return ("not", self.parse_not())
+        if self.peek("("):
+            self.take()
+            node = self.parse_or()
+            self.take(")")
+            return node
+        return self.parse_comparison()
+
+    def parse_field(self):
+        if self.peek("["):
+            self.take()
+            key = self.take()
+            self.take("]")
+            return "prop." + str(key[1])
+        kind, value = self.take()
+        if kind != "word":
+            raise ValueError("Expected a strip attribute, got %r" % (value,))
+        return value
+
+    def parse_value(self):
+        kind, value = self.take()
+        if kind == "word":
+            if value in {"true", "True"}:
+                return True
+            if value in {"false", "False"}:
+                return False
+            return value
+        if kind in {"number", "string"}:
+            return value
+        raise ValueError("Expected a value, got %r" % (value,))
+
+    def parse_comparison(self):
+        field = self.parse_field()
+        if self.peek("in"):
+            self.take()
+            if self.peek("("):
+                self.take()
+                values = [self.parse_value()]
+                while self.peek(","):
+                    self.take()
+                    values.append(self.parse_value())
+                self.take(")")
+                return ("in", field, values)
+            low = self.parse_value()
+            self.take("..")
+            return ("range", field, low, self.parse_value())
+        if self.peek() is None or self.peek()[0] != "op":
+            # A bare boolean attribute, e.g. "lock and not mute".
+            return ("cmp", field, "==", True)
+        op = self.take()[1]
+        return ("cmp", field, op, self.parse_value())
+
+
+class _StripColumns:
+    """Lazily read attribute columns of a strip collection"""
+
+    def __init__(self, sequences, fps):
+        self.sequences = sequences
+        self.count = len(sequences)
+        self.fps = fps
+        self._cache = {}
+
+    def __getitem__(self, field):
+        column = self._cache.get(field)
+        if column is None:
+            column = self._cache[field] = self._read(field)
+        return column
+
+    def _read(self, field):
+        sequences = self.sequences
+        if field in _QUERY_COLUMNS:
+            attr, dtype = _QUERY_COLUMNS[field]
+            column = np.empty(self.count, dtype=dtype)
+            sequences.foreach_get(attr, column)
+            return column
+        if field in {"type", "name"}:
+            return np.array([getattr(s, field) for s in sequences], dtype=object)
+        if field == "modifiers":
+            return np.fromiter((len(s.modifiers) for s in sequences), dtype=np.int32, count=self.count)
+        if field.startswith("prop."):
+            key = field[5:]
+            return np.array([s.get(key) for s in sequences], dtype=object)
+        return np.array([getattr(s, field, None) for s in sequences], dtype=object)
+
+
+def _query_value(value, columns):
+    if isinstance(value, tuple):
+        number, unit = value
+        return number * columns.fps if unit == "s" else number
+    return value
+
+
+def _query_compare(column, op, value):
+    if op == "~":
+        pattern = str(value)
+        return np.fromiter(
+            (v is not None and fnmatch.fnmatchcase(str(v), pattern) for v in column),
+            dtype=bool, count=len(column),
+        )
+    func = _QUERY_OPS[op]
+    if column.dtype != object:
+        if isinstance(value, str):
+            return np.full(len(column), op == "!=", dtype=bool)
+        return func(column, value)
+
+    def compare(v):
+        try:
+            return bool(func(v, value))
+        except TypeError:
+            return op == "!="
+    return np.fromiter((compare(v) for v in column), dtype=bool, count=len(column))
+
+
+def _query_build(node):
+    kind = node[0]
+    if kind in {"and", "or"}:
+        left, right = _query_build(node[1]), _query_build(node[2])
+        if kind == "and":
+            return lambda columns: left(columns) & right(columns)
+        return lambda columns: left(columns) | right(columns)
+    if kind == "not":
+        operand = _query_build(node[1])
+        return lambda columns: ~operand(columns)
+
+    field = node[1]
+    if field == "type":
+        # Strip types are upper case enum identifiers.
+        upper = lambda v: v.upper() if isinstance(v, str) else v
+        if kind == "in":
+            node = (kind, field, [upper(v) for v in node[2]])
+        elif kind == "cmp" and node[2] != "~":
+            node = (kind, field, node[2], upper(node[3]))
+
+    if kind == "range":
+        low, high = node[2], node[3]
+        return lambda columns: (
+            _query_compare(columns[field], ">=", _query_value(low, columns)) &
+            _query_compare(columns[field], "<=", _query_value(high, columns))
+        )
+    if kind == "in":
+        values = node[2]
+
+        def predicate(columns):
+            mask = np.zeros(columns.count, dtype=bool)
+            for value in values:
+                mask |= _query_compare(columns[field], "==", _query_value(value, columns))
+            return mask
+        return predicate
+
+    op, value = node[2], node[3]
+    return lambda columns: _query_compare(columns[field], op, _query_value(value, columns))
+
+
+_query_compiled = {}
+
+
+def compile_strip_query(text):
+    """Compile a strip query, raises ValueError on syntax errors"""
+    predicate = _query_compiled.get(text)
+    if predicate is None:
+        predicate = _query_compiled[text] = _query_build(_QueryParser(text).parse())
+    return predicate
+
+
+def query_strips(scene, text, sequences=None):
+    """Boolean mask of the strips in sequences (the editing level by default) matching the query"""
+    predicate = compile_strip_query(text)
+    if sequences is None:
+        sequences, _level = _editing_sequences(scene)
+    render = scene.render
+    columns = _StripColumns(sequences, render.fps / render.fps_base)
+    if not columns.count:
+        return np.zeros(0, dtype=bool)
+    return predicate(columns)
+
+
+class SEQUENCER_OT_SelectQuery(Operator):
+    """Select strips matching a query, e.g. type == MOVIE and duration > 10s and channel in 3..5"""
+
+    bl_idname = "sequencer.select_query"
+    bl_label = "Select by Query"
+    bl_options = {'REGISTER', 'UNDO'}
+
+    query: StringProperty(
+        name="Query",
+        description="Strip query, e.g. type == MOVIE and duration > 10s and modifiers > 2 and channel in 3..5",
+    )
+    extend: BoolProperty(
+        name="Extend",
+        default=False,
+        description="Add to the current selection",
+    )
+
+    @classmethod
+    def poll(cls, context):
+        return (context.scene and context.scene.sequence_editor)
+
+    def invoke(self, context, event):
+        if not self.query:
+            self.query = context.scene.get("vse_query", "")
+            return context.window_manager.invoke_props_dialog(self)
+        return self.execute(context)
+
+    def execute(self, context):
+        scene = context.scene
+        sequences, _level = _editing_sequences(scene)
+        try:
+            mask = query_strips(scene, self.query, sequences)
+        except ValueError as ex:
+            self.report({'ERROR'}, str(ex))
+            return {'CANCELLED'}
+
+        if self.extend:
+            select = np.empty(len(mask), dtype=bool)
+            sequences.foreach_get("select", select)
+            mask |= select
+        sequences.foreach_set("select", mask)
+        # Last query is kept on the scene for the sidebar field.
+        scene["vse_query"] = self.query
+
+        self.report({'INFO'}, "%d strips selected" % np.count_nonzero(mask))
+        return {'FINISHED'}
+
+
+class SEQUENCER_OT_SaveQuery(Operator):
+    """Save a strip query in the scene"""
+
+    bl_idname = "sequencer.save_query"
+    bl_label = "Save Query"
+    bl_options = {'REGISTER', 'UNDO'}
+
+    name: StringProperty(name="Name")
+    query: StringProperty(name="Query")
+
+    @classmethod
+    def poll(cls, context):
+        return context.scene is not None
+
+    def invoke(self, context, event):
+        if not self.query:
+            self.query = context.scene.get("vse_query", "")
+        return context.window_manager.invoke_props_dialog(self)
+
+    def execute(self, context):
+        if not self.name:
+            self.report({'ERROR'}, "A name is needed")
+            return {'CANCELLED'}
+        try:
+            compile_strip_query(self.query)
+        except ValueError as ex:
+            self.report({'ERROR'}, str(ex))
+            return {'CANCELLED'}
+
+        scene = context.scene
+        if "vse_saved_queries" not in scene:
+            scene["vse_saved_queries"] = {}
+        scene["vse_saved_queries"][self.name] = self.query
+        return {'FINISHED'}
+
+
+class SEQUENCER_OT_RemoveQuery(Operator):
+    """Remove a saved strip query"""
+
+    bl_idname = "sequencer.remove_query"
+    bl_label = "Remove Query"
+    bl_options = {'REGISTER', 'UNDO'}
+
+    name: StringProperty(name="Name")
+
+    @classmethod
+    def poll(cls, context):
+        return context.scene is not None and "vse_saved_queries" in context.scene
+
+    def execute(self, context):
+        queries = context.scene["vse_saved_queries"]
+        if self.name in queries:
+            del queries[self.name]
+        return {'FINISHED'}
+
+
+def _strip_order_key(names):
+    return "%08x" % zlib.crc32("\n".join(names).encode())
+
+
+def selection_set_store(scene, name):
+    """Store the selection of all strips as a named set on the scene"""
+    sequences = scene.sequence_editor.sequences_all
+    names = [s.name for s in sequences]
+    select = np.empty(len(names), dtype=bool)
+    sequences.foreach_get("select", select)
+
+    if "vse_selection_sets" not in scene:
+        scene["vse_selection_sets"] = {}
+    # Member names keep the set valid when strips are added, removed or
+    # renamed, the bitmap restores it without name lookups while the strip
+    # order is unchanged.
+    scene["vse_selection_sets"][name] = {
+        "names": "\n".join(names[i] for i in np.flatnonzero(select)),
+        "order": _strip_order_key(names),
+        "count": len(names),
+        "bits": np.packbits(select).tolist() or [0],
+    }
+
+
+def selection_set_mask(scene, name):
+    """Mask over sequences_all of the strips of a stored selection set"""
+    entry = scene["vse_selection_sets"][name]
+    sequences = scene.sequence_editor.sequences_all
+    names = [s.name for s in sequences]
+    if entry["count"] == len(names) and entry["order"] == _strip_order_key(names):
+        bits = np.array(entry["bits"].to_list(), dtype=np.uint8)
+        return np.unpackbits(bits)[:len(names)].astype(bool)
+    return selection_mask(sequences, entry["names"].split("\n"))
+
+
+class SEQUENCER_OT_SelectionSet(Operator):
+    """Save, recall or combine named selection sets"""
+
+    bl_idname = "sequencer.selection_set"
+    bl_label = "Selection Set"
+    bl_options = {'REGISTER', 'UNDO'}
+
+    name: StringProperty(name="Name")
+    action: EnumProperty(
+        name="Action", description="Action",
+        items=(
+            ('SAVE', "Save", "Save the selection as a set"),
+            ('RECALL', "Recall", "Replace the selection by the set"),
+            ('UNION', "Union", "Add the set to the selection"),
+            ('INTERSECT', "Intersect", "Only keep selected the strips of the set"),
+            ('SUBTRACT', "Subtract", "Remove the set from the selection"),
+            ('REMOVE', "Remove", "Delete the set"),
+        ),
+    )
+
+    @classmethod
+    def poll(cls, context):
+        return (context.scene and context.scene.sequence_editor)
+
+    def invoke(self, context, event):
+        if self.action == 'SAVE' and not self.name:
+            return context.window_manager.invoke_props_dialog(self)
+        return self.execute(context)
+
+    def execute(self, context):
+        scene = context.scene
+        if not self.name:
+            self.report({'ERROR'}, "A name is needed")
+            return {'CANCELLED'}
+
+        if self.action == 'SAVE':
+            selection_set_store(scene, self.name)
+            return {'FINISHED'}
+
+        if self.name not in scene.get("vse_selection_sets", {}):
+            self.report({'ERROR'}, "No selection set named '%s'" % self.name)
+            return {'CANCELLED'}
+
+        if self.action == 'REMOVE':
+            del scene["vse_selection_sets"][self.name]
+            return {'FINISHED'}
+
+        sequences = scene.sequence_editor.sequences_all
+        mask = selection_set_mask(scene, self.name)
+        if self.action != 'RECALL':
+            select = np.empty(len(sequences), dtype=bool)
+            sequences.foreach_get("select", select)
+            if self.action == 'UNION':
+                mask |= select
+            elif self.action == 'INTERSECT':
+                mask &= select
+            else:
+                mask = select & ~mask
+        sequences.foreach_set("select", mask)
+        return {'FINISHED'}
+
+
 class SEQUENCER_OT_ToggleAllModifiers(bpy.types.Operator):
     '''Toggle all modifiers on/off'''
     bl_idname = "sequencer.toggle_all_modifiers"
@@ -509,9 +1442,11 @@ class SEQUENCER_OT_SplitExtract(bpy.types.Operator):
     def execute(self, context):
         scene = bpy.context.scene
         sequencer = bpy.ops.sequencer        
+        sequences, _level = _editing_sequences(scene)
         selection = bpy.context.selected_sequences
         if not selection:
             return {'CANCELLED'}
+        selection_names = selection_save(sequences)
 
         #Get current frame selection:
         bpy.ops.sequencer.select_time_cursor(extent='FALSE')
@@ -526,7 +1461,7 @@ class SEQUENCER_OT_SplitExtract(bpy.types.Operator):
                     sequencer.cut(frame=scene.frame_current, type='SOFT', side=self.direction)
                     sequencer.ripple_delete()  
                     s.select = False                        
-        for s in selection: s.select = True 
+        selection_restore(sequences, selection_names, extend=True)
 
         return {'FINISHED'}
 
@@ -555,9 +1490,11 @@ class SEQUENCER_OT_SplitLift(bpy.types.Operator):
 
         scene = bpy.context.scene
         sequencer = bpy.ops.sequencer        
+        sequences, _level = _editing_sequences(scene)
         selection = bpy.context.selected_sequences
         if not selection:
             return {'CANCELLED'}
+        selection_names = selection_save(sequences)
 
         #Get current frame selection:
         bpy.ops.sequencer.select_time_cursor(extent='FALSE')
@@ -572,7 +1509,7 @@ class SEQUENCER_OT_SplitLift(bpy.types.Operator):
                     sequencer.cut(frame=scene.frame_current, type='SOFT', side=self.direction)
                     sequencer.delete_lift()  
                     s.select = False                        
-        for s in selection: s.select = True 
+        selection_restore(sequences, selection_names, extend=True)
 
         return {'FINISHED'}
 
@@ -592,17 +1529,18 @@ class SEQUENCER_OT_DeleteLift(bpy.types.Operator):
 
     def execute(self, context):
 
+        sequences, _level = _editing_sequences(context.scene)
         selection = context.selected_sequences       
         if not selection:
             return {'CANCELLED'}        
+        selection_names = selection_save(sequences)
 
         for s in selection:
             if not s.lock:
                 bpy.ops.sequencer.select_all(action='DESELECT') 
                 s.select = True
                 bpy.ops.sequencer.delete()  
-                s.select = False                        
-                for s in selection: s.select = True 
+        selection_restore(sequences, selection_names)
 
         return {'FINISHED'} 
 
@@ -728,8 +1666,10 @@ class SEQUENCER_OT_Move(bpy.types.Operator):
 
     def execute(self, context):
 
+        sequences, _level = _editing_sequences(context.scene)
         selection = context.selected_sequences
         selection = sorted(selection, key=attrgetter('channel', 'frame_final_start'))
+        selection_names = [s.name for s in selection]
 
         if self.direction == "UP":
             selection.reverse()
@@ -766,7 +1706,7 @@ class SEQUENCER_OT_Move(bpy.types.Operator):
                         bpy.ops.sequencer.swap(side='RIGHT')
                 s.select = False    
                                     
-        for s in selection: s.select = True                 
+        selection_restore(sequences, selection_names, extend=True)
 
         return {'FINISHED'} 
 
@@ -784,11 +1724,13 @@ class SEQUENCER_OT_MatchFrame(bpy.types.Operator):
 
     def execute(self, context):
         
+        sequences, _level = _editing_sequences(context.scene)
         selection = context.selected_sequences
         selection = sorted(selection, key=attrgetter('channel', 'frame_final_start'))
         
         if not selection:
             return {'CANCELLED'}  
+        selection_names = [s.name for s in selection]
                             
         for seq in selection: 
 
@@ -800,12 +1742,7 @@ class SEQUENCER_OT_MatchFrame(bpy.types.Operator):
             }:
                  
                 # Find empty channel:
-                sequences = bpy.context.sequences
-                if not sequences:
-                    return 1
-                channels = [s.channel for s in sequences]
-                channels = sorted(list(set(channels)))
-                empty_channel = channels[-1] + 1 
+                empty_channel = timeline_index.free_channel(context.scene)
                 
                 # Duplicate strip to first empty channel and clear offsets
                 if empty_channel < 33:
@@ -825,10 +1762,12 @@ class SEQUENCER_OT_MatchFrame(bpy.types.Operator):
                     "use_accurate":False},
                     )
                     bpy.ops.sequencer.offset_clear()
+                else:
+                    self.report({'WARNING'}, "No free channel left, try Pack Channels")
+                    break
 
         #re-select previous selection
-        for seq in selection:                
-            seq.select = True
+        selection_restore(sequences, selection_names, extend=True)
 
         return {'FINISHED'} 
 
@@ -855,7 +1794,8 @@ class SEQUENCER_OT_Split(bpy.types.Operator):
         return False
 
     def execute(self, context):
-        selection = context.selected_sequences
+        level_sequences, _level = _editing_sequences(context.scene)
+        selection_names = selection_save(level_sequences)
         sequences = bpy.context.scene.sequence_editor.sequences_all
         cf = bpy.context.scene.frame_current
         at_cursor = [] 
@@ -877,17 +1817,14 @@ class SEQUENCER_OT_Split(bpy.types.Operator):
                     bpy.ops.sequencer.cut(frame=bpy.context.scene.frame_current, type = self.type, side='RIGHT')
 
                                 # add new strip to selection
-                    for i in bpy.context.scene.sequence_editor.sequences_all:
-                        if i.select: selection.append(i)                                                    
-                    bpy.ops.sequencer.select_all(action='DESELECT')                        
-                    for s in selection: s.select = True     
+                    selection_names += selection_save(level_sequences)
+                    selection_restore(level_sequences, selection_names)
                                   
             else:               #cut unselected
                 bpy.ops.sequencer.select_all(action='DESELECT') 
                 s.select = True
                 bpy.ops.sequencer.cut(frame=bpy.context.scene.frame_current, type = self.type)                 
-                bpy.ops.sequencer.select_all(action='DESELECT')                       
-                for s in selection: s.select = True   
+                selection_restore(level_sequences, selection_names)
                       
         return {'FINISHED'}   
 
@@ -976,6 +1913,7 @@ class SEQUENCER_OT_Concatenate(bpy.types.Operator):
         
         if not selection:
             return {'CANCELLED'}  
+        selection_names = [s.name for s in selection]
 
         error = False                            
         for strip in selection:
@@ -1007,8 +1945,7 @@ class SEQUENCER_OT_Concatenate(bpy.types.Operator):
                     bpy.ops.sequencer.effect_strip_add(frame_start=current_end+1, frame_end=new_end , channel=current_channel , type='COLOR')
                     bpy.ops.sequencer.ripple_delete()
 
-        bpy.ops.sequencer.select_all(action='DESELECT')                       
-        for s in selection: s.select = True 
+        selection_restore(current_sequence.sequences, selection_names)
 
         if error:
             return {'CANCELLED'} 
@@ -1099,32 +2036,4613 @@ class SEQUENCER_OT_ViewChannel(Operator):
 
         return {'FINISHED'}              
 
-classes = (
-    SEQUENCER_OT_CrossfadeSounds,
-    SEQUENCER_OT_CutMulticam,
-    SEQUENCER_OT_DeinterlaceSelectedMovies,
-    SEQUENCER_OT_ReverseSelectedMovies,
-    SEQUENCER_OT_FlipXSelectedMovies,
-    SEQUENCER_OT_FlipYSelectedMovies,
-    SEQUENCER_OT_ShowWaveformSelectedSounds,
-    SEQUENCER_OT_SelectTimeCursor,
-    SEQUENCER_OT_SelectChannel,
-    SEQUENCER_OT_SelectAllLockedStrips,
-    SEQUENCER_OT_SelectAllMuteStrips,
-    SEQUENCER_OT_ToggleAllModifiers,
-    SEQUENCER_OT_AudioMuteToggle,
-    SEQUENCER_OT_SetPreviewRange,
-    SEQUENCER_OT_PreviewSelected,
-    SEQUENCER_OT_SplitExtract,
-    SEQUENCER_OT_SplitLift,
-    SEQUENCER_OT_DeleteLift, 
-    SEQUENCER_OT_RippleDelete, 
-    SEQUENCER_OT_ZoomVertical,
-    SEQUENCER_OT_MatchFrame,
-    SEQUENCER_OT_Split,  
-    SEQUENCER_OT_ExtendToFill,  
-    SEQUENCER_OT_Move,
-    SEQUENCER_OT_Concatenate,
-    SEQUENCER_OT_SplitMode,
-    SEQUENCER_OT_ViewChannel,
-)
+
+# -----------------------------------------------------------------------------
+# Background jobs
+#
+# Long tasks (proxy building, rendering, analysis) are split in tasks run by a
+# pool of ``blender --background`` worker processes on a saved copy of the
+# project. Jobs are polled from a timer, their progress is drawn in the
+# sequencer header next to the running jobs, followed by the messages of the
+# last finished ones.
+
+background_jobs = []
+# (label, message, failed) of finished jobs, oldest first.
+job_messages = []
+_JOB_MESSAGES_MAX = 4
+
+
+def project_cache_dir(*parts, create=True):
+    """Cache directory next to the saved blend file, None when unsaved.
+
+    Readers pass create=False, so panels showing cached results don't leave
+    empty directories next to projects which never wrote any.
+    """
+    if not bpy.data.filepath:
+        return None
+    path = os.path.join(os.path.dirname(bpy.data.filepath), "vse_cache", *parts)
+    if create:
+        os.makedirs(path, exist_ok=True)
+    return path
+
+
+def save_worker_copy():
+    """Save a copy of the current file for the worker processes of one job.
+
+    Every call writes a new file, workers of a running job may still have to
+    open theirs. The copy is deleted when its job finishes.
+    """
+    directory = project_cache_dir("workers")
+    if directory is None:
+        return None
+    name, ext = os.path.splitext(bpy.path.basename(bpy.data.filepath))
+    filepath = os.path.join(directory, "%s.%d%s" % (name, time.time_ns(), ext))
+    bpy.ops.wm.save_as_mainfile(filepath=filepath, copy=True)
+    return filepath
+
+
+def worker_command(blend_path, expr):
+    return [
+        bpy.app.binary_path,
+        "--background", blend_path,
+        "--python-exit-code", "1",
+        "--python-expr", "import bl_operators.sequencer as vse; " + expr,
+    ]
+
+
+def _tag_sequencer_redraw():
+    for window in bpy.context.window_manager.windows:
+        for area in window.screen.areas:
+            if area.type == 'SEQUENCE_EDITOR':
+                area.tag_redraw()
+
+
+def _background_jobs_poll():
+    for job in list(background_jobs):
+        if job.poll():
+            background_jobs.remove(job)
+            job.finish()
+    _tag_sequencer_redraw()
+    return 0.5 if background_jobs else None
+
+
+class BackgroundJob:
+    """Tasks run by a pool of background worker processes.
+
+    Each task is a dictionary with the worker command line in "command".
+    """
+
+    def __init__(self, label, tasks, workers=0, on_task_done=None, on_finished=None):
+        self.label = label
+        self.pending = list(tasks)
+        self.running = []
+        self.total = len(self.pending)
+        self.done = 0
+        self.failed = 0
+        self.workers = max(1, workers or os.cpu_count() or 1)
+        self.cancelled = False
+        self.on_task_done = on_task_done
+        self.on_finished = on_finished
+        # Set by on_finished to show the outcome once the job is gone.
+        self.message = ""
+        self.blend_paths = {
+            task["command"][2] for task in self.pending if task["command"][1:2] == ["--background"]
+        }
+
+    @property
+    def progress(self):
+        return (self.done + self.failed) / self.total if self.total else 1.0
+
+    def start(self):
+        background_jobs.append(self)
+        if not bpy.app.timers.is_registered(_background_jobs_poll):
+            bpy.app.timers.register(_background_jobs_poll, first_interval=0.1, persistent=True)
+
+    def poll(self):
+        """Reap finished workers and start new ones, True once the job is over"""
+        for entry in list(self.running):
+            task, process, start = entry
+            returncode = process.poll()
+            if returncode is None:
+                continue
+            self.running.remove(entry)
+            task["seconds"] = time.time() - start
+            task["ok"] = returncode == 0 and not self.cancelled
+            if task["ok"]:
+                self.done += 1
+            else:
+                self.failed += 1
+            if self.on_task_done is not None:
+                self.on_task_done(task)
+
+        while self.pending and len(self.running) < self.workers and not self.cancelled:
+            task = self.pending.pop(0)
+            process = subprocess.Popen(
+                task["command"],
+                stdout=subprocess.DEVNULL,
+                stderr=subprocess.DEVNULL,
+            )
+            self.running.append((task, process, time.time()))
+
+        return not self.running and (self.cancelled or not self.pending)
+
+    def cancel(self):
+        self.cancelled = True
+        for task, process, start in self.running:
+            process.terminate()
+
+    def finish(self):
+        if self.on_finished is not None:
+            self.on_finished(self)
+        if self.message:
+            job_messages.append((self.label, self.message, bool(self.failed)))
+            del job_messages[:-_JOB_MESSAGES_MAX]
+        in_use = {path for job in background_jobs for path in job.blend_paths}
+        directory = project_cache_dir("workers")
+        for path in self.blend_paths - in_use:
+            if directory and os.path.dirname(path) == directory and os.path.exists(path):
+                os.remove(path)
+
+
+class SEQUENCER_OT_BackgroundJobCancel(Operator):
+    """Stop a background job, finished tasks are kept"""
+
+    bl_idname = "sequencer.background_job_cancel"
+    bl_label = "Cancel Background Job"
+
+    index: IntProperty(name="Index", min=0)
+
+    @classmethod
+    def poll(cls, context):
+        return bool(background_jobs)
+
+    def execute(self, context):
+        if self.index < len(background_jobs):
+            background_jobs[self.index].cancel()
+        return {'FINISHED'}
+
+    # bl_operators only registers the classes of its modules, the handlers of
+    # this module are installed and removed along with this operator.
+    @classmethod
+    def register(cls):
+        register()
+
+    @classmethod
+    def unregister(cls):
+        unregister()
+
+
+class SEQUENCER_OT_BackgroundJobDismiss(Operator):
+    """Remove the message of a finished background job"""
+
+    bl_idname = "sequencer.background_job_dismiss"
+    bl_label = "Dismiss Job Message"
+
+    index: IntProperty(name="Index", min=0)
+
+    @classmethod
+    def poll(cls, context):
+        return bool(job_messages)
+
+    def execute(self, context):
+        if self.index < len(job_messages):
+            del job_messages[self.index]
+        return {'FINISHED'}
+
+
+# -----------------------------------------------------------------------------
+# Proxy farm
+#
+# Proxies of many strips are built by worker processes, one strip per task.
+# The queue is kept in a file next to the project so an interrupted build
+# resumes with the strips which were not done.
+
+def _proxy_queue_path(create=False):
+    directory = project_cache_dir(create=create)
+    if directory is None:
+        return None
+    return os.path.join(directory, bpy.path.basename(bpy.data.filepath) + ".proxy_queue.json")
+
+
+def proxy_queue_load():
+    path = _proxy_queue_path()
+    if path is None or not os.path.exists(path):
+        return []
+    with open(path, "r", encoding="utf-8") as fh:
+        return json.load(fh)
+
+
+def _proxy_task_id(task):
+    return "%s/%s/%s/%s" % (task.get("build"), task["scene"], task["strip"], task.get("sizes"))
+
+
+def proxy_queue_save(queue):
+    """Write queue records over their copies in the file, keeping the others"""
+    records = {_proxy_task_id(task): task for task in proxy_queue_load()}
+    for task in queue:
+        records[_proxy_task_id(task)] = {
+            key: value for key, value in task.items() if key not in {"command", "ok", "timings"}
+        }
+    path = _proxy_queue_path(create=True)
+    with open(path + ".tmp", "w", encoding="utf-8") as fh:
+        json.dump(list(records.values()), fh, indent=1)
+    os.replace(path + ".tmp", path)
+
+
+_PROXY_SIZES = (25, 50, 75, 100)
+
+_proxy_stats = {"filepath": None, "strips": {}}
+
+
+def _proxy_task_passes(task):
+    """Finished passes of a queue record, a separate pass build holds one per size"""
+    if "pass_seconds" in task:
+        return [
+            dict(task, sizes=[size], seconds=seconds, fps=task["frames"] / max(seconds, 1e-6))
+            for size, seconds in zip(task["sizes"], task["pass_seconds"])
+        ]
+    return [task] if "fps" in task else []
+
+
+def _proxy_stats_add(stats, task):
+    for record in _proxy_task_passes(task):
+        key = (record["scene"], record["strip"])
+        passes = stats.get(key)
+        if not passes or passes[0].get("build") != record.get("build"):
+            stats[key] = [record]
+        else:
+            passes.append(record)
+
+
+def proxy_build_stats():
+    """{(scene, strip): [finished passes of the last build]} for the current file"""
+    if _proxy_stats["filepath"] != bpy.data.filepath:
+        _proxy_stats["filepath"] = bpy.data.filepath
+        _proxy_stats["strips"] = {}
+        for task in proxy_queue_load():
+            _proxy_stats_add(_proxy_stats["strips"], task)
+    return _proxy_stats["strips"]
+
+
+def proxy_worker(scene_name, strip_name, sizes=None, timings_path=None):
+    """Build the proxies of one strip, run inside a background worker.
+
+    Blender decodes every source frame once and writes all enabled proxy
+    sizes from it, sizes limits the build to some of them. With timings_path
+    every size is built in its own pass, one after the other since they
+    share the strip's proxy files, and the seconds of each pass are written
+    there.
+    """
+    scene = bpy.data.scenes[scene_name]
+    strip = None
+    for s in scene.sequence_editor.sequences_all:
+        s.select = s.name == strip_name
+        if s.select:
+            strip = s
+    if sizes is not None:
+        strip.use_proxy = True
+    seconds = []
+    for pass_sizes in ([[size] for size in sizes] if timings_path else [sizes]):
+        if pass_sizes is not None:
+            for size in _PROXY_SIZES:
+                setattr(strip.proxy, "build_%d" % size, size in pass_sizes)
+        start = time.time()
+        # Without a job system in background mode, exec builds synchronously.
+        bpy.ops.sequencer.rebuild_proxy({"scene": scene})
+        seconds.append(time.time() - start)
+    if timings_path:
+        with open(timings_path, "w", encoding="utf-8") as fh:
+            json.dump(seconds, fh)
+
+
+class SEQUENCER_OT_ProxyFarm(Operator):
+    """Build proxies of strips with background Blender processes, resuming an interrupted build"""
+
+    bl_idname = "sequencer.proxy_farm"
+    bl_label = "Build Proxies in Background"
+    bl_options = {'REGISTER'}
+
+    workers: IntProperty(
+        name="Workers",
+        min=0, max=256,
+        default=0,
+        description="Number of worker processes, 0 for one per CPU core",
+    )
+    selected_only: BoolProperty(
+        name="Only Selected",
+        default=True,
+        description="Only queue selected strips, else all strips using proxies",
+    )
+    separate_passes: BoolProperty(
+        name="Separate Pass per Size",
+        default=False,
+        description="Decode the source again for every proxy size, "
+        "to compare the throughput with a single decode build",
+    )
+    only_missing: BoolProperty(
+        name="Only Missing",
+        default=False,
+        description="Only build proxies which don't exist yet for the displayed proxy size, "
+        "or else for the enabled sizes, of strips in all scenes",
+    )
+
+    @classmethod
+    def poll(cls, context):
+        return (context.scene and context.scene.sequence_editor)
+
+    def execute(self, context):
+        if not bpy.data.filepath:
+            self.report({'ERROR'}, "Save the file first, the proxy queue is stored next to it")
+            return {'CANCELLED'}
+
+        scene = context.scene
+        # Finished tasks stay in the queue, they are the throughput records.
+        queue = [task for task in proxy_queue_load() if task["scene"] in bpy.data.scenes]
+        unfinished = [task for task in queue if task["status"] != 'DONE']
+        queued = {(task["scene"], task["strip"]) for task in unfinished}
+        # An interrupted build resumes, skipping strips it finished unless
+        # their proxies went missing since.
+        build = max((task.get("build", 0) for task in unfinished), default=int(time.time()))
+        finished = {}
+        for task in queue:
+            if task["status"] == 'DONE' and task.get("build") == build:
+                finished.setdefault((task["scene"], task["strip"]), set()).update(task.get("sizes") or ())
+        stats = proxy_build_stats()
+        if self.only_missing:
+            candidates = {}
+            for scene_name, strip_name, size in proxy_coverage(space_proxy_size(context))["missing"]:
+                s = bpy.data.scenes[scene_name].sequence_editor.sequences_all[strip_name]
+                candidates.setdefault((scene_name, strip_name), (s, []))[1].append(size)
+        else:
+            candidates = {
+                (scene.name, s.name): (s, [size for size in _PROXY_SIZES if getattr(s.proxy, "build_%d" % size)])
+                for s in scene.sequence_editor.sequences_all
+                if getattr(s, "use_proxy", False)
+            }
+        for (scene_name, strip_name), (s, sizes) in candidates.items():
+            if self.selected_only and not s.select:
+                continue
+            done = finished.get((scene_name, strip_name), ())
+            sizes = [
+                size for size in sizes
+                if size not in done or not os.path.exists(proxy_filepath(bpy.data.scenes[scene_name], s, size))
+            ]
+            if not sizes or (scene_name, strip_name) in queued:
+                continue
+            queue.append({
+                "scene": scene_name,
+                "strip": strip_name,
+                "directory": os.path.join(
+                    proxy_directory(bpy.data.scenes[scene_name], s), os.path.basename(bpy.path.abspath(s.filepath)),
+                ) if s.type == 'MOVIE' else None,
+                "status": 'PENDING',
+                "frames": s.frame_duration,
+                "sizes": sizes,
+                "separate": self.separate_passes,
+                "build": build,
+            })
+
+        tasks = [task for task in queue if task["status"] != 'DONE']
+        if not tasks:
+            self.report({'WARNING'}, "No strips with proxies enabled to build")
+            return {'CANCELLED'}
+
+        # Tasks still marked running were interrupted with the last session.
+        for task in tasks:
+            task["status"] = 'PENDING'
+        proxy_queue_save(queue)
+
+        blend_path = save_worker_copy()
+        for task in tasks:
+            timings_path = None
+            if task.get("separate"):
+                timings_path = os.path.join(
+                    project_cache_dir("workers"),
+                    "passes_%s.json" % hashlib.sha1(_proxy_task_id(task).encode()).hexdigest()[:16],
+                )
+            task["timings"] = timings_path
+            task["command"] = worker_command(
+                blend_path,
+                "vse.proxy_worker(%r, %r, %r, %r)" % (task["scene"], task["strip"], task.get("sizes"), timings_path),
+            )
+
+        def on_task_done(task):
+            task["status"] = 'DONE' if task["ok"] else 'FAILED'
+            timings_path = task.pop("timings", None)
+            if task["ok"] and timings_path and os.path.exists(timings_path):
+                with open(timings_path, "r", encoding="utf-8") as fh:
+                    task["pass_seconds"] = json.load(fh)
+                os.remove(timings_path)
+            if task["ok"] and task.get("frames"):
+                task["fps"] = task["frames"] / max(task["seconds"], 1e-6)
+                _proxy_stats_add(stats, task)
+            proxy_queue_save(queue)
+
+        def on_finished(job):
+            try:
+                bpy.ops.sequencer.refresh_all()
+            except RuntimeError:
+                pass
+
+        BackgroundJob(
+            "Proxies", tasks, self.workers,
+            on_task_done=on_task_done,
+            on_finished=on_finished,
+        ).start()
+        return {'FINISHED'}
+
+
+# -----------------------------------------------------------------------------
+# Shared proxy store
+#
+# Proxies of the same media are shared between projects through a store
+# directory, where they are kept under a fast partial hash of the media file.
+# An index file maps hashes to store entries so lookups don't walk the store.
+
+_media_hash_cache = {}
+
+
+def media_hash(filepath, samples=16, block_size=1 << 16):
+    """Fast partial hash of a media file from its size, mtime and sampled blocks"""
+    stat = os.stat(filepath)
+    key = (filepath, stat.st_size, stat.st_mtime_ns)
+    digest = _media_hash_cache.get(key)
+    if digest is not None:
+        return digest
+
+    h = hashlib.sha1(("%d:%d:" % (stat.st_size, stat.st_mtime_ns)).encode())
+    if stat.st_size:
+        with open(filepath, "rb") as fh, mmap.mmap(fh.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            if stat.st_size <= samples * block_size:
+                h.update(data[:])
+            else:
+                last = stat.st_size - block_size
+                for i in range(samples):
+                    offset = last * i // (samples - 1)
+                    h.update(data[offset:offset + block_size])
+    digest = _media_hash_cache[key] = h.hexdigest()
+    return digest
+
+
+def proxy_directory(scene, strip):
+    """Directory holding the '<media file name>/proxy_<size>.avi' proxies of a movie strip"""
+    ed = scene.sequence_editor
+    if ed.proxy_storage == 'PROJECT':
+        return bpy.path.abspath(ed.proxy_dir or "//BL_proxy")
+    if strip.proxy.use_proxy_custom_directory:
+        return bpy.path.abspath(strip.proxy.directory)
+    return os.path.join(os.path.dirname(bpy.path.abspath(strip.filepath)), "BL_proxy")
+
+
+def proxy_filepath(scene, strip, size):
+    media_name = os.path.basename(bpy.path.abspath(strip.filepath))
+    return os.path.join(proxy_directory(scene, strip), media_name, "proxy_%d.avi" % size)
+
+
+def _proxy_store_default():
+    return os.environ.get(
+        "BLENDER_VSE_PROXY_STORE",
+        os.path.join(os.path.expanduser("~"), "BL_proxy_store"),
+    )
+
+
+def proxy_store_index_load(store):
+    path = os.path.join(store, "index.json")
+    if not os.path.exists(path):
+        return {}
+    with open(path, "r", encoding="utf-8") as fh:
+        return json.load(fh)
+
+
+def proxy_store_index_save(store, index):
+    path = os.path.join(store, "index.json")
+    with open(path + ".tmp", "w", encoding="utf-8") as fh:
+        json.dump(index, fh, indent=1)
+    os.replace(path + ".tmp", path)
+
+
+class SEQUENCER_OT_ProxyShare(Operator):
+    """Use proxies from a store shared between projects, keyed by the content of the media"""
+
+    bl_idname = "sequencer.proxy_share"
+    bl_label = "Use Shared Proxy Store"
+    bl_options = {'REGISTER'}
+
+    store_directory: StringProperty(
+        name="Store",
+        subtype='DIR_PATH',
+        default=_proxy_store_default(),
+        description="Directory of the shared proxy store",
+    )
+
+    @classmethod
+    def poll(cls, context):
+        return (context.scene and context.scene.sequence_editor)
+
+    def execute(self, context):
+        scene = context.scene
+        ed = scene.sequence_editor
+        store = bpy.path.abspath(self.store_directory)
+        os.makedirs(store, exist_ok=True)
+        index = proxy_store_index_load(store)
+
+        shared = 0
+        for strip in context.selected_sequences:
+            if strip.type != 'MOVIE':
+                continue
+            filepath = bpy.path.abspath(strip.filepath)
+            if not os.path.exists(filepath):
+                self.report({'WARNING'}, "%s: media not found" % strip.name)
+                continue
+
+            key = media_hash(filepath)
+            media_name = os.path.basename(filepath)
+            entry = index.setdefault(key, {"file": media_name, "projects": []})
+            entry_dir = os.path.join(store, key)
+            os.makedirs(os.path.join(entry_dir, entry["file"]), exist_ok=True)
+
+            try:
+                # Blender looks the proxies up by media file name, other names
+                # of the same media link to the first one.
+                if media_name != entry["file"] and not os.path.lexists(os.path.join(entry_dir, media_name)):
+                    os.symlink(entry["file"], os.path.join(entry_dir, media_name), target_is_directory=True)
+                if ed.proxy_storage == 'PROJECT':
+                    self.link_project_proxy(scene, strip, os.path.join(entry_dir, media_name))
+                else:
+                    strip.proxy.use_proxy_custom_directory = True
+                    strip.proxy.directory = entry_dir
+            except OSError as ex:
+                self.report({'WARNING'}, "%s: %s" % (strip.name, ex))
+                continue
+
+            if bpy.data.filepath and bpy.data.filepath not in entry["projects"]:
+                entry["projects"].append(bpy.data.filepath)
+            shared += 1
+
+        proxy_store_index_save(store, index)
+        self.report({'INFO'}, "%d strips use the shared proxy store" % shared)
+        return {'FINISHED'}
+
+    @staticmethod
+    def link_project_proxy(scene, strip, store_media_dir):
+        # Project storage has one directory for all strips, so the strip's
+        # proxy directory is linked into the store instead.
+        local = os.path.join(proxy_directory(scene, strip), os.path.basename(store_media_dir))
+        if os.path.islink(local):
+            if os.path.realpath(local) == os.path.realpath(store_media_dir):
+                return
+            os.remove(local)
+        elif os.path.isdir(local):
+            # Publish proxies built before the store was used.
+            if os.listdir(store_media_dir):
+                raise OSError("local proxies and store proxies both exist")
+            if os.path.islink(store_media_dir):
+                # Another name of the media, publish into the directory it
+                # links to and link it again.
+                target = os.path.realpath(store_media_dir)
+                os.unlink(store_media_dir)
+                os.rmdir(target)
+                shutil.move(local, target)
+                os.symlink(os.path.basename(target), store_media_dir, target_is_directory=True)
+            else:
+                os.rmdir(store_media_dir)
+                shutil.move(local, store_media_dir)
+        os.makedirs(os.path.dirname(local), exist_ok=True)
+        os.symlink(store_media_dir, local, target_is_directory=True)
+
+
+# -----------------------------------------------------------------------------
+# Proxy coverage
+#
+# Proxy directories are scanned with a thread pool, listings are cached until
+# the directory changes so the report stays cheap on large projects.
+
+_proxy_dir_cache = {}
+proxy_report = {}
+
+
+def _proxy_dir_scan(path):
+    """Return ({file name: size}, {sub directory names}) of a directory.
+
+    The listing is kept until the directory changes, file sizes are read
+    again every time since writing into a file doesn't touch its directory.
+    """
+    try:
+        mtime = os.stat(path).st_mtime_ns
+    except OSError:
+        return {}, set()
+    cached = _proxy_dir_cache.get(path)
+    if cached is not None and cached[0] == mtime:
+        names, subdirs = cached[1]
+        files = {}
+        for name in names:
+            try:
+                files[name] = os.stat(os.path.join(path, name)).st_size
+            except OSError:
+                pass
+        return files, subdirs
+
+    files = {}
+    subdirs = set()
+    with os.scandir(path) as entries:
+        for entry in entries:
+            if entry.is_dir():
+                subdirs.add(entry.name)
+            elif entry.is_file():
+                files[entry.name] = entry.stat().st_size
+    _proxy_dir_cache[path] = (mtime, (list(files), subdirs))
+    return files, subdirs
+
+
+# Files Blender writes in the proxy directory of a movie.
+_MOVIE_PROXY_FILE = re.compile(r"proxy_\d+(_part)?\.avi$|[a-z_]+\.tc$")
+
+
+def _is_movie_proxy_dir(path):
+    if os.path.islink(path) or not os.path.isdir(path):
+        return False
+    files, subdirs = _proxy_dir_scan(path)
+    return not subdirs and all(_MOVIE_PROXY_FILE.match(name) for name in files)
+
+
+def _proxy_dir_bytes(path):
+    files, subdirs = _proxy_dir_scan(path)
+    return sum(files.values()) + sum(_proxy_dir_bytes(os.path.join(path, d)) for d in subdirs)
+
+
+def space_proxy_size(context):
+    """Proxy size displayed by the sequencer editor in context, else None"""
+    space = context.space_data
+    if space and space.type == 'SEQUENCE_EDITOR' and space.proxy_render_size.startswith("PROXY_"):
+        return int(space.proxy_render_size[6:])
+    return None
+
+
+def proxy_coverage(render_size=None):
+    """Scan the proxies of the movie strips of all scenes.
+
+    A strip needs the proxy of render_size, or the sizes enabled on it when
+    render_size is None. Only directories this project owns can be stale:
+    shared store entries no other project uses. Proxies next to the media,
+    built by the farm or not, may be used by other projects.
+    """
+    media = {}
+    for scene in bpy.data.scenes:
+        if not scene.sequence_editor:
+            continue
+        for s in scene.sequence_editor.sequences_all:
+            if s.type != 'MOVIE':
+                continue
+            if render_size:
+                sizes = [render_size]
+            elif s.use_proxy:
+                sizes = [size for size in _PROXY_SIZES if getattr(s.proxy, "build_%d" % size)]
+            else:
+                sizes = []
+            key = (proxy_directory(scene, s), os.path.basename(bpy.path.abspath(s.filepath)))
+            media.setdefault(key, []).append((scene.name, s.name, sizes))
+
+    roots = {root for root, _name in media}
+    paths = sorted(roots) + [os.path.join(root, name) for root, name in media]
+    with ThreadPoolExecutor(max_workers=16) as pool:
+        listings = dict(zip(paths, pool.map(_proxy_dir_scan, paths)))
+
+    missing = []
+    used_bytes = 0
+    for (root, name), strips in media.items():
+        files = listings[os.path.join(root, name)][0]
+        used_bytes += sum(files.values())
+        for scene_name, strip_name, sizes in strips:
+            for size in sizes:
+                if "proxy_%d.avi" % size not in files:
+                    missing.append((scene_name, strip_name, size))
+
+    used = {os.path.realpath(os.path.join(root, name)) for root, name in media}
+    owned = set()
+    # Stores of strips moved out of them since the farm built their proxies.
+    farmed = {
+        os.path.dirname(os.path.dirname(task["directory"])) for task in proxy_queue_load() if task.get("directory")
+    }
+    for store in {os.path.dirname(root) for root in roots} | farmed | {_proxy_store_default()}:
+        if not os.path.exists(os.path.join(store, "index.json")):
+            continue
+        for key, entry in proxy_store_index_load(store).items():
+            if entry.get("projects") == [bpy.data.filepath]:
+                owned.add(os.path.join(store, key, entry["file"]))
+    stale = [path for path in owned if os.path.realpath(path) not in used and _is_movie_proxy_dir(path)]
+    with ThreadPoolExecutor(max_workers=16) as pool:
+        stale_bytes = sum(pool.map(_proxy_dir_bytes, stale))
+
+    return {
+        "render_size": render_size,
+        "missing": missing,
+        "bytes": used_bytes,
+        "stale": sorted(stale),
+        "stale_bytes": stale_bytes,
+    }
+
+
+def format_bytes(size):
+    for unit in ("B", "KB", "MB", "GB"):
+        if size < 1024:
+            return "%.1f %s" % (size, unit)
+        size /= 1024
+    return "%.1f TB" % size
+
+
+class SEQUENCER_OT_ProxyReport(Operator):
+    """Report strips missing proxies and the disk space used by proxies"""
+
+    bl_idname = "sequencer.proxy_report"
+    bl_label = "Proxy Report"
+    bl_options = {'REGISTER'}
+
+    @classmethod
+    def poll(cls, context):
+        return (context.scene and context.scene.sequence_editor)
+
+    def execute(self, context):
+        proxy_report.clear()
+        proxy_report.update(proxy_coverage(space_proxy_size(context)))
+        self.report({'INFO'}, "%d missing proxies, %s used, %s stale" % (
+            len(proxy_report["missing"]),
+            format_bytes(proxy_report["bytes"]),
+            format_bytes(proxy_report["stale_bytes"]),
+        ))
+        return {'FINISHED'}
+
+
+class SEQUENCER_OT_ProxyClean(Operator):
+    """Delete proxies of media no strip of this project uses"""
+
+    bl_idname = "sequencer.proxy_clean"
+    bl_label = "Delete Stale Proxies"
+    bl_options = {'REGISTER'}
+
+    @classmethod
+    def poll(cls, context):
+        return (context.scene and context.scene.sequence_editor)
+
+    def invoke(self, context, event):
+        return context.window_manager.invoke_confirm(self, event)
+
+    def execute(self, context):
+        report = proxy_coverage(space_proxy_size(context))
+        stores = {}
+        for path in report["stale"]:
+            entry_dir = os.path.dirname(path)
+            store = os.path.dirname(entry_dir)
+            if os.path.exists(os.path.join(store, "index.json")):
+                # A store entry goes away with its aliases and index record.
+                index = stores.setdefault(store, proxy_store_index_load(store))
+                if index.pop(os.path.basename(entry_dir), None) is not None:
+                    shutil.rmtree(entry_dir, ignore_errors=True)
+                    continue
+            shutil.rmtree(path, ignore_errors=True)
+        for store, index in stores.items():
+            proxy_store_index_save(store, index)
+        report["stale"] = []
+        report["stale_bytes"] = 0
+        proxy_report.clear()
+        proxy_report.update(report)
+        self.report({'INFO'}, "Deleted stale proxies")
+        return {'FINISHED'}
+
+
+class SEQUENCER_OT_ProxyBuildMissing(Operator):
+    """Build the proxies missing for the displayed proxy size in background"""
+
+    bl_idname = "sequencer.proxy_build_missing"
+    bl_label = "Build Missing Proxies"
+    bl_options = {'REGISTER', 'UNDO'}
+
+    workers: IntProperty(
+        name="Workers",
+        min=0, max=256,
+        default=0,
+        description="Number of worker processes, 0 for one per CPU core",
+    )
+
+    @classmethod
+    def poll(cls, context):
+        return (context.scene and context.scene.sequence_editor)
+
+    def execute(self, context):
+        render_size = space_proxy_size(context)
+        missing = proxy_coverage(render_size)["missing"]
+        if not missing:
+            self.report({'INFO'}, "No missing proxies")
+            return {'CANCELLED'}
+
+        # The farm queues enabled sizes, enable exactly the missing ones.
+        for scene_name, strip_name, size in missing:
+            s = bpy.data.scenes[scene_name].sequence_editor.sequences_all[strip_name]
+            s.use_proxy = True
+            setattr(s.proxy, "build_%d" % size, True)
+        return bpy.ops.sequencer.proxy_farm(
+            workers=self.workers,
+            selected_only=False,
+            only_missing=True,
+        )
+
+
+# -----------------------------------------------------------------------------
+# Playback clock
+#
+# frame_change_post runs once for every frame shown during playback, the wall
+# time between two calls is the time it took to deliver a frame.
+
+class PlaybackClock:
+    """Calls listener(scene, frame, seconds, step) for every frame shown during playback.
+
+    step is the number of frames played since the previous call, more than one
+    when frames were dropped.
+    """
+
+    # Longer gaps are a restart of the playback, not a slow frame.
+    max_gap = 1.0
+
+    def __init__(self):
+        self.listeners = []
+        self.last = None
+
+    def add_listener(self, listener):
+        if listener not in self.listeners:
+            self.listeners.append(listener)
+        handlers = bpy.app.handlers.frame_change_post
+        for h in list(handlers):
+            if getattr(h, "__name__", None) == _playback_clock_frame_change.__name__:
+                handlers.remove(h)
+        handlers.append(_playback_clock_frame_change)
+
+    def remove_listener(self, listener):
+        if listener in self.listeners:
+            self.listeners.remove(listener)
+        handlers = bpy.app.handlers.frame_change_post
+        if not self.listeners and _playback_clock_frame_change in handlers:
+            handlers.remove(_playback_clock_frame_change)
+            self.last = None
+
+    def tick(self, scene):
+        now = time.perf_counter()
+        screen = bpy.context.screen
+        if screen is None or not screen.is_animation_playing:
+            self.last = None
+            return
+        frame = scene.frame_current
+        if self.last is not None and now - self.last[0] < self.max_gap:
+            for listener in self.listeners:
+                listener(scene, frame, now - self.last[0], frame - self.last[1])
+        self.last = (now, frame)
+
+
+playback_clock = PlaybackClock()
+
+
+@persistent
+def _playback_clock_frame_change(scene, *args):
+    playback_clock.tick(scene)
+
+
+def _playing():
+    return any(w.screen.is_animation_playing for w in bpy.context.window_manager.windows)
+
+
+# -----------------------------------------------------------------------------
+# Playback governor
+
+# Preview sizes from the sharpest to the fastest.
+_PROXY_LADDER = ('FULL', 'PROXY_100', 'PROXY_75', 'PROXY_50', 'PROXY_25')
+
+
+class PlaybackGovernor:
+    """Steps the preview size of sequencer editors to meet the scene frame rate.
+
+    The size steps down as soon as a window of frames is slower than the frame
+    rate, and back up after the frame rate held for a while. Every step up that
+    has to be taken back doubles that while, so it doesn't bounce.
+    """
+
+    window = 12
+    slow_ratio = 0.9
+    met_ratio = 0.97
+    hold = 2.0
+    max_hold = 60.0
+
+    def __init__(self):
+        self.enabled = False
+        self.fps = 0.0
+        self.spaces = {}
+        # Timers are identified by the function object.
+        self._poll = self.poll
+        self.reset()
+
+    def reset(self):
+        self.samples = []
+        self.level = 0
+        self.min_level = 0
+        self.stable = 0.0
+        self.wait = self.hold
+        self.stepped_up = False
+
+    @property
+    def size(self):
+        return _PROXY_LADDER[self.level]
+
+    @property
+    def label(self):
+        return "Full" if self.level == 0 else self.size[6:] + "%"
+
+    def enable(self, enabled):
+        self.enabled = enabled
+        if enabled:
+            playback_clock.add_listener(self.on_frame)
+        else:
+            playback_clock.remove_listener(self.on_frame)
+            self.restore()
+
+    def capture(self):
+        """Remember the preview size the user chose for every sequencer editor"""
+        for window in bpy.context.window_manager.windows:
+            for area in window.screen.areas:
+                if area.type != 'SEQUENCE_EDITOR':
+                    continue
+                space = area.spaces.active
+                if space.proxy_render_size != 'NONE':
+                    self.spaces[space.as_pointer()] = (space, space.proxy_render_size)
+        self.min_level = min(
+            (_PROXY_LADDER.index(size) if size in _PROXY_LADDER else 0 for _space, size in self.spaces.values()),
+            default=0,
+        )
+        self.level = self.min_level
+        if self.spaces and not bpy.app.timers.is_registered(self._poll):
+            bpy.app.timers.register(self._poll, first_interval=0.25)
+
+    def apply(self):
+        for space, size in self.spaces.values():
+            user_level = _PROXY_LADDER.index(size) if size in _PROXY_LADDER else 0
+            try:
+                space.proxy_render_size = size if self.level <= user_level else self.size
+            except ReferenceError:
+                pass
+
+    def restore(self):
+        self.level = self.min_level
+        self.apply()
+        self.spaces.clear()
+        self.reset()
+        self.fps = 0.0
+
+    def poll(self):
+        if _playing():
+            return 0.25
+        self.restore()
+        _tag_sequencer_redraw()
+        return None
+
+    def on_frame(self, scene, frame, seconds, step):
+        if not self.spaces:
+            self.capture()
+        self.samples.append(seconds)
+        if len(self.samples) < self.window:
+            return
+        del self.samples[:-self.window]
+
+        target = scene.render.fps / scene.render.fps_base
+        self.fps = len(self.samples) / sum(self.samples)
+        if self.fps < target * self.slow_ratio:
+            if self.level < len(_PROXY_LADDER) - 1:
+                if self.stepped_up:
+                    self.wait = min(self.wait * 2, self.max_hold)
+                self.step(1)
+        elif self.fps >= target * self.met_ratio:
+            self.stable += seconds
+            if self.stable >= self.wait and self.level > self.min_level:
+                self.step(-1)
+        else:
+            self.stable = 0.0
+
+    def step(self, direction):
+        self.level += direction
+        self.stepped_up = direction < 0
+        self.samples.clear()
+        self.stable = 0.0
+        self.apply()
+
+
+playback_governor = PlaybackGovernor()
+
+
+class SEQUENCER_OT_PlaybackGovernor(Operator):
+    """Lower the preview size during playback when the scene frame rate can't be met"""
+
+    bl_idname = "sequencer.playback_governor"
+    bl_label = "Adaptive Preview Size"
+    bl_options = {'REGISTER'}
+
+    def execute(self, context):
+        playback_governor.enable(not playback_governor.enabled)
+        return {'FINISHED'}
+
+
+# -----------------------------------------------------------------------------
+# Playback monitor
+
+class PlaybackMonitor:
+    """Records the wall time of the last frames shown during playback in a ring buffer"""
+
+    size = 4096
+    # Frames slower than this many frame durations count as slow.
+    slow_ratio = 1.5
+
+    def __init__(self):
+        self.enabled = False
+        self.frames = np.zeros(self.size, dtype=np.int32)
+        self.seconds = np.zeros(self.size, dtype=np.float64)
+        self.dropped = np.zeros(self.size, dtype=np.int32)
+        self.count = 0
+        self.scene_name = ""
+        self.fps = 0.0
+
+    def enable(self, enabled):
+        self.enabled = enabled
+        if enabled:
+            playback_clock.add_listener(self.on_frame)
+        else:
+            playback_clock.remove_listener(self.on_frame)
+
+    def clear(self):
+        self.count = 0
+
+    def on_frame(self, scene, frame, seconds, step):
+        if scene.name != self.scene_name:
+            self.scene_name = scene.name
+            self.count = 0
+        self.fps = scene.render.fps / scene.render.fps_base
+        i = self.count % self.size
+        self.frames[i] = frame
+        self.seconds[i] = seconds
+        # Frame dropping playback skips frames it can't show in time.
+        self.dropped[i] = step - 1 if step > 1 else 0
+        self.count += 1
+
+    def data(self):
+        """Recorded (frames, seconds, dropped) arrays, oldest first"""
+        if self.count <= self.size:
+            n = self.count
+            return self.frames[:n], self.seconds[:n], self.dropped[:n]
+        i = self.count % self.size
+        return tuple(np.roll(a, -i) for a in (self.frames, self.seconds, self.dropped))
+
+    def slow_mask(self, seconds, dropped):
+        return (seconds > self.slow_ratio / max(self.fps, 1e-6)) | (dropped > 0)
+
+    def stats(self):
+        frames, seconds, dropped = self.data()
+        if not len(seconds):
+            return None
+        return {
+            "frames": len(seconds),
+            "min": float(seconds.min()),
+            "mean": float(seconds.mean()),
+            "p95": float(np.percentile(seconds, 95)),
+            "dropped": int(dropped.sum()),
+            "slow": int(np.count_nonzero(self.slow_mask(seconds, dropped))),
+        }
+
+    def slow_strips(self, scene, limit=0):
+        """Strips ranked by the number of slow frames they were showing on"""
+        frames, seconds, dropped = self.data()
+        slow = self.slow_mask(seconds, dropped)
+        hits = timeline_index.frame_hits(scene, frames[slow], seconds[slow])
+        hits.sort(key=lambda hit: (-hit[1], -hit[2]))
+        return hits[:limit] if limit else hits
+
+
+playback_monitor = PlaybackMonitor()
+
+
+class SEQUENCER_OT_PlaybackMonitor(Operator):
+    """Record the time taken by every frame shown during playback"""
+
+    bl_idname = "sequencer.playback_monitor"
+    bl_label = "Record Playback"
+    bl_options = {'REGISTER'}
+
+    action: EnumProperty(
+        name="Action",
+        items=(
+            ('TOGGLE', "Toggle", "Start or stop recording"),
+            ('CLEAR', "Clear", "Forget the recorded frames"),
+        ),
+        default='TOGGLE',
+    )
+
+    def execute(self, context):
+        if self.action == 'CLEAR':
+            playback_monitor.clear()
+        else:
+            playback_monitor.enable(not playback_monitor.enabled)
+        return {'FINISHED'}
+
+
+class SEQUENCER_OT_PlaybackMonitorExport(Operator, ExportHelper):
+    """Export the recorded playback frame times as CSV"""
+
+    bl_idname = "sequencer.playback_monitor_export"
+    bl_label = "Export Playback Times"
+    bl_options = {'REGISTER'}
+
+    filename_ext = ".csv"
+    filter_glob: StringProperty(default="*.csv", options={'HIDDEN'})
+
+    @classmethod
+    def poll(cls, context):
+        return playback_monitor.count > 0
+
+    def execute(self, context):
+        scene = bpy.data.scenes.get(playback_monitor.scene_name) or context.scene
+        frames, seconds, dropped = playback_monitor.data()
+        strips = {}
+        for frame in np.unique(frames).tolist():
+            strips[frame] = " ".join(timeline_index.strips_at_frame(scene, frame))
+
+        machine = platform.node()
+        build = bpy.app.version_string
+        with open(self.filepath, "w", newline="", encoding="utf-8") as fh:
+            writer = csv.writer(fh)
+            writer.writerow(("machine", "blender", "scene", "fps", "frame", "ms", "dropped", "strips"))
+            for frame, sec, drop in zip(frames.tolist(), seconds.tolist(), dropped.tolist()):
+                writer.writerow((
+                    machine, build, scene.name, "%.3f" % playback_monitor.fps,
+                    frame, "%.3f" % (sec * 1000.0), drop, strips[frame],
+                ))
+        self.report({'INFO'}, "Exported %d frames" % len(frames))
+        return {'FINISHED'}
+
+
+# -----------------------------------------------------------------------------
+# Render cost profiler
+#
+# Every strip renders some sample frames alone, with the other strips muted, in
+# a background worker. Effects keep their inputs, whose cost is subtracted.
+
+def mute_snapshot(sequences):
+    mute = np.empty(len(sequences), dtype=bool)
+    sequences.foreach_get("mute", mute)
+    return mute
+
+
+def mute_restore(sequences, snapshot):
+    sequences.foreach_set("mute", snapshot)
+
+
+def _strip_inputs(strip):
+    inputs = []
+    for attr in ("input_1", "input_2", "input_3"):
+        s = getattr(strip, attr, None)
+        if s is not None:
+            inputs.append(s)
+            inputs.extend(_strip_inputs(s))
+    return inputs
+
+
+def _render_seconds(scene, frame):
+    scene.frame_set(frame)
+    # Mutes written with foreach_set skip the update freeing the cache, and
+    # effect inputs would stay cached from earlier renders.
+    bpy.ops.sequencer.refresh_all({"scene": scene})
+    start = time.perf_counter()
+    bpy.ops.render.render(scene=scene.name)
+    return time.perf_counter() - start
+
+
+def profile_worker(scene_name, strip_names, samples, output_path):
+    """Time sample frames of strips rendered alone, run inside a background worker"""
+    scene = bpy.data.scenes[scene_name]
+    sequences = scene.sequence_editor.sequences
+    snapshot = mute_snapshot(sequences)
+    names = [s.name for s in sequences]
+
+    mute_restore(sequences, np.ones(len(sequences), dtype=bool))
+    baseline = min(_render_seconds(scene, scene.frame_start) for _ in range(3))
+
+    results = {}
+    for name in strip_names:
+        strip = sequences[name]
+        keep = {name, *(s.name for s in _strip_inputs(strip))}
+        mute_restore(sequences, np.array([n not in keep for n in names], dtype=bool))
+        start, end = strip.frame_final_start, strip.frame_final_end
+        frames = sorted({start + (end - start) * i // samples for i in range(samples)})
+        times = [_render_seconds(scene, frame) for frame in frames]
+        results[name] = max(0.0, float(np.median(times)) - baseline) * 1000.0
+
+    mute_restore(sequences, snapshot)
+    with open(output_path, "w", encoding="utf-8") as fh:
+        json.dump({"baseline_ms": baseline * 1000.0, "strips": results}, fh)
+
+
+_BAKE_HINT_TYPES = {'SCENE', 'META', 'GAUSSIAN_BLUR', 'GLOW', 'TRANSFORM', 'SPEED', 'MULTICAM'}
+
+
+def render_cost_hint(scene, strip, ms):
+    """Suggested fix for a strip taking ms per frame to render"""
+    if ms * scene.render.fps / scene.render.fps_base < 1000.0 * 0.5:
+        return ""
+    if strip.type in {'MOVIE', 'IMAGE'} and not strip.use_proxy:
+        return "Build proxy"
+    if strip.type in _BAKE_HINT_TYPES or len(getattr(strip, "modifiers", ())):
+        return "Bake"
+    return ""
+
+
+class SEQUENCER_OT_ProfileStrips(Operator):
+    """Rank strips by the time they take to render, timed in a background process"""
+
+    bl_idname = "sequencer.profile_strips"
+    bl_label = "Profile Render Cost"
+    bl_options = {'REGISTER'}
+
+    samples: IntProperty(
+        name="Sample Frames",
+        min=1, max=100,
+        default=5,
+        description="Number of frames rendered per strip",
+    )
+    selected_only: BoolProperty(
+        name="Only Selected",
+        default=False,
+        description="Only profile selected strips",
+    )
+
+    @classmethod
+    def poll(cls, context):
+        return (context.scene and context.scene.sequence_editor)
+
+    def execute(self, context):
+        if not bpy.data.filepath:
+            self.report({'ERROR'}, "Save the file first, the profile is stored next to it")
+            return {'CANCELLED'}
+
+        scene = context.scene
+        names = [
+            s.name for s in scene.sequence_editor.sequences
+            if s.type != 'SOUND' and not s.mute and (s.select or not self.selected_only)
+        ]
+        if not names:
+            self.report({'WARNING'}, "No strips to profile")
+            return {'CANCELLED'}
+
+        output_path = os.path.join(project_cache_dir(), "profile_%s.json" % bpy.path.clean_name(scene.name))
+        scene_name = scene.name
+        task = {
+            "command": worker_command(
+                save_worker_copy(),
+                "vse.profile_worker(%r, %r, %d, %r)" % (scene_name, names, self.samples, output_path),
+            ),
+        }
+
+        def on_finished(job):
+            scene = bpy.data.scenes.get(scene_name)
+            if scene is None or not task.get("ok") or not os.path.exists(output_path):
+                return
+            with open(output_path, "r", encoding="utf-8") as fh:
+                costs = json.load(fh)["strips"]
+            sequences = scene.sequence_editor.sequences_all
+            profile = {}
+            for name, ms in costs.items():
+                strip = sequences.get(name)
+                if strip is None:
+                    continue
+                # Effects were rendered with their inputs.
+                self_ms = max(0.0, ms - sum(costs.get(s.name, 0.0) for s in _strip_inputs(strip)))
+                profile[name] = {"ms": ms, "self_ms": self_ms, "hint": render_cost_hint(scene, strip, self_ms)}
+            scene["vse_render_cost"] = profile
+
+        BackgroundJob("Profile", [task], 1, on_finished=on_finished).start()
+        return {'FINISHED'}
+
+
+# -----------------------------------------------------------------------------
+# Bake
+#
+# Strips are rendered to image sequences by background workers and swapped for
+# the baked images. The original strip is kept muted in a free channel above,
+# and the bake is dropped as soon as the hash of its state changes.
+
+# Placement and display flags don't change what a strip renders.
+_STATE_SKIP = {
+    "rna_type", "name", "select", "select_left_handle", "select_right_handle",
+    "mute", "lock", "channel", "frame_start", "frame_final_start", "frame_final_end",
+    "proxy", "show_waveform",
+}
+
+
+def _rna_state(data, out, skip=frozenset(), depth=0):
+    for prop in data.bl_rna.properties:
+        key = prop.identifier
+        if key in skip or key in _STATE_SKIP or (prop.type in {'POINTER', 'COLLECTION'} and depth > 2):
+            continue
+        value = getattr(data, key, None)
+        if prop.type == 'POINTER':
+            if isinstance(value, bpy.types.ID):
+                out.append("%s=%s" % (key, value.name))
+            elif isinstance(value, bpy.types.Sequence):
+                out.append("%s=%s" % (key, strip_state_hash(value)))
+            elif value is not None:
+                _rna_state(value, out, depth=depth + 1)
+        elif prop.type == 'COLLECTION':
+            for item in value:
+                if isinstance(item, bpy.types.Sequence):
+                    # Strips inside a meta render at their own placement.
+                    out.append("%s:%d:%d" % (strip_state_hash(item), item.channel, item.frame_start))
+                else:
+                    _rna_state(item, out, depth=depth + 1)
+        elif getattr(prop, "array_length", 0):
+            out.append("%s=%r" % (key, tuple(value)))
+        else:
+            out.append("%s=%r" % (key, value))
+
+
+def strip_state_hash(strip):
+    """Hash of all the settings, inputs, media and keyframes a strip renders from"""
+    out = []
+    _rna_state(strip, out)
+    for attr in ("filepath", "directory"):
+        path = getattr(strip, attr, None)
+        if path:
+            path = bpy.path.abspath(path)
+            out.append("%s:%s" % (path, os.path.getmtime(path) if os.path.exists(path) else None))
+    scene = strip.id_data
+    action = scene.animation_data and scene.animation_data.action
+    if action:
+        prefix = 'sequence_editor.sequences_all["%s"]' % strip.name
+        for fcurve in action.fcurves:
+            if fcurve.data_path.startswith(prefix):
+                co = np.empty(len(fcurve.keyframe_points) * 2, dtype=np.float32)
+                fcurve.keyframe_points.foreach_get("co", co)
+                out.append("%s[%d]:%s" % (fcurve.data_path[len(prefix):], fcurve.array_index, co.tobytes().hex()))
+    return hashlib.sha1("\n".join(out).encode()).hexdigest()
+
+
+def bake_worker(scene_name, strip_name, directory):
+    """Render a strip alone to an image sequence, run inside a background worker"""
+    scene = bpy.data.scenes[scene_name]
+    sequences = scene.sequence_editor.sequences
+    strip = sequences[strip_name]
+    keep = {strip.name, *(s.name for s in _strip_inputs(strip))}
+    mute_restore(sequences, np.array([s.name not in keep for s in sequences], dtype=bool))
+    # Opacity and blending are applied by the baked strip.
+    strip.blend_type = 'REPLACE'
+    strip.blend_alpha = 1.0
+    if scene.animation_data and scene.animation_data.action:
+        fcurves = scene.animation_data.action.fcurves
+        for fcurve in list(fcurves):
+            if fcurve.data_path == 'sequence_editor.sequences_all["%s"].blend_alpha' % strip.name:
+                fcurves.remove(fcurve)
+
+    render = scene.render
+    render.use_sequencer = True
+    render.use_compositing = False
+    render.resolution_percentage = 100
+    render.use_file_extension = True
+    render.image_settings.file_format = 'PNG'
+    render.image_settings.color_mode = 'RGBA'
+    # Write the sequencer colors as they are, the view transform is applied
+    # when the baked strip is displayed.
+    view = scene.view_settings
+    view.view_transform = 'Standard'
+    view.look = 'None'
+    view.exposure = 0.0
+    view.gamma = 1.0
+    view.use_curve_mapping = False
+
+    scene.frame_start = strip.frame_final_start
+    scene.frame_end = strip.frame_final_end - 1
+    scene.frame_step = 1
+    render.filepath = os.path.join(directory, "######")
+    bpy.ops.render.render(animation=True, scene=scene.name)
+
+
+def _bake_files(directory, frames):
+    if not os.path.isdir(directory):
+        return None
+    files = sorted(f for f in os.listdir(directory) if f.endswith(".png"))
+    return files if len(files) >= frames else None
+
+
+def bake_swap(scene, strip, directory, state_hash):
+    """Replace a strip by its baked images, return the baked strip or an error message"""
+    files = _bake_files(directory, strip.frame_final_duration)
+    if files is None:
+        return "bake is incomplete"
+    start, end, channel = strip.frame_final_start, strip.frame_final_end, strip.channel
+    hidden = timeline_index.top_free_channel(scene, start, end)
+    if hidden is None or hidden <= channel:
+        return "no free channel above it to keep the original"
+
+    inputs = _strip_inputs(strip)
+    record = {
+        "source": strip.name,
+        "channel": channel,
+        "frame_start": start,
+        "mute": strip.mute,
+        "inputs": {s.name: s.mute for s in inputs},
+        "hash": state_hash,
+        "directory": directory,
+    }
+    strip.channel = hidden
+    strip.mute = True
+    strip.select = False
+    for s in inputs:
+        s.mute = True
+
+    baked = scene.sequence_editor.sequences.new_image(
+        name=strip.name + ".baked",
+        filepath=os.path.join(directory, files[0]),
+        channel=channel,
+        frame_start=start,
+    )
+    for filename in files[1:]:
+        baked.elements.append(filename)
+    baked.blend_type = strip.blend_type
+    baked.blend_alpha = strip.blend_alpha
+    baked.colorspace_settings.name = scene.sequencer_colorspace_settings.name
+    baked["vse_bake"] = record
+    # Several strips are swapped before any handler runs.
+    timeline_index.tag()
+    return baked
+
+
+def bake_restore(scene, baked):
+    """Remove a baked strip and bring its original back"""
+    record = baked["vse_bake"].to_dict()
+    # The baked strip may have been moved since.
+    offset = baked.frame_final_start - record.get("frame_start", baked.frame_final_start)
+    channel = baked.channel
+    ed = scene.sequence_editor
+    ed.sequences.remove(baked)
+    strip = ed.sequences_all.get(record["source"])
+    if strip is None:
+        return None
+    if offset:
+        # Effects follow their inputs.
+        for s in (strip, *_strip_inputs(strip)):
+            if not getattr(s, "input_count", 0):
+                s.frame_start += offset
+    strip.channel = channel
+    strip.mute = record["mute"]
+    for name, mute in record["inputs"].items():
+        s = ed.sequences_all.get(name)
+        if s is not None:
+            s.mute = mute
+    timeline_index.tag()
+    return strip
+
+
+def _bake_check():
+    for scene in bpy.data.scenes:
+        ed = scene.sequence_editor
+        if not ed:
+            continue
+        for baked in [s for s in ed.sequences if "vse_bake" in s]:
+            source = ed.sequences_all.get(baked["vse_bake"]["source"])
+            if source is not None and strip_state_hash(source) != baked["vse_bake"]["hash"]:
+                bake_restore(scene, baked)
+    return None
+
+
+@persistent
+def _bake_depsgraph_update(scene, depsgraph=None):
+    # Edits come in bursts, hash the originals once they settle.
+    if not bpy.app.timers.is_registered(_bake_check):
+        bpy.app.timers.register(_bake_check, first_interval=0.5)
+
+
+@persistent
+def _bake_load_post(*args):
+    # Originals may have changed while the file was closed.
+    _bake_depsgraph_update(None)
+
+
+class SEQUENCER_OT_BakeStrips(Operator):
+    """Render selected strips to image sequences in background and use them instead"""
+
+    bl_idname = "sequencer.bake_strips"
+    bl_label = "Bake Selected"
+    bl_options = {'REGISTER', 'UNDO'}
+
+    workers: IntProperty(
+        name="Workers",
+        min=0, max=256,
+        default=1,
+        description="Number of worker processes, 0 for one per CPU core",
+    )
+
+    @classmethod
+    def poll(cls, context):
+        return (context.scene and context.scene.sequence_editor)
+
+    def execute(self, context):
+        scene = context.scene
+        ed = scene.sequence_editor
+        if not bpy.data.filepath:
+            self.report({'ERROR'}, "Save the file first, bakes are stored next to it")
+            return {'CANCELLED'}
+        if len(ed.meta_stack):
+            self.report({'ERROR'}, "Bake from the top level, or bake the meta strip")
+            return {'CANCELLED'}
+
+        strips = [s for s in context.selected_sequences if s.type != 'SOUND' and "vse_bake" not in s]
+        if not strips:
+            self.report({'WARNING'}, "No strips to bake")
+            return {'CANCELLED'}
+
+        scene_name = scene.name
+        blend_path = None
+        tasks = []
+        for strip in strips:
+            state_hash = strip_state_hash(strip)
+            directory = project_cache_dir("bakes", "%s_%s" % (bpy.path.clean_name(strip.name), state_hash[:12]))
+            # A bake of the same state is reused as it is.
+            if _bake_files(directory, strip.frame_final_duration):
+                result = bake_swap(scene, strip, directory, state_hash)
+                if isinstance(result, str):
+                    self.report({'WARNING'}, "%s: %s" % (strip.name, result))
+                continue
+            if blend_path is None:
+                blend_path = save_worker_copy()
+            tasks.append({
+                "command": worker_command(
+                    blend_path,
+                    "vse.bake_worker(%r, %r, %r)" % (scene_name, strip.name, directory),
+                ),
+                "strip": strip.name,
+                "directory": directory,
+                "hash": state_hash,
+            })
+
+        def on_task_done(task):
+            scene = bpy.data.scenes.get(scene_name)
+            strip = scene and scene.sequence_editor.sequences.get(task["strip"])
+            # Skip strips edited while they were baking.
+            if not task["ok"] or strip is None or strip_state_hash(strip) != task["hash"]:
+                return
+            bake_swap(scene, strip, task["directory"], task["hash"])
+
+        if tasks:
+            BackgroundJob("Bake", tasks, self.workers, on_task_done=on_task_done).start()
+        return {'FINISHED'}
+
+
+class SEQUENCER_OT_BakeRestore(Operator):
+    """Remove selected baked strips and bring back their originals"""
+
+    bl_idname = "sequencer.bake_restore"
+    bl_label = "Restore Baked"
+    bl_options = {'REGISTER', 'UNDO'}
+
+    @classmethod
+    def poll(cls, context):
+        return (context.scene and context.scene.sequence_editor)
+
+    def execute(self, context):
+        scene = context.scene
+        baked = [s for s in context.selected_sequences if "vse_bake" in s]
+        if not baked:
+            self.report({'WARNING'}, "No baked strips selected")
+            return {'CANCELLED'}
+        for s in baked:
+            strip = bake_restore(scene, s)
+            if strip is not None:
+                strip.select = True
+        return {'FINISHED'}
+
+
+# -----------------------------------------------------------------------------
+# Frame cache
+#
+# Final frames are kept encoded in one append-only container file next to the
+# project, read through mmap. Keys hash the state of the strips shown on the
+# frame, so an edit only misses the frames the edited strip covers. Python
+# can't hand images to the preview, the cache serves renders which write the
+# cached frames instead of rendering them again.
+
+class FrameCache:
+    """Encoded frames by key in a container file, with an LRU size budget"""
+
+    def __init__(self, directory, name):
+        self.data_path = os.path.join(directory, name + ".frames")
+        self.index_path = os.path.join(directory, name + ".index.json")
+        # key: [offset, length, frame, last used]
+        self.entries = {}
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self.dirty = False
+        self._map = None
+        if os.path.exists(self.index_path) and os.path.exists(self.data_path):
+            with open(self.index_path, "r", encoding="utf-8") as fh:
+                index = json.load(fh)
+            # An index ahead of the data belongs to a container that was lost.
+            if index["size"] <= os.path.getsize(self.data_path):
+                self.entries = index["entries"]
+                self.size = index["size"]
+
+    @property
+    def used(self):
+        return sum(entry[1] for entry in self.entries.values())
+
+    def _data(self):
+        if self._map is None or len(self._map) < self.size:
+            self.close()
+            with open(self.data_path, "rb") as fh:
+                self._map = mmap.mmap(fh.fileno(), 0, access=mmap.ACCESS_READ)
+        return self._map
+
+    def close(self):
+        if self._map is not None:
+            self._map.close()
+            self._map = None
+
+    def __contains__(self, key):
+        return key in self.entries
+
+    def get(self, key):
+        entry = self.entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        entry[3] = time.time()
+        self.dirty = True
+        return self._data()[entry[0]:entry[0] + entry[1]]
+
+    def put(self, key, frame, data):
+        if key in self.entries:
+            return
+        # The directory is only created by the first write.
+        os.makedirs(os.path.dirname(self.data_path), exist_ok=True)
+        with open(self.data_path, "ab") as fh:
+            offset = fh.tell()
+            fh.write(data)
+        self.entries[key] = [offset, len(data), frame, time.time()]
+        self.size = offset + len(data)
+
+    def drop(self, keys):
+        for key in keys:
+            self.entries.pop(key, None)
+
+    def evict(self, budget):
+        """Drop least recently used frames until the cache fits the budget"""
+        used = self.used
+        if used > budget:
+            for key, entry in sorted(self.entries.items(), key=lambda item: item[1][3]):
+                if used <= budget * 0.9:
+                    break
+                used -= entry[1]
+                del self.entries[key]
+        if self.size > 2 * used:
+            self.compact()
+
+    def compact(self):
+        """Rewrite the container without the space of dropped frames"""
+        tmp_path = self.data_path + ".tmp"
+        data = self._data() if self.entries else None
+        offset = 0
+        with open(tmp_path, "wb") as fh:
+            for entry in sorted(self.entries.values()):
+                fh.write(data[entry[0]:entry[0] + entry[1]])
+                entry[0] = offset
+                offset += entry[1]
+        self.close()
+        os.replace(tmp_path, self.data_path)
+        self.size = offset
+
+    def save(self):
+        os.makedirs(os.path.dirname(self.index_path), exist_ok=True)
+        with open(self.index_path + ".tmp", "w", encoding="utf-8") as fh:
+            json.dump({"size": self.size, "entries": self.entries}, fh)
+        os.replace(self.index_path + ".tmp", self.index_path)
+        self.dirty = False
+
+    def flush(self):
+        """Save the index when reads changed the last used times"""
+        if self.dirty:
+            self.save()
+
+
+_frame_caches = {}
+
+
+def frame_cache(scene):
+    """Frame cache of a scene of the saved project, None when unsaved"""
+    directory = project_cache_dir("frames", create=False)
+    if directory is None:
+        return None
+    name = bpy.path.clean_name(scene.name)
+    path = os.path.join(directory, name)
+    cache = _frame_caches.get(path)
+    if cache is None:
+        cache = _frame_caches[path] = FrameCache(directory, name)
+    return cache
+
+
+def frame_cache_budget(scene):
+    return scene.get("vse_frame_cache_mb", 2048) * 1024 * 1024
+
+
+def frame_keys(scene, frames):
+    """Frame cache keys of frames, from the render settings and the strips shown on them"""
+    r = scene.render
+    base = repr((
+        r.resolution_x, r.resolution_y, r.resolution_percentage,
+        r.pixel_aspect_x, r.pixel_aspect_y, r.fps, r.fps_base,
+        scene.sequencer_colorspace_settings.name,
+    ))
+    strips = [s for s in scene.sequence_editor.sequences if not s.mute and s.type != 'SOUND']
+    start = np.array([s.frame_final_start for s in strips], dtype=np.int64)
+    end = np.array([s.frame_final_end for s in strips], dtype=np.int64)
+    hashes = {}
+    keys = []
+    for frame in frames:
+        parts = [base]
+        for i in np.flatnonzero((start <= frame) & (end > frame)):
+            s = strips[i]
+            if s.name not in hashes:
+                hashes[s.name] = strip_state_hash(s)
+            # Strips moved in time still match their own frames.
+            parts.append("%s:%d:%d" % (hashes[s.name], s.channel, frame - s.frame_start))
+        keys.append(hashlib.sha1("|".join(parts).encode()).hexdigest())
+    return keys
+
+
+def frame_cache_drop_stale(scene):
+    """Drop cached frames which no longer match the strips shown on their frame"""
+    cache = frame_cache(scene)
+    if cache is None or not cache.entries:
+        return 0
+    frames = sorted({entry[2] for entry in cache.entries.values()})
+    current = set(frame_keys(scene, frames))
+    stale = [key for key in cache.entries if key not in current]
+    cache.drop(stale)
+    cache.save()
+    return len(stale)
+
+
+def frame_cache_worker(scene_name, frames, keys, inbox):
+    """Render frames to '<key>.png' files in inbox, run inside a background worker"""
+    scene = bpy.data.scenes[scene_name]
+    render = scene.render
+    render.use_sequencer = True
+    render.use_compositing = False
+    render.image_settings.file_format = 'PNG'
+    render.image_settings.color_mode = 'RGBA'
+    render.image_settings.color_depth = '8'
+    for frame, key in zip(frames, keys):
+        scene.frame_set(frame)
+        bpy.ops.render.render(scene=scene.name)
+        path = os.path.join(inbox, key + ".png")
+        bpy.data.images["Render Result"].save_render(path + ".tmp.png", scene=scene)
+        os.replace(path + ".tmp.png", path)
+
+
+def frame_cache_ingest(scene, inbox, frames_by_key):
+    """Move rendered frames from inbox into the scene's frame cache"""
+    cache = frame_cache(scene)
+    for filename in os.listdir(inbox):
+        key = filename[:-4]
+        if not filename.endswith(".png") or key not in frames_by_key:
+            continue
+        path = os.path.join(inbox, filename)
+        with open(path, "rb") as fh:
+            cache.put(key, frames_by_key[key], fh.read())
+        os.remove(path)
+    cache.evict(frame_cache_budget(scene))
+    cache.save()
+
+
+def frame_cache_job(scene, frames, workers=0, label="Cache", chunk=8):
+    """Start a background job rendering the frames missing from the cache, in order"""
+    cache = frame_cache(scene)
+    keys = frame_keys(scene, frames)
+    todo = [(frame, key) for frame, key in zip(frames, keys) if key not in cache]
+    if not todo:
+        return None
+
+    inbox = project_cache_dir("frames", "inbox")
+    blend_path = save_worker_copy()
+    scene_name = scene.name
+    frames_by_key = {key: frame for frame, key in todo}
+    tasks = []
+    for i in range(0, len(todo), chunk):
+        part = todo[i:i + chunk]
+        tasks.append({
+            "command": worker_command(
+                blend_path,
+                "vse.frame_cache_worker(%r, %r, %r, %r)" % (
+                    scene_name, [frame for frame, _ in part], [key for _, key in part], inbox,
+                ),
+            ),
+        })
+
+    def on_task_done(task):
+        scene = bpy.data.scenes.get(scene_name)
+        if scene is not None:
+            frame_cache_ingest(scene, inbox, frames_by_key)
+
+    job = BackgroundJob(label, tasks, workers, on_task_done=on_task_done)
+    job.start()
+    return job
+
+
+class SEQUENCER_OT_FrameCacheBuild(Operator):
+    """Render the frames of the preview range, or of the scene, to the disk frame cache in background, for later renders to reuse"""
+
+    bl_idname = "sequencer.frame_cache_build"
+    bl_label = "Cache Frames"
+    bl_options = {'REGISTER'}
+
+    workers: IntProperty(
+        name="Workers",
+        min=0, max=256,
+        default=0,
+        description="Number of worker processes, 0 for one per CPU core",
+    )
+
+    @classmethod
+    def poll(cls, context):
+        return (context.scene and context.scene.sequence_editor)
+
+    def execute(self, context):
+        if not bpy.data.filepath:
+            self.report({'ERROR'}, "Save the file first, the frame cache is stored next to it")
+            return {'CANCELLED'}
+        scene = context.scene
+        if scene.use_preview_range:
+            frames = range(scene.frame_preview_start, scene.frame_preview_end + 1)
+        else:
+            frames = range(scene.frame_start, scene.frame_end + 1)
+        scene.setdefault("vse_frame_cache_mb", 2048)
+        if frame_cache_job(scene, list(frames), self.workers) is None:
+            self.report({'INFO'}, "All frames are cached")
+        return {'FINISHED'}
+
+
+class SEQUENCER_OT_FrameCacheClear(Operator):
+    """Remove frames from the disk frame cache"""
+
+    bl_idname = "sequencer.frame_cache_clear"
+    bl_label = "Clear Frame Cache"
+    bl_options = {'REGISTER'}
+
+    stale_only: BoolProperty(
+        name="Only Stale",
+        default=True,
+        description="Only remove frames which no longer match the timeline",
+    )
+
+    @classmethod
+    def poll(cls, context):
+        return (context.scene and context.scene.sequence_editor and bpy.data.filepath)
+
+    def execute(self, context):
+        scene = context.scene
+        cache = frame_cache(scene)
+        if self.stale_only:
+            count = frame_cache_drop_stale(scene)
+        else:
+            count = len(cache.entries)
+            cache.entries.clear()
+        cache.compact()
+        cache.save()
+        self.report({'INFO'}, "Removed %d frames" % count)
+        return {'FINISHED'}
+
+
+# -----------------------------------------------------------------------------
+# Preview range warm-up
+#
+# Python can't put images in the sequencer's RAM cache, the preview does when
+# it draws a frame. The warm-up steps the playhead through the preview range
+# one frame per timer tick, so the first playback reads the frames from the
+# cache instead of rendering them.
+
+def warmup_frames(scene):
+    """Frames of the preview range in the order playback from the playhead reaches them"""
+    if scene.use_preview_range:
+        start, end = scene.frame_preview_start, scene.frame_preview_end
+    else:
+        start, end = scene.frame_start, scene.frame_end
+    current = min(max(scene.frame_current, start), end)
+    # Frames behind the playhead are only reached after looping.
+    frames = sorted(
+        range(start, end + 1),
+        key=lambda frame: frame - current if frame >= current else 2 * (current - frame),
+    )
+    # Frames past the cache limit would only evict the first ones.
+    render = scene.render
+    scale = render.resolution_percentage / 100.0
+    frame_mb = render.resolution_x * scale * render.resolution_y * scale * 4 / (1024 * 1024)
+    limit = bpy.context.preferences.system.memory_cache_limit
+    return frames[:max(1, int(limit / frame_mb))] if frame_mb else frames
+
+
+class PreviewWarmupJob(BackgroundJob):
+    """Steps the playhead through frames of a scene and puts it back afterwards.
+
+    Shown and cancelled with the background jobs, a frame change by the user
+    or playback stops it where it is.
+    """
+
+    def __init__(self, scene, frames):
+        super().__init__("Warm-up", [])
+        self.scene_name = scene.name
+        self.frames = list(frames)
+        self.total = len(self.frames)
+        self.home = scene.frame_current
+        self.expected = scene.frame_current
+        self.over = False
+        # Timers are identified by the function object.
+        self._step = self.step
+
+    def start(self):
+        super().start()
+        bpy.app.timers.register(self._step, first_interval=0.0)
+
+    def step(self):
+        scene = bpy.data.scenes.get(self.scene_name)
+        if scene is None or self.over:
+            self.over = True
+            return None
+        if scene.frame_current != self.expected or _playing():
+            # The user took over the playhead.
+            self.over = True
+            return None
+        if self.cancelled or not self.frames:
+            scene.frame_current = self.home
+            self.over = True
+            return None
+        scene.frame_current = self.expected = self.frames.pop(0)
+        self.done += 1
+        _tag_sequencer_redraw()
+        return 0.0
+
+    def poll(self):
+        return self.over
+
+    def cancel(self):
+        self.cancelled = True
+
+    def finish(self):
+        if bpy.app.timers.is_registered(self._step):
+            bpy.app.timers.unregister(self._step)
+
+
+class PreviewWarmup:
+    """Warms the preview range up whenever it changes"""
+
+    delay = 1.0
+
+    def __init__(self):
+        self.jobs = {}
+        self.ranges = {}
+        # Timers are identified by the function object.
+        self._check = self.check
+
+    def start(self, scene):
+        self.stop(scene.name)
+        self.ranges[scene.name] = self.scene_range(scene)
+        job = PreviewWarmupJob(scene, warmup_frames(scene))
+        self.jobs[scene.name] = job
+        job.start()
+        return job
+
+    def stop(self, scene_name=None):
+        """Stop warm-ups without moving the playhead back"""
+        for name in list(self.jobs) if scene_name is None else [scene_name]:
+            job = self.jobs.pop(name, None)
+            if job is not None:
+                job.over = True
+
+    @staticmethod
+    def scene_range(scene):
+        if scene.use_preview_range:
+            return (scene.frame_preview_start, scene.frame_preview_end)
+        return (scene.frame_start, scene.frame_end)
+
+    def subscribe(self):
+        bpy.msgbus.clear_by_owner(self)
+        for prop in ("use_preview_range", "frame_preview_start", "frame_preview_end", "frame_start", "frame_end"):
+            bpy.msgbus.subscribe_rna(
+                key=(bpy.types.Scene, prop),
+                owner=self,
+                args=(),
+                notify=self.on_range_change,
+            )
+
+    def on_range_change(self):
+        # Wait for the range to settle, dragging it sends many changes.
+        if bpy.app.timers.is_registered(self._check):
+            bpy.app.timers.unregister(self._check)
+        bpy.app.timers.register(self._check, first_interval=self.delay)
+
+    def check(self):
+        scene = bpy.context.scene
+        if (
+                scene and scene.sequence_editor and scene.get("vse_auto_warmup") and not _playing()
+                and self.ranges.get(scene.name) != self.scene_range(scene)
+        ):
+            self.start(scene)
+        return None
+
+
+preview_warmup = PreviewWarmup()
+
+
+@persistent
+def _preview_warmup_load_post(*args):
+    # Jobs of the previous file end, the message bus is cleared on load.
+    preview_warmup.stop()
+    preview_warmup.ranges.clear()
+    preview_warmup.subscribe()
+
+
+class SEQUENCER_OT_PreviewWarmup(Operator):
+    """Step the preview through the preview range from the playhead outward, so playback reads it from the cache"""
+
+    bl_idname = "sequencer.preview_warmup"
+    bl_label = "Warm Up Preview Range"
+    bl_options = {'REGISTER'}
+
+    auto: BoolProperty(
+        name="On Range Change",
+        default=False,
+        description="Toggle warming up the preview range whenever it changes instead",
+    )
+
+    @classmethod
+    def poll(cls, context):
+        return (context.scene and context.scene.sequence_editor)
+
+    def execute(self, context):
+        scene = context.scene
+        if self.auto:
+            scene["vse_auto_warmup"] = not scene.get("vse_auto_warmup", False)
+            return {'FINISHED'}
+
+        if _playing():
+            self.report({'ERROR'}, "Stop playback first")
+            return {'CANCELLED'}
+        preview_warmup.start(scene)
+        return {'FINISHED'}
+
+
+# -----------------------------------------------------------------------------
+# Segmented render
+#
+# The frame range is split into chunks at cuts, each chunk is rendered by its
+# own worker. A checkpoint file keeps the chunks which are done, keyed by the
+# frame cache keys of their frames, so a render resumes after a crash and an
+# edit only renders the chunks it touches again.
+
+# Frames per chunk, cut points within a quarter of it move the chunk bound.
+SEGMENT_LENGTH = 250
+
+_FFMPEG_AUDIO_CODECS = {
+    'AAC': "aac",
+    'AC3': "ac3",
+    'FLAC': "flac",
+    'MP2': "mp2",
+    'MP3': "libmp3lame",
+    'OPUS': "libopus",
+    'PCM': "pcm_s16le",
+    'VORBIS': "libvorbis",
+}
+
+
+def segment_bounds(scene, chunk_length=SEGMENT_LENGTH):
+    """Split the scene range in (start, end) chunks of about chunk_length frames, ending on cuts where possible.
+
+    The bounds don't depend on the number of workers, so a render resumed with
+    another number of workers finds the same chunks in the checkpoint.
+    """
+    cuts = np.array(timeline_index.edit_points(scene), dtype=np.int32)
+
+    first, last = scene.frame_start, scene.frame_end + 1
+    chunk_length = max(1, chunk_length)
+    tolerance = chunk_length / 4
+    bounds = [first]
+    for bound in range(first + chunk_length, last, chunk_length):
+        if len(cuts):
+            nearest = cuts[np.abs(cuts - bound).argmin()]
+            if abs(nearest - bound) <= tolerance:
+                bound = int(nearest)
+        if bounds[-1] < bound < last:
+            bounds.append(bound)
+    bounds.append(last)
+    return [(a, b - 1) for a, b in zip(bounds[:-1], bounds[1:])]
+
+
+def _render_output_signature(scene):
+    r = scene.render
+    settings = [r.filepath, r.image_settings.file_format, r.image_settings.color_mode, r.image_settings.color_depth]
+    if r.is_movie_format:
+        f = r.ffmpeg
+        settings += [f.format, f.codec, f.video_bitrate, f.gopsize, f.constant_rate_factor, f.ffmpeg_preset]
+    return repr(settings)
+
+
+def segment_worker(scene_name, frames, directory):
+    """Render frames of a chunk, run inside a background worker.
+
+    Image sequences are written to the output path frame by frame, movies
+    render the frames as one file in directory, without audio.
+    """
+    scene = bpy.data.scenes[scene_name]
+    render = scene.render
+    if render.is_movie_format:
+        render.ffmpeg.audio_codec = 'NONE'
+        scene.frame_start = frames[0]
+        scene.frame_end = frames[-1]
+        render.filepath = os.path.join(directory, "chunk_")
+        bpy.ops.render.render(animation=True, scene=scene.name)
+    else:
+        for frame in frames:
+            scene.frame_set(frame)
+            bpy.ops.render.render(write_still=True, scene=scene.name)
+
+
+def mixdown_worker(scene_name, filepath):
+    """Mix the scene sound down to a WAV file, run inside a background worker"""
+    scene = bpy.data.scenes[scene_name]
+    bpy.ops.sound.mixdown({"scene": scene}, filepath=filepath, container='WAV', codec='PCM', format='S16')
+
+
+def _segment_checkpoint_path(scene):
+    return os.path.join(project_cache_dir("segments"), bpy.path.clean_name(scene.name) + ".json")
+
+
+class SEQUENCER_OT_SegmentedRender(Operator):
+    """Render the scene in chunks split at cuts, in parallel background processes"""
+
+    bl_idname = "sequencer.segmented_render"
+    bl_label = "Segmented Render"
+    bl_options = {'REGISTER'}
+
+    workers: IntProperty(
+        name="Workers",
+        min=0, max=256,
+        default=0,
+        description="Number of worker processes, 0 for one per CPU core",
+    )
+    chunk_length: IntProperty(
+        name="Chunk Length",
+        min=1, max=100000,
+        default=SEGMENT_LENGTH,
+        description="Number of frames rendered by a worker at once, changing it renders all chunks again",
+    )
+
+    @classmethod
+    def poll(cls, context):
+        return (context.scene and context.scene.sequence_editor)
+
+    def execute(self, context):
+        if not bpy.data.filepath:
+            self.report({'ERROR'}, "Save the file first, chunks are stored next to it")
+            return {'CANCELLED'}
+        scene = context.scene
+        render = scene.render
+        movie = render.is_movie_format
+        ffmpeg = shutil.which("ffmpeg")
+        if movie and ffmpeg is None:
+            self.report({'ERROR'}, "Joining movie chunks needs ffmpeg on the PATH, or render to images")
+            return {'CANCELLED'}
+
+        workers = max(1, self.workers or os.cpu_count() or 1)
+        bounds = segment_bounds(scene, self.chunk_length)
+        signature = _render_output_signature(scene)
+        checkpoint_path = _segment_checkpoint_path(scene)
+        checkpoint = {}
+        if os.path.exists(checkpoint_path):
+            with open(checkpoint_path, "r", encoding="utf-8") as fh:
+                checkpoint = json.load(fh)
+
+        # Frames already in the frame cache are written without rendering when
+        # the output has the cache's format.
+        settings = render.image_settings
+        from_cache = (
+            not movie and settings.file_format == 'PNG'
+            and settings.color_mode == 'RGBA' and settings.color_depth == '8'
+        )
+        cache = frame_cache(scene)
+
+        chunks = []
+        tasks = []
+        blend_path = None
+        for start, end in bounds:
+            frames = list(range(start, end + 1))
+            keys = frame_keys(scene, frames)
+            key = hashlib.sha1((signature + "".join(keys)).encode()).hexdigest()
+            directory = project_cache_dir("segments", bpy.path.clean_name(scene.name), key[:16]) if movie else None
+            chunk = {"start": start, "end": end, "key": key, "directory": directory}
+            chunks.append(chunk)
+            if checkpoint.get(key) == 'DONE':
+                if movie:
+                    if os.listdir(directory):
+                        continue
+                elif all(os.path.exists(render.frame_path(frame=frame)) for frame in frames):
+                    continue
+
+            if from_cache:
+                todo = []
+                for frame, frame_key in zip(frames, keys):
+                    data = cache.get(frame_key)
+                    # Bit depth in the IHDR chunk, older caches may hold 16 bit frames.
+                    if data is None or data[24] != 8:
+                        todo.append(frame)
+                    else:
+                        path = render.frame_path(frame=frame)
+                        os.makedirs(os.path.dirname(path), exist_ok=True)
+                        with open(path, "wb") as fh:
+                            fh.write(data)
+                if not todo:
+                    checkpoint[key] = 'DONE'
+                    continue
+                frames = todo
+
+            if blend_path is None:
+                blend_path = save_worker_copy()
+            tasks.append({
+                "command": worker_command(
+                    blend_path,
+                    "vse.segment_worker(%r, %r, %r)" % (scene.name, frames, directory),
+                ),
+                "key": key,
+            })
+        if from_cache:
+            cache.flush()
+
+        audio_path = None
+        if movie and render.ffmpeg.audio_codec != 'NONE':
+            audio_path = os.path.join(project_cache_dir("segments"), bpy.path.clean_name(scene.name) + ".wav")
+            if blend_path is None:
+                blend_path = save_worker_copy()
+            tasks.append({
+                "command": worker_command(blend_path, "vse.mixdown_worker(%r, %r)" % (scene.name, audio_path)),
+            })
+
+        def save_checkpoint():
+            with open(checkpoint_path + ".tmp", "w", encoding="utf-8") as fh:
+                json.dump(checkpoint, fh)
+            os.replace(checkpoint_path + ".tmp", checkpoint_path)
+
+        save_checkpoint()
+        scene_name = scene.name
+        output_path = render.frame_path(frame=scene.frame_start)
+        audio_codec = _FFMPEG_AUDIO_CODECS.get(render.ffmpeg.audio_codec)
+        audio_bitrate = render.ffmpeg.audio_bitrate
+
+        def on_task_done(task):
+            if task["ok"] and "key" in task:
+                checkpoint[task["key"]] = 'DONE'
+                save_checkpoint()
+
+        def join():
+            list_path = os.path.join(project_cache_dir("segments"), bpy.path.clean_name(scene_name) + ".txt")
+            with open(list_path, "w", encoding="utf-8") as fh:
+                for chunk in chunks:
+                    for filename in sorted(os.listdir(chunk["directory"])):
+                        fh.write("file '%s'\n" % os.path.join(chunk["directory"], filename).replace("'", "'\\''"))
+            command = [ffmpeg, "-y", "-f", "concat", "-safe", "0", "-i", list_path]
+            if audio_path is not None:
+                command += ["-i", audio_path, "-map", "0:v", "-map", "1:a", "-c:a", audio_codec, "-b:a", "%dk" % audio_bitrate]
+            command += ["-c:v", "copy", output_path]
+            BackgroundJob("Join", [{"command": command}], 1).start()
+
+        def on_finished(job):
+            if movie and not job.cancelled and not job.failed:
+                join()
+
+        if tasks:
+            BackgroundJob("Render", tasks, workers, on_task_done=on_task_done, on_finished=on_finished).start()
+        elif movie:
+            join()
+        self.report({'INFO'}, "%d of %d chunks to render" % (len([t for t in tasks if "key" in t]), len(chunks)))
+        return {'FINISHED'}
+
+
+# -----------------------------------------------------------------------------
+# Smart render
+#
+# Stretches of the timeline showing a single unmodified movie strip whose
+# stream matches the output are stream copied from the source from their first
+# keyframe on, everything else is rendered in chunks like a segmented render.
+# Copies need a bitstream the output can continue: codec, size, rate, pixel
+# format, profile and level. Every piece is re-muxed with its parameter sets in
+# band, then the pieces are joined with an ffconcat file.
+
+_FFMPEG_VIDEO_CODECS = {
+    'DNXHD': "dnxhd",
+    'DV': "dvvideo",
+    'FFV1': "ffv1",
+    'FLASH': "flv1",
+    'H264': "h264",
+    'HUFFYUV': "huffyuv",
+    'MPEG1': "mpeg1video",
+    'MPEG2': "mpeg2video",
+    'MPEG4': "mpeg4",
+    'PNG': "png",
+    'QTRLE': "qtrle",
+    'THEORA': "theora",
+    'WEBM': "vp9",
+}
+
+_SMART_BLOCKING_FLAGS = (
+    "use_flip_x", "use_flip_y", "use_reverse_frames", "use_translation",
+    "use_crop", "use_deinterlace", "use_float",
+)
+
+
+def _stream_probe(filepath):
+    """Details of the first video stream of a movie from ffprobe"""
+    stream = json.loads(subprocess.run(
+        [shutil.which("ffprobe"), "-v", "error", "-select_streams", "v:0", "-of", "json",
+         "-show_entries", "stream=codec_name,width,height,pix_fmt,profile,level,r_frame_rate,start_time",
+         filepath],
+        stdout=subprocess.PIPE, check=True, universal_newlines=True,
+    ).stdout)["streams"][0]
+    num, den = stream["r_frame_rate"].split("/")
+    return {
+        "codec": stream["codec_name"],
+        "width": stream["width"],
+        "height": stream["height"],
+        "pix_fmt": stream.get("pix_fmt"),
+        "profile": stream.get("profile"),
+        "level": stream.get("level"),
+        "fps": float(num) / float(den),
+        "start_time": float(stream.get("start_time") or 0.0),
+    }
+
+
+def _write_json(path, data):
+    with open(path + ".tmp", "w", encoding="utf-8") as fh:
+        json.dump(data, fh)
+    os.replace(path + ".tmp", path)
+
+
+def _media_probe_path(filepath):
+    return os.path.join(project_cache_dir("probe"), media_hash(filepath) + ".json")
+
+
+def media_probe_worker(filepath, out_path):
+    """Probe the video stream and keyframe times of a movie, run inside a background worker"""
+    info = _stream_probe(filepath)
+    # Packet flags tell keyframes without decoding anything.
+    packets = subprocess.run(
+        [shutil.which("ffprobe"), "-v", "error", "-select_streams", "v:0", "-of", "csv=p=0",
+         "-show_entries", "packet=pts_time,flags", filepath],
+        stdout=subprocess.PIPE, check=True, universal_newlines=True,
+    ).stdout
+    keyframes = []
+    for line in packets.splitlines():
+        fields = line.split(",")
+        if len(fields) >= 2 and "K" in fields[1] and fields[0] not in {"", "N/A"}:
+            keyframes.append(float(fields[0]))
+    info["keyframes"] = sorted(keyframes)
+    _write_json(out_path, info)
+
+
+def media_probe(filepath):
+    """Cached video stream details and keyframe times of a movie, None when it wasn't probed"""
+    path = _media_probe_path(filepath)
+    if not os.path.exists(path):
+        return None
+    with open(path, "r", encoding="utf-8") as fh:
+        info = json.load(fh)
+    # Probes written before the profile and level were kept are redone.
+    return info if "level" in info else None
+
+
+def _output_probe_path(scene):
+    render = scene.render
+    key = hashlib.sha1((_render_output_signature(scene) + repr((
+        render.resolution_x, render.resolution_y, render.resolution_percentage, render.fps, render.fps_base,
+    ))).encode()).hexdigest()[:16]
+    return os.path.join(project_cache_dir("probe"), "output_" + key + ".json")
+
+
+def output_probe_worker(scene_name, out_path):
+    """Render one frame with the output settings and probe it, run inside a background worker"""
+    directory = out_path + ".d"
+    os.makedirs(directory, exist_ok=True)
+    try:
+        segment_worker(scene_name, [bpy.data.scenes[scene_name].frame_start], directory)
+        info = _stream_probe(os.path.join(directory, sorted(os.listdir(directory))[0]))
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+    _write_json(out_path, info)
+
+
+def output_probe(scene):
+    """Stream details of what the output settings encode, None when they weren't probed.
+
+    The encoder decides the pixel format, profile and level, they are read
+    from one frame rendered with the settings.
+    """
+    path = _output_probe_path(scene)
+    if not os.path.exists(path):
+        return None
+    with open(path, "r", encoding="utf-8") as fh:
+        return json.load(fh)
+
+
+def smart_copy_compatible(info, output):
+    """Why a source stream can't be joined with rendered output, "" when it can"""
+    if info["pix_fmt"] != output["pix_fmt"]:
+        return "pixel format %s" % info["pix_fmt"]
+    if info["profile"] != output["profile"]:
+        return "profile %s" % info["profile"]
+    # The joined file announces the level of the output.
+    if (info["level"] or 0) > (output["level"] or 0) > 0:
+        return "level %s" % info["level"]
+    return ""
+
+
+def smart_copy_blocker(scene, strip):
+    """Why the frames of a strip can't be copied from its source, "" when they can"""
+    if strip.type != 'MOVIE':
+        return strip.type.lower()
+    if len(strip.modifiers):
+        return "modifiers"
+    if strip.blend_alpha != 1.0:
+        return "opacity"
+    if strip.frame_still_start or strip.frame_still_end:
+        return "still frames"
+    for flag in _SMART_BLOCKING_FLAGS:
+        if getattr(strip, flag, False):
+            return flag[4:]
+    if strip.strobe > 1.0 or strip.color_saturation != 1.0 or strip.color_multiply != 1.0:
+        return "color or strobe"
+    action = scene.animation_data and scene.animation_data.action
+    if action:
+        prefix = 'sequence_editor.sequences_all["%s"]' % strip.name
+        if any(fcurve.data_path.startswith(prefix) for fcurve in action.fcurves):
+            return "animation"
+    return ""
+
+
+def smart_render_plan(scene, probes, output):
+    """Split the scene range into ('COPY', start, end, strip) and ('RENDER', start, end, reason) segments.
+
+    probes maps movie paths to their media_probe(), output is output_probe().
+    """
+    render = scene.render
+    fps = render.fps / render.fps_base
+    width = render.resolution_x * render.resolution_percentage // 100
+    height = render.resolution_y * render.resolution_percentage // 100
+    codec = _FFMPEG_VIDEO_CODECS.get(render.ffmpeg.codec)
+
+    strips = [s for s in scene.sequence_editor.sequences if not s.mute and s.type != 'SOUND']
+    first, last = scene.frame_start, scene.frame_end + 1
+    cuts = sorted({first, last, *(
+        frame for s in strips for frame in (s.frame_final_start, s.frame_final_end) if first < frame < last
+    )})
+
+    segments = []
+    for start, end in zip(cuts[:-1], cuts[1:]):
+        shown = [s for s in strips if s.frame_final_start <= start and s.frame_final_end >= end]
+        if len(shown) != 1:
+            segments.append(['RENDER', start, end, "%d strips" % len(shown) if shown else "gap"])
+            continue
+        strip = shown[0]
+        reason = smart_copy_blocker(scene, strip)
+        info = probes.get(bpy.path.abspath(strip.filepath)) if not reason else None
+        if not reason:
+            if info is None:
+                reason = "missing media"
+            elif info["codec"] != codec:
+                reason = "codec %s" % info["codec"]
+            elif (info["width"], info["height"]) != (width, height):
+                reason = "size %dx%d" % (info["width"], info["height"])
+            elif abs(info["fps"] - fps) > 1e-3:
+                reason = "%.3f fps" % info["fps"]
+            else:
+                reason = smart_copy_compatible(info, output)
+        if reason:
+            segments.append(['RENDER', start, end, reason])
+            continue
+
+        # Copies start on a keyframe, frames before it are rendered.
+        in_time = (start - strip.frame_start) / fps + info["start_time"]
+        i = bisect_left(info["keyframes"], in_time - 0.5 / fps)
+        if i == len(info["keyframes"]):
+            segments.append(['RENDER', start, end, "no keyframe"])
+            continue
+        key_frame = strip.frame_start + round((info["keyframes"][i] - info["start_time"]) * fps)
+        if key_frame >= end:
+            segments.append(['RENDER', start, end, "no keyframe"])
+            continue
+        if key_frame > start:
+            segments.append(['RENDER', start, key_frame, "before keyframe"])
+        segments.append(['COPY', key_frame, end, strip])
+
+    # Neighbours of the same kind and source, or reason, are one segment.
+    merged = []
+    for segment in segments:
+        if merged and merged[-1][0] == segment[0] and merged[-1][2] == segment[1] and merged[-1][3] == segment[3]:
+            merged[-1][2] = segment[2]
+        else:
+            merged.append(segment)
+    return merged
+
+
+class SEQUENCER_OT_SmartRender(Operator):
+    """Render the scene to a movie, copying unmodified movie footage without re-encoding it"""
+
+    bl_idname = "sequencer.smart_render"
+    bl_label = "Smart Render"
+    bl_options = {'REGISTER'}
+
+    workers: IntProperty(
+        name="Workers",
+        min=0, max=256,
+        default=0,
+        description="Number of worker processes, 0 for one per CPU core",
+    )
+    analyze_only: BoolProperty(
+        name="Analyze Only",
+        default=False,
+        description="Only write the ffmpeg script and report what would be copied",
+    )
+
+    @classmethod
+    def poll(cls, context):
+        return (context.scene and context.scene.sequence_editor)
+
+    def execute(self, context):
+        scene = context.scene
+        render = scene.render
+        if not bpy.data.filepath:
+            self.report({'ERROR'}, "Save the file first, segments are stored next to it")
+            return {'CANCELLED'}
+        if not render.is_movie_format or render.ffmpeg.codec not in _FFMPEG_VIDEO_CODECS:
+            self.report({'ERROR'}, "Smart render needs a movie output")
+            return {'CANCELLED'}
+        ffmpeg = shutil.which("ffmpeg")
+        if ffmpeg is None or shutil.which("ffprobe") is None:
+            self.report({'ERROR'}, "Smart render needs ffmpeg and ffprobe on the PATH")
+            return {'CANCELLED'}
+
+        # Probing needs ffprobe on every movie and a rendered frame, done by
+        # workers and cached.
+        movies = {
+            bpy.path.abspath(s.filepath) for s in scene.sequence_editor.sequences if s.type == 'MOVIE' and not s.mute
+        }
+        probes = {path: media_probe(path) for path in movies if os.path.exists(path)}
+        missing = [path for path, info in probes.items() if info is None]
+        output = output_probe(scene)
+        if missing or output is None:
+            blend_path = save_worker_copy()
+            tasks = [
+                {"command": worker_command(blend_path, "vse.media_probe_worker(%r, %r)" % (path, _media_probe_path(path)))}
+                for path in missing
+            ]
+            if output is None:
+                tasks.append({"command": worker_command(
+                    blend_path, "vse.output_probe_worker(%r, %r)" % (scene.name, _output_probe_path(scene)))})
+            BackgroundJob("Probe", tasks, self.workers).start()
+            self.report({'INFO'}, "Probing %d files, run again when done" % len(tasks))
+            return {'FINISHED'}
+
+        segments = smart_render_plan(scene, probes, output)
+        fps = render.fps / render.fps_base
+        signature = _render_output_signature(scene)
+        blend_path = None
+        tasks = []
+        entries = []
+        copied = rendered = 0
+        for kind, start, end, detail in segments:
+            if kind == 'COPY':
+                info = probes[bpy.path.abspath(detail.filepath)]
+                entries.append((
+                    bpy.path.abspath(detail.filepath),
+                    (start - detail.frame_start) / fps + info["start_time"],
+                    (end - start) / fps,
+                ))
+                copied += end - start
+                continue
+
+            rendered += end - start
+            for chunk_start in range(start, end, 500):
+                frames = list(range(chunk_start, min(chunk_start + 500, end)))
+                key = hashlib.sha1((signature + "".join(frame_keys(scene, frames))).encode()).hexdigest()
+                directory = project_cache_dir("segments", bpy.path.clean_name(scene.name), key[:16])
+                entries.append(directory)
+                if os.listdir(directory) or self.analyze_only:
+                    continue
+                if blend_path is None:
+                    blend_path = save_worker_copy()
+                tasks.append({
+                    "command": worker_command(
+                        blend_path,
+                        "vse.segment_worker(%r, %r, %r)" % (scene.name, frames, directory),
+                    ),
+                })
+
+        reasons = {}
+        for kind, start, end, detail in segments:
+            if kind == 'RENDER':
+                reasons[detail] = reasons.get(detail, 0) + end - start
+        self.report({'INFO'}, "%d frames copied, %d rendered%s" % (
+            copied, rendered,
+            " (%s)" % ", ".join("%s: %d" % item for item in sorted(reasons.items(), key=lambda item: -item[1]))
+            if reasons else "",
+        ))
+
+        # Sources and the output encoder write different parameter sets. Every
+        # piece is re-muxed on its own into a container carrying them in band,
+        # so the joined stream switches to the right ones at each piece.
+        codec = _FFMPEG_VIDEO_CODECS[render.ffmpeg.codec]
+        if codec in {"h264", "mpeg1video", "mpeg2video", "mpeg4"}:
+            piece_format, piece_ext = "mpegts", "ts"
+        else:
+            piece_format, piece_ext = "nut", "nut"
+        base = os.path.join(project_cache_dir("smart"), bpy.path.clean_name(scene.name))
+        pieces_dir = base + "_pieces"
+        list_path = base + ".ffconcat"
+        audio_path = base + ".wav" if render.ffmpeg.audio_codec != 'NONE' else None
+        command = [ffmpeg, "-y", "-f", "concat", "-safe", "0", "-i", list_path]
+        if audio_path is not None:
+            command += [
+                "-i", audio_path, "-map", "0:v", "-map", "1:a",
+                "-c:a", _FFMPEG_AUDIO_CODECS[render.ffmpeg.audio_codec], "-b:a", "%dk" % render.ffmpeg.audio_bitrate,
+            ]
+        command += ["-c:v", "copy"]
+        if codec == "h264" and render.ffmpeg.format in {'MPEG4', 'QUICKTIME'}:
+            # Sample entry which allows parameter sets in the stream.
+            command += ["-tag:v", "avc3"]
+        command.append(render.frame_path(frame=scene.frame_start))
+        if audio_path is not None and not self.analyze_only:
+            if blend_path is None:
+                blend_path = save_worker_copy()
+            tasks.append({"command": worker_command(blend_path, "vse.mixdown_worker(%r, %r)" % (scene.name, audio_path))})
+
+        def piece_commands():
+            commands = []
+            for i, entry in enumerate(entries):
+                if isinstance(entry, tuple):
+                    filepath, inpoint, duration = entry
+                    inputs = ["-ss", "%.6f" % inpoint, "-i", filepath, "-t", "%.6f" % duration]
+                else:
+                    # Rendered chunk directories hold one movie file.
+                    filenames = sorted(os.listdir(entry))
+                    inputs = ["-i", os.path.join(entry, filenames[0]) if filenames else entry]
+                piece = os.path.join(pieces_dir, "%04d.%s" % (i, piece_ext))
+                commands.append((piece, [
+                    ffmpeg, "-y", "-v", "error", *inputs, "-map", "0:v:0", "-c:v", "copy",
+                    "-bsf:v", "dump_extra=freq=keyframe", "-f", piece_format, piece,
+                ]))
+            return commands
+
+        def write_list(commands):
+            with open(list_path, "w", encoding="utf-8") as fh:
+                fh.write("ffconcat version 1.0\n# %s\n" % subprocess.list2cmdline(command))
+                for piece, piece_command in commands:
+                    fh.write("# %s\nfile '%s'\n" % (
+                        subprocess.list2cmdline(piece_command), piece.replace("'", "'\\''")))
+
+        if self.analyze_only:
+            write_list(piece_commands())
+            return {'FINISHED'}
+
+        workers = self.workers
+
+        def join():
+            os.makedirs(pieces_dir, exist_ok=True)
+            commands = piece_commands()
+            write_list(commands)
+
+            def on_pieces(job):
+                if not job.cancelled and not job.failed:
+                    BackgroundJob("Join", [{"command": command}], 1).start()
+
+            BackgroundJob(
+                "Re-mux", [{"command": piece_command} for piece, piece_command in commands], workers,
+                on_finished=on_pieces,
+            ).start()
+
+        def on_finished(job):
+            if not job.cancelled and not job.failed:
+                join()
+
+        if tasks:
+            BackgroundJob("Smart Render", tasks, workers, on_finished=on_finished).start()
+        else:
+            join()
+        return {'FINISHED'}
+
+
+# -----------------------------------------------------------------------------
+# ffmpeg filtergraph export
+#
+# Cut-only timelines with crossfades are turned into an ffmpeg filter_complex
+# script. The graph is built by a pure function over plain data, anything it
+# can't express is reported per strip instead of rendered wrong.
+
+_FFMPEG_ENCODERS = {
+    "h264": "libx264",
+    "vp9": "libvpx-vp9",
+    "theora": "libtheora",
+    "flv1": "flv",
+}
+
+_FFMPEG_CRF = {
+    'LOSSLESS': 0,
+    'PERC_LOSSLESS': 17,
+    'HIGH': 20,
+    'MEDIUM': 23,
+    'LOW': 26,
+    'VERYLOW': 29,
+    'LOWEST': 32,
+}
+
+_FILTERGRAPH_TRANSITIONS = {'CROSS', 'GAMMA_CROSS'}
+
+
+def timeline_plain_data(scene):
+    """Plain data of the top level strips of a scene, for ffmpeg_filtergraph"""
+    r = scene.render
+    action = scene.animation_data and scene.animation_data.action
+
+    def keys(strip, prop):
+        if not action:
+            return []
+        data_path = 'sequence_editor.sequences_all["%s"].%s' % (strip.name, prop)
+        for fcurve in action.fcurves:
+            if fcurve.data_path == data_path:
+                return [(k.co[0], k.co[1]) for k in fcurve.keyframe_points]
+        return []
+
+    def sampled_keys(strip, prop):
+        # Any interpolation, sampled per frame and reduced to linear segments.
+        if not action:
+            return []
+        fcurve = action.fcurves.find('sequence_editor.sequences_all["%s"].%s' % (strip.name, prop))
+        if fcurve is None or not len(fcurve.keyframe_points):
+            return []
+        points = np.empty((strip.frame_final_end - strip.frame_final_start + 1, 2))
+        points[:, 0] = np.arange(strip.frame_final_start, strip.frame_final_end + 1)
+        points[:, 1] = [fcurve.evaluate(frame) for frame in points[:, 0]]
+        return points[rdp_simplify(points, 1e-3)].tolist()
+
+    strips = []
+    for s in scene.sequence_editor.sequences:
+        if s.mute:
+            continue
+        data = {
+            "name": s.name,
+            "type": s.type,
+            "channel": s.channel,
+            "start": s.frame_final_start,
+            "end": s.frame_final_end,
+            "frame_start": s.frame_start,
+            "modifiers": len(getattr(s, "modifiers", ())),
+            "animated": [prop for prop in ("blend_alpha", "volume") if keys(s, prop)],
+        }
+        if s.type == 'SOUND':
+            data.update(
+                filepath=bpy.path.abspath(s.sound.filepath) if s.sound else "",
+                volume=s.volume,
+                volume_keys=sampled_keys(s, "volume"),
+                pan=s.pan,
+                pitch=s.pitch,
+            )
+        else:
+            data.update(
+                blend_alpha=s.blend_alpha,
+                transformed=bool(s.use_translation or s.use_crop or s.strobe > 1.0
+                                 or s.color_saturation != 1.0 or s.color_multiply != 1.0),
+            )
+        if s.type == 'MOVIE':
+            data.update(
+                filepath=bpy.path.abspath(s.filepath),
+                duration=s.frame_duration,
+                flip_x=s.use_flip_x,
+                flip_y=s.use_flip_y,
+                reverse=s.use_reverse_frames,
+            )
+        for attr in ("input_1", "input_2"):
+            strip_input = getattr(s, attr, None)
+            if strip_input is not None:
+                data[attr] = strip_input.name
+        strips.append(data)
+
+    return {
+        "fps": r.fps / r.fps_base,
+        "width": r.resolution_x * r.resolution_percentage // 100,
+        "height": r.resolution_y * r.resolution_percentage // 100,
+        "start": scene.frame_start,
+        "end": scene.frame_end + 1,
+        "strips": strips,
+    }
+
+
+def _volume_expression(keys, start, fps):
+    """ffmpeg volume expression of linear interpolation between (frame, value) keys"""
+    points = sorted(((frame - start) / fps, value) for frame, value in keys)
+    expr = "%g" % points[-1][1]
+    for (t0, v0), (t1, v1) in reversed(list(zip(points[:-1], points[1:]))):
+        if t1 > t0:
+            expr = "if(lt(t,%g),%g+(%g)*(t-%g),%s)" % (t1, v0, (v1 - v0) / (t1 - t0), t0, expr)
+    return "if(lt(t,%g),%g,%s)" % (points[0][0], points[0][1], expr)
+
+
+def ffmpeg_filtergraph(timeline):
+    """Build an ffmpeg filter_complex from timeline_plain_data output.
+
+    Returns a dict with the input files, the graph text, the output labels
+    and a list of (strip name, reason) problems which make the graph wrong.
+    """
+    fps = timeline["fps"]
+    width, height = timeline["width"], timeline["height"]
+    first, last = timeline["start"], timeline["end"]
+    strips = {s["name"]: s for s in timeline["strips"]}
+    inputs = []
+    lines = []
+    problems = []
+
+    def input_index(path):
+        if path not in inputs:
+            inputs.append(path)
+        return inputs.index(path)
+
+    # Visual strips, with the strips fading into each other.
+    transitions = {}
+    clips = []
+    for s in timeline["strips"]:
+        if s["type"] == 'SOUND':
+            continue
+        if s["type"] in _FILTERGRAPH_TRANSITIONS:
+            a, b = strips.get(s.get("input_1")), strips.get(s.get("input_2"))
+            if a is None or b is None or not (a["start"] < b["start"] < a["end"] <= b["end"]):
+                problems.append((s["name"], "crossfade inputs must overlap one after the other"))
+            elif (s["start"], s["end"]) != (b["start"], a["end"]):
+                problems.append((s["name"], "crossfade must cover the overlap of its inputs"))
+            else:
+                transitions[(a["name"], b["name"])] = s
+            continue
+        if s["type"] != 'MOVIE':
+            problems.append((s["name"], "%s strips are not supported" % s["type"].lower()))
+            continue
+        for reason, blocked in (
+                ("still frames are not supported",
+                 s["start"] < s["frame_start"] or s["end"] > s["frame_start"] + s["duration"]),
+                ("modifiers are not supported", s["modifiers"]),
+                ("opacity is not supported", s["blend_alpha"] != 1.0 or "blend_alpha" in s["animated"]),
+                ("offset, crop, strobe and color changes are not supported", s["transformed"]),
+        ):
+            if blocked:
+                problems.append((s["name"], reason))
+        clips.append(s)
+
+    clips.sort(key=lambda s: (s["start"], s["channel"]))
+    for a, b in zip(clips[:-1], clips[1:]):
+        if b["start"] < a["end"] and (a["name"], b["name"]) not in transitions:
+            problems.append((b["name"], "overlaps %s without a crossfade" % a["name"]))
+
+    video = None
+    if clips and not problems:
+        pending = []
+        length = 0
+        origin = position = min(first, clips[0]["start"])
+
+        def black(label, frames):
+            lines.append("color=c=black:s=%dx%d:r=%g:d=%g[%s]" % (width, height, fps, frames / fps, label))
+
+        def flush(label):
+            if len(pending) > 1:
+                lines.append("%sconcat=n=%d:v=1:a=0[%s]" % ("".join("[%s]" % p for p in pending), len(pending), label))
+                pending[:] = [label]
+
+        for i, s in enumerate(clips):
+            label = "v%d" % i
+            in_frame, out_frame = s["start"] - s["frame_start"], s["end"] - s["frame_start"]
+            if s["reverse"]:
+                # Reversed strips show the source from its end, trim the
+                # source frames shown before reversing only those.
+                in_frame, out_frame = s["duration"] - out_frame, s["duration"] - in_frame
+            filters = ["trim=start_frame=%d:end_frame=%d" % (in_frame, out_frame)]
+            if s["reverse"]:
+                filters.append("reverse")
+            filters += [
+                # Blender shows one source frame per frame, whatever the source rate.
+                "setpts=N/(%g*TB)" % fps,
+                # xfade and concat need one time base.
+                "fps=%g" % fps,
+                "scale=%d:%d" % (width, height),
+                "setsar=1",
+            ]
+            if s["flip_x"]:
+                filters.append("hflip")
+            if s["flip_y"]:
+                filters.append("vflip")
+            lines.append("[%d:v]%s[%s]" % (input_index(s["filepath"]), ",".join(filters), label))
+
+            fade = transitions.get((clips[i - 1]["name"], s["name"])) if i else None
+            if fade is not None:
+                flush("c%d" % i)
+                overlap = fade["end"] - fade["start"]
+                lines.append("[%s][%s]xfade=transition=fade:duration=%g:offset=%g[x%d]" % (
+                    pending[0], label, overlap / fps, (length - overlap) / fps, i))
+                pending[:] = ["x%d" % i]
+                length += s["end"] - s["start"] - overlap
+            else:
+                if s["start"] > position:
+                    black("g%d" % i, s["start"] - position)
+                    pending.append("g%d" % i)
+                    length += s["start"] - position
+                pending.append(label)
+                length += s["end"] - s["start"]
+            position = s["end"]
+
+        if last > position:
+            black("gend", last - position)
+            pending.append("gend")
+        flush("vcat")
+        # Cut the result to the scene range.
+        lines.append("[%s]trim=start_frame=%d:end_frame=%d,setpts=PTS-STARTPTS[vout]" % (
+            pending[0], first - origin, last - origin))
+        video = "vout"
+
+    # Sound strips are trimmed, delayed to their place and mixed.
+    sounds = []
+    for s in timeline["strips"]:
+        if s["type"] != 'SOUND':
+            continue
+        if s["pan"] != 0.0 or s["pitch"] != 1.0:
+            problems.append((s["name"], "pan and pitch are not supported"))
+            continue
+        if s["modifiers"]:
+            problems.append((s["name"], "modifiers are not supported"))
+            continue
+        start = max(s["start"], first)
+        end = min(s["end"], last)
+        if end <= start:
+            continue
+        label = "a%d" % len(sounds)
+        filters = [
+            "atrim=start=%g:end=%g" % ((start - s["frame_start"]) / fps, (end - s["frame_start"]) / fps),
+            "asetpts=PTS-STARTPTS",
+        ]
+        if s["volume_keys"]:
+            filters.append("volume='%s':eval=frame" % _volume_expression(s["volume_keys"], start, fps))
+        elif s["volume"] != 1.0:
+            filters.append("volume=%g" % s["volume"])
+        delay = round((start - first) * 1000 / fps)
+        filters.append("adelay=%d|%d" % (delay, delay))
+        lines.append("[%d:a]%s[%s]" % (input_index(s["filepath"]), ",".join(filters), label))
+        sounds.append(label)
+
+    audio = None
+    if sounds and not problems:
+        lines.append("%samix=inputs=%d:duration=longest:dropout_transition=0:normalize=0,atrim=end=%g[aout]" % (
+            "".join("[%s]" % label for label in sounds), len(sounds), (last - first) / fps))
+        audio = "aout"
+
+    return {
+        "inputs": inputs,
+        "graph": ";\n".join(lines) + "\n" if not problems else "",
+        "video": video,
+        "audio": audio,
+        "problems": problems,
+    }
+
+
+class SEQUENCER_OT_ExportFiltergraph(Operator, ExportHelper):
+    """Export the timeline as an ffmpeg command rendering it with a filter graph"""
+
+    bl_idname = "sequencer.export_filtergraph"
+    bl_label = "Export ffmpeg Script"
+    bl_options = {'REGISTER'}
+
+    filename_ext = ".sh"
+    filter_glob: StringProperty(default="*.sh", options={'HIDDEN'})
+
+    @classmethod
+    def poll(cls, context):
+        return (context.scene and context.scene.sequence_editor)
+
+    def execute(self, context):
+        scene = context.scene
+        result = ffmpeg_filtergraph(timeline_plain_data(scene))
+        if result["problems"]:
+            for name, reason in result["problems"]:
+                self.report({'WARNING'}, "%s: %s" % (name, reason))
+            self.report({'ERROR'}, "%d strips can't be exported, see the report" % len(result["problems"]))
+            return {'CANCELLED'}
+        if result["video"] is None and result["audio"] is None:
+            self.report({'WARNING'}, "Nothing to export")
+            return {'CANCELLED'}
+
+        graph_path = os.path.splitext(self.filepath)[0] + ".ffgraph"
+        with open(graph_path, "w", encoding="utf-8") as fh:
+            fh.write(result["graph"])
+
+        ffmpeg = scene.render.ffmpeg
+        command = ["ffmpeg", "-y"]
+        for path in result["inputs"]:
+            command += ["-i", path]
+        command += ["-filter_complex_script", graph_path]
+        if result["video"]:
+            codec = _FFMPEG_VIDEO_CODECS.get(ffmpeg.codec, "h264")
+            command += ["-map", "[%s]" % result["video"], "-c:v", _FFMPEG_ENCODERS.get(codec, codec)]
+            if ffmpeg.codec == 'H264' and ffmpeg.constant_rate_factor in _FFMPEG_CRF:
+                command += ["-crf", str(_FFMPEG_CRF[ffmpeg.constant_rate_factor])]
+            elif ffmpeg.video_bitrate:
+                command += ["-b:v", "%dk" % ffmpeg.video_bitrate]
+        if result["audio"]:
+            command += [
+                "-map", "[%s]" % result["audio"],
+                "-c:a", _FFMPEG_AUDIO_CODECS.get(ffmpeg.audio_codec, "aac"),
+                "-b:a", "%dk" % ffmpeg.audio_bitrate,
+            ]
+        command.append(scene.render.frame_path(frame=scene.frame_start))
+
+        with open(self.filepath, "w", encoding="utf-8") as fh:
+            fh.write("#!/bin/sh\n%s\n" % " ".join(shlex.quote(arg) for arg in command))
+        self.report({'INFO'}, "Exported %s" % self.filepath)
+        return {'FINISHED'}
+
+
+# -----------------------------------------------------------------------------
+# Chunked mixdown
+#
+# Time windows of the scene are mixed down by separate workers, each starting
+# some time early so sounds already playing settle in. Windows are cut at the
+# sample positions Blender's own mixdown uses, so the joined file has no seams.
+
+def _mixdown_samples(start, end, rate, fps):
+    # Length sound.mixdown writes for frames start to end (inclusive).
+    return int((end - start + 1) * rate / fps)
+
+
+def mixdown_chunk_worker(scene_name, start, end, filepath):
+    """Mix frames start to end (inclusive) down to a 32-bit WAV, run inside a background worker"""
+    scene = bpy.data.scenes[scene_name]
+    scene.frame_start = start
+    scene.frame_end = end
+    bpy.ops.sound.mixdown(
+        {"scene": scene},
+        filepath=filepath, container='WAV', codec='PCM', format='S32',
+        mixrate=scene.render.ffmpeg.audio_mixrate,
+    )
+
+
+def mixdown_join_worker(parts, filepath, container, sample_format):
+    """Join trimmed 32-bit WAV chunks into one file, run inside a background worker.
+
+    parts are (path, first sample, sample count) of the chunks in order.
+    """
+    width = {'S16': 2, 'S24': 3, 'S32': 4}[sample_format]
+    target = filepath if container == 'WAV' else filepath + ".tmp.wav"
+    if container != 'WAV':
+        width = 4
+    out = None
+    for path, skip, count in parts:
+        with wave.open(path, "rb") as chunk:
+            if out is None:
+                out = wave.open(target, "wb")
+                out.setnchannels(chunk.getnchannels())
+                out.setframerate(chunk.getframerate())
+                out.setsampwidth(width)
+            chunk.setpos(skip)
+            remaining = count
+            while remaining > 0:
+                block = min(remaining, 1 << 16)
+                samples = np.frombuffer(chunk.readframes(block), dtype="<i4")
+                remaining -= block
+                if width == 4:
+                    out.writeframes(samples.tobytes())
+                else:
+                    # Keep the high bytes of each little endian sample.
+                    data = samples.view(np.uint8).reshape(-1, 4)[:, 4 - width:]
+                    out.writeframes(data.tobytes())
+    out.close()
+    if container != 'WAV':
+        import aud
+        fmt = {'S16': aud.FORMAT_S16, 'S24': aud.FORMAT_S24, 'S32': aud.FORMAT_S32}[sample_format]
+        sound = aud.Sound(target)
+        sound.write(
+            filepath,
+            rate=sound.specs[0], channels=sound.specs[1], format=fmt,
+            container=aud.CONTAINER_FLAC, codec=aud.CODEC_FLAC,
+        )
+        os.remove(target)
+
+
+class SEQUENCER_OT_ChunkedMixdown(Operator, ExportHelper):
+    """Mix the scene sound down in chunks processed by parallel background processes"""
+
+    bl_idname = "sequencer.chunked_mixdown"
+    bl_label = "Chunked Mixdown"
+    bl_options = {'REGISTER'}
+
+    filename_ext = ".wav"
+    filter_glob: StringProperty(default="*.wav;*.flac", options={'HIDDEN'})
+
+    container: EnumProperty(
+        name="Container",
+        items=(
+            ('WAV', "WAV", "Uncompressed PCM"),
+            ('FLAC', "FLAC", "Lossless compressed"),
+        ),
+        default='WAV',
+    )
+    sample_format: EnumProperty(
+        name="Format",
+        items=(
+            ('S16', "16 bit", ""),
+            ('S24', "24 bit", ""),
+            ('S32', "32 bit", ""),
+        ),
+        default='S24',
+    )
+    workers: IntProperty(
+        name="Workers",
+        min=0, max=256,
+        default=0,
+        description="Number of worker processes, 0 for one per CPU core",
+    )
+    chunks: IntProperty(
+        name="Chunks",
+        min=0, max=10000,
+        default=0,
+        description="Number of chunks, 0 for two per worker",
+    )
+    preroll: FloatProperty(
+        name="Pre-roll",
+        min=0.0, max=60.0,
+        default=1.0,
+        subtype='TIME',
+        unit='TIME',
+        description="Seconds mixed before every chunk and dropped, so sounds settle in",
+    )
+
+    @classmethod
+    def poll(cls, context):
+        return (context.scene and context.scene.sequence_editor)
+
+    def check(self, context):
+        # Follow the container with the file extension.
+        self.filename_ext = "." + self.container.lower()
+        filepath = bpy.path.ensure_ext(os.path.splitext(self.filepath)[0], self.filename_ext)
+        if filepath != self.filepath:
+            self.filepath = filepath
+            return True
+        return False
+
+    def execute(self, context):
+        if not bpy.data.filepath:
+            self.report({'ERROR'}, "Save the file first, chunks are stored next to it")
+            return {'CANCELLED'}
+        scene = context.scene
+        render = scene.render
+        fps = render.fps / render.fps_base
+        rate = int(render.ffmpeg.audio_mixrate)
+        workers = max(1, self.workers or os.cpu_count() or 1)
+        count = max(1, min(self.chunks or workers * 2, scene.frame_end - scene.frame_start + 1))
+        preroll = int(round(self.preroll * fps))
+
+        first, last = scene.frame_start, scene.frame_end + 1
+        bounds = [first + (last - first) * i // count for i in range(count + 1)]
+        directory = project_cache_dir("mixdown")
+        blend_path = save_worker_copy()
+        scene_name = scene.name
+        tasks = []
+        parts = []
+        for i, (start, end) in enumerate(zip(bounds[:-1], bounds[1:])):
+            path = os.path.join(directory, "%s_%04d.wav" % (bpy.path.clean_name(scene_name), i))
+            window_start = max(start - preroll, first) if i else start
+            skip = _mixdown_samples(window_start, start - 1, rate, fps)
+            parts.append((path, skip, _mixdown_samples(window_start, end - 1, rate, fps) - skip))
+            tasks.append({
+                "command": worker_command(
+                    blend_path,
+                    "vse.mixdown_chunk_worker(%r, %d, %d, %r)" % (scene_name, window_start, end - 1, path),
+                ),
+                "start": start,
+                "end": end - 1,
+            })
+
+        filepath = bpy.path.ensure_ext(os.path.splitext(self.filepath)[0], "." + self.container.lower())
+        container = self.container
+        sample_format = self.sample_format
+        started = time.time()
+
+        def on_finished(job):
+            timings = [[task["start"], task["end"], task.get("seconds", 0.0)] for task in tasks]
+            scene = bpy.data.scenes.get(scene_name)
+            if scene is not None:
+                scene["vse_mixdown_timings"] = {
+                    "chunks": timings,
+                    "seconds": time.time() - started,
+                    "failed": job.failed,
+                }
+            if job.cancelled or job.failed:
+                return
+            BackgroundJob("Join", [{
+                "command": worker_command(
+                    blend_path,
+                    "vse.mixdown_join_worker(%r, %r, %r, %r)" % (parts, filepath, container, sample_format),
+                ),
+            }], 1).start()
+
+        BackgroundJob("Mixdown", tasks, workers, on_finished=on_finished).start()
+        return {'FINISHED'}
+
+
+# -----------------------------------------------------------------------------
+# Peak cache
+#
+# Min, max and RMS of sound files at a few resolutions, computed once per
+# media in a background thread and kept next to the project. Waveforms and
+# sound analysis read the level matching their resolution only.
+
+_PEAK_LEVELS = (256, 4096, 65536)
+_peaks = {}
+_peak_threads = {}
+
+
+def _peaks_path(filepath):
+    return os.path.join(project_cache_dir("peaks"), media_hash(filepath) + ".npz")
+
+
+def peaks_compute(filepath, out_path, block_seconds=30.0):
+    """Stream a sound file in blocks and save its peak pyramid"""
+    import aud
+    sound = aud.Sound(filepath)
+    rate, channels = sound.specs
+    length = sound.length
+    base = _PEAK_LEVELS[0]
+    step = max(base, int(block_seconds * rate) // base * base)
+
+    mins, maxs, squares = [], [], []
+    for start in range(0, length, step):
+        end = min(start + step, length)
+        data = sound.limit(start / rate, end / rate).data()
+        if not len(data):
+            break
+        data = data.reshape(len(data), -1)
+        index = np.arange(0, len(data), base)
+        mins.append(np.minimum.reduceat(data.min(axis=1), index))
+        maxs.append(np.maximum.reduceat(data.max(axis=1), index))
+        counts = np.diff(np.append(index, len(data)))
+        squares.append(np.add.reduceat((data * data).mean(axis=1), index) / counts)
+
+    levels = {base: (np.concatenate(mins), np.concatenate(maxs), np.concatenate(squares))}
+    for level in _PEAK_LEVELS[1:]:
+        low, high, square = levels[base]
+        index = np.arange(0, len(low), level // base)
+        counts = np.diff(np.append(index, len(low)))
+        levels[level] = (
+            np.minimum.reduceat(low, index),
+            np.maximum.reduceat(high, index),
+            np.add.reduceat(square, index) / counts,
+        )
+
+    arrays = {"rate": np.array(rate), "length": np.array(length)}
+    for level, (low, high, square) in levels.items():
+        arrays["min_%d" % level] = low.astype(np.float32)
+        arrays["max_%d" % level] = high.astype(np.float32)
+        arrays["rms_%d" % level] = np.sqrt(square).astype(np.float32)
+    with open(out_path + ".tmp", "wb") as fh:
+        np.savez(fh, **arrays)
+    os.replace(out_path + ".tmp", out_path)
+
+
+def _peaks_thread(filepath, out_path):
+    try:
+        peaks_compute(filepath, out_path)
+    except Exception:
+        # Not retried, peaks() returns False for it from now on.
+        _peaks[filepath] = False
+
+
+def _peaks_poll():
+    for filepath, thread in list(_peak_threads.items()):
+        if not thread.is_alive():
+            del _peak_threads[filepath]
+    _tag_sequencer_redraw()
+    return 0.5 if _peak_threads else None
+
+
+def peaks(filepath):
+    """Peak pyramid of a sound file, None while it is being computed.
+
+    The result maps "rate", "length" and "min_<level>", "max_<level>",
+    "rms_<level>" for every level of _PEAK_LEVELS samples. False when the
+    file is missing, has no audio or the file isn't saved.
+    """
+    cached = _peaks.get(filepath)
+    if cached is not None:
+        return cached
+    if filepath in _peak_threads:
+        return None
+    if not bpy.data.filepath or not os.path.exists(filepath):
+        return False
+    out_path = _peaks_path(filepath)
+    if os.path.exists(out_path):
+        with np.load(out_path) as data:
+            result = _peaks[filepath] = {key: data[key] for key in data.files}
+        return result
+    thread = threading.Thread(target=_peaks_thread, args=(filepath, out_path), daemon=True)
+    _peak_threads[filepath] = thread
+    thread.start()
+    if not bpy.app.timers.is_registered(_peaks_poll):
+        bpy.app.timers.register(_peaks_poll, first_interval=0.5)
+    return None
+
+
+def peak_level(samples):
+    """Coarsest peak level with no more than samples samples per value"""
+    return max((level for level in _PEAK_LEVELS if level <= samples), default=_PEAK_LEVELS[0])
+
+
+_peak_draw_handle = []
+
+
+def _peak_waveforms_draw():
+    context = bpy.context
+    # The window region of the preview view shows the image, not strips.
+    if context.space_data.view_type not in {'SEQUENCER', 'SEQUENCER_PREVIEW'}:
+        return
+    scene = context.scene
+    sequences, _level = _editing_sequences(scene)
+    region = context.region
+    if not sequences or region.width < 2:
+        return
+    x0, y0 = region.view2d.region_to_view(0, 0)
+    x1, y1 = region.view2d.region_to_view(region.width, region.height)
+    frames_per_px = (x1 - x0) / region.width
+    fps = scene.render.fps / scene.render.fps_base
+
+    coords = []
+    for s in sequences:
+        if (s.type != 'SOUND' or not s.sound or s.frame_final_end < x0 or s.frame_final_start > x1
+                or s.channel + 1 < y0 or s.channel > y1):
+            continue
+        data = peaks(bpy.path.abspath(s.sound.filepath))
+        if not data:
+            continue
+        rate = float(data["rate"])
+        level = peak_level(frames_per_px * rate / fps)
+        low, high = data["min_%d" % level], data["max_%d" % level]
+        x = np.arange(max(s.frame_final_start, x0), min(s.frame_final_end, x1), frames_per_px)
+        index = np.clip(((x - s.frame_start) / fps * rate / level).astype(np.int64), 0, len(low) - 1)
+        # Strips are drawn between 0.2 and 0.8 of their channel.
+        scale = 0.3 * s.volume
+        center = s.channel + 0.5
+        lines = np.empty((len(x) * 2, 2), dtype=np.float32)
+        lines[0::2, 0] = lines[1::2, 0] = x
+        lines[0::2, 1] = center + np.clip(low[index] * scale, -0.3, 0.3)
+        lines[1::2, 1] = center + np.clip(high[index] * scale, -0.3, 0.3)
+        coords.append(lines)
+
+    if coords:
+        # Imported here, the module is loaded in background mode without a GPU too.
+        import bgl
+        import gpu
+        from gpu_extras.batch import batch_for_shader
+
+        shader = gpu.shader.from_builtin('2D_UNIFORM_COLOR')
+        batch = batch_for_shader(shader, 'LINES', {"pos": np.concatenate(coords)})
+        bgl.glEnable(bgl.GL_BLEND)
+        shader.bind()
+        shader.uniform_float("color", (1.0, 1.0, 1.0, 0.5))
+        batch.draw(shader)
+        bgl.glDisable(bgl.GL_BLEND)
+
+
+class SEQUENCER_OT_PeakWaveforms(Operator):
+    """Draw waveforms of sound strips from the peak cache, at the resolution of the zoom"""
+
+    bl_idname = "sequencer.peak_waveforms"
+    bl_label = "Cached Waveforms"
+    bl_options = {'REGISTER'}
+
+    def execute(self, context):
+        if _peak_draw_handle:
+            bpy.types.SpaceSequenceEditor.draw_handler_remove(_peak_draw_handle.pop(), 'WINDOW')
+        else:
+            if not bpy.data.filepath:
+                self.report({'ERROR'}, "Save the file first, the peak cache is stored next to it")
+                return {'CANCELLED'}
+            _peak_draw_handle.append(bpy.types.SpaceSequenceEditor.draw_handler_add(
+                _peak_waveforms_draw, (), 'WINDOW', 'POST_VIEW'))
+        _tag_sequencer_redraw()
+        return {'FINISHED'}
+
+
+# -----------------------------------------------------------------------------
+# Loudness
+#
+# Integrated loudness (ITU-R BS.1770), true peak and RMS of sound files,
+# measured by background workers streaming the audio in blocks and cached by
+# media hash.
+
+_loudness = {}
+
+
+def _loudness_path(filepath, create=False):
+    return os.path.join(project_cache_dir("loudness", create=create), media_hash(filepath) + ".json")
+
+
+def _k_weighting(rate):
+    """Coefficients of the two biquads of the K-weighting filter at a sample rate"""
+    # High shelf of the head, matching the 48 kHz coefficients of the standard.
+    k = np.tan(np.pi * 1681.974450955533 / rate)
+    q = 0.7071752369554196
+    vh = 10.0 ** (3.999843853973347 / 20.0)
+    vb = vh ** 0.4996667741545416
+    a0 = 1.0 + k / q + k * k
+    shelf = (
+        [(vh + vb * k / q + k * k) / a0, 2.0 * (k * k - vh) / a0, (vh - vb * k / q + k * k) / a0],
+        [1.0, 2.0 * (k * k - 1.0) / a0, (1.0 - k / q + k * k) / a0],
+    )
+    # RLB high pass.
+    k = np.tan(np.pi * 38.13547087602444 / rate)
+    q = 0.5003270373238773
+    a0 = 1.0 + k / q + k * k
+    high_pass = (
+        [1.0, -2.0, 1.0],
+        [1.0, 2.0 * (k * k - 1.0) / a0, (1.0 - k / q + k * k) / a0],
+    )
+    return [([float(x) for x in b], [float(x) for x in a]) for b, a in (shelf, high_pass)]
+
+
+def _true_peak_filter(factor=4, taps_per_phase=12):
+    n = np.arange(factor * taps_per_phase) - (factor * taps_per_phase - 1) / 2.0
+    h = np.sinc(n / factor) * np.hanning(len(n))
+    return [h[phase::factor] * factor / h.sum() for phase in range(factor)]
+
+
+def loudness_compute(filepath, block_seconds=30.0):
+    """Measure a sound file, returns loudness in LUFS, true peak in dBTP, peak and RMS in dBFS"""
+    import aud
+    sound = aud.Sound(filepath)
+    rate, channels = sound.specs
+    length = sound.length
+    # Gating blocks of 400 ms overlap by 75%, so energies are summed per 100 ms.
+    hop = int(round(rate / 10.0))
+    step = max(hop, int(block_seconds * rate) // hop * hop)
+    # BS.1770 weights of the 5.1 and 7.1 layouts, the LFE is not measured.
+    # Other layouts have no known LFE channel, all channels count the same.
+    weights = {
+        6: np.array([1.0, 1.0, 1.0, 0.0, 1.41, 1.41]),
+        8: np.array([1.0, 1.0, 1.0, 0.0, 1.41, 1.41, 1.41, 1.41]),
+    }.get(channels, np.ones(channels))
+    filters = _k_weighting(rate)
+    phases = _true_peak_filter()
+    taps = len(phases[0])
+    # Blocks are filtered after the end of the block before them, the
+    # oversampling filter needs its last taps and the K-weighting settles
+    # within half a second, far below the precision of the result.
+    settle = rate // 2
+    history = np.zeros((taps - 1, channels))
+
+    def oversampled_peak(data):
+        return max(
+            float(np.abs(np.convolve(data[:, channel], h, mode='valid')).max())
+            for channel in range(channels) for h in phases
+        )
+
+    energies = []
+    square_sum = 0.0
+    peak = true_peak = 0.0
+    count = 0
+    for start in range(0, length, step):
+        data = sound.limit(start / rate, min(start + step, length) / rate).data()
+        if not len(data):
+            break
+        data = data.reshape(len(data), -1).astype(np.float64)
+        count += len(data)
+        square_sum += float((data * data).sum())
+        peak = max(peak, float(np.abs(data).max()))
+        extended = np.concatenate((history, data))
+        true_peak = max(true_peak, oversampled_peak(extended[-len(data) - taps + 1:]))
+
+        weighted = aud.Sound.buffer(extended.astype(np.float32), rate)
+        for b, a in filters:
+            weighted = weighted.filter(b, a)
+        weighted = weighted.data().reshape(len(extended), -1)[len(history):].astype(np.float64)
+        history = extended[-settle:]
+        segments = len(weighted) // hop
+        if segments:
+            squares = weighted[:segments * hop] ** 2
+            energies.append(squares.reshape(segments, hop, channels).mean(axis=1) @ weights)
+    # The signal is silent after its end.
+    true_peak = max(true_peak, oversampled_peak(np.concatenate((history[-taps + 1:], np.zeros((taps - 1, channels))))))
+
+    def db(value):
+        return round(float(20.0 * np.log10(value)), 2) if value > 0.0 else None
+
+    lufs = None
+    if energies:
+        energies = np.concatenate(energies)
+        blocks = np.convolve(energies, np.ones(4) / 4.0, mode='valid') if len(energies) >= 4 else energies[:0]
+        with np.errstate(divide='ignore'):
+            levels = -0.691 + 10.0 * np.log10(blocks)
+        gated = blocks[levels > -70.0]
+        if len(gated):
+            relative = -0.691 + 10.0 * np.log10(gated.mean()) - 10.0
+            gated = blocks[levels > max(relative, -70.0)]
+            lufs = round(float(-0.691 + 10.0 * np.log10(gated.mean())), 2)
+
+    return {
+        "lufs": lufs,
+        "true_peak": db(max(true_peak, peak)),
+        "peak": db(peak),
+        "rms": db(np.sqrt(square_sum / max(count * channels, 1))),
+        "seconds": length / rate,
+    }
+
+
+def loudness_worker(filepath, out_path):
+    result = loudness_compute(filepath)
+    with open(out_path + ".tmp", "w", encoding="utf-8") as fh:
+        json.dump(result, fh)
+    os.replace(out_path + ".tmp", out_path)
+
+
+def loudness(filepath):
+    """Cached measurement of a sound file, None when it wasn't analysed"""
+    if not bpy.data.filepath or not os.path.exists(filepath):
+        return None
+    key = media_hash(filepath)
+    if key not in _loudness:
+        path = _loudness_path(filepath)
+        if not os.path.exists(path):
+            return None
+        with open(path, "r", encoding="utf-8") as fh:
+            _loudness[key] = json.load(fh)
+    return _loudness[key]
+
+
+def _volume_fcurve_find(scene, strip):
+    action = scene.animation_data and scene.animation_data.action
+    if not action:
+        return None
+    return action.fcurves.find('sequence_editor.sequences_all["%s"].volume' % strip.name)
+
+
+def _selected_sound_paths(scene):
+    strips = [s for s in scene.sequence_editor.sequences_all if s.select and s.type == 'SOUND' and s.sound]
+    return strips, {s: bpy.path.abspath(s.sound.filepath) for s in strips}
+
+
+class SEQUENCER_OT_LoudnessAnalyze(Operator):
+    """Measure loudness, true peak and RMS of the selected sound strips in background processes"""
+
+    bl_idname = "sequencer.loudness_analyze"
+    bl_label = "Analyze Loudness"
+    bl_options = {'REGISTER'}
+
+    workers: IntProperty(
+        name="Workers",
+        min=0, max=256,
+        default=0,
+        description="Number of worker processes, 0 for one per CPU core",
+    )
+
+    @classmethod
+    def poll(cls, context):
+        return (context.scene and context.scene.sequence_editor)
+
+    def execute(self, context):
+        if not bpy.data.filepath:
+            self.report({'ERROR'}, "Save the file first, the measurements are stored next to it")
+            return {'CANCELLED'}
+
+        strips, paths = _selected_sound_paths(context.scene)
+        if not strips:
+            self.report({'WARNING'}, "No sound strips selected")
+            return {'CANCELLED'}
+        missing = sorted({
+            path for path in paths.values() if os.path.exists(path) and loudness(path) is None
+        })
+        if not missing:
+            self.report({'INFO'}, "%d strips already analyzed" % len(strips))
+            return {'FINISHED'}
+
+        blend_path = save_worker_copy()
+        tasks = [
+            {"command": worker_command(blend_path, "vse.loudness_worker(%r, %r)" % (path, _loudness_path(path, create=True)))}
+            for path in missing
+        ]
+
+        def on_finished(job):
+            if job.failed:
+                job.message = "%d files failed" % job.failed
+            _tag_sequencer_redraw()
+
+        BackgroundJob("Loudness", tasks, self.workers, on_finished=on_finished).start()
+        self.report({'INFO'}, "Analyzing %d files" % len(missing))
+        return {'FINISHED'}
+
+
+class SEQUENCER_OT_LoudnessNormalize(Operator):
+    """Set the volume of the selected sound strips to reach a target loudness, scaling volume animation"""
+
+    bl_idname = "sequencer.loudness_normalize"
+    bl_label = "Normalize Loudness"
+    bl_options = {'REGISTER', 'UNDO'}
+
+    target: FloatProperty(
+        name="Target",
+        min=-70.0, max=0.0,
+        default=-23.0,
+        description="Integrated loudness to reach, in LUFS",
+    )
+    ceiling: FloatProperty(
+        name="True Peak Ceiling",
+        min=-20.0, max=0.0,
+        default=-1.0,
+        description="Lower the gain when the true peak would go above this level, in dBTP",
+    )
+
+    @classmethod
+    def poll(cls, context):
+        return (context.scene and context.scene.sequence_editor)
+
+    def execute(self, context):
+        strips, paths = _selected_sound_paths(context.scene)
+        set_count = 0
+        for strip in strips:
+            result = loudness(paths[strip])
+            if not result or result["lufs"] is None:
+                continue
+            gain = self.target - result["lufs"]
+            if result["true_peak"] is not None:
+                gain = min(gain, self.ceiling - result["true_peak"])
+            volume = min(10.0 ** (gain / 20.0), 100.0)
+            fcurve = _volume_fcurve_find(context.scene, strip)
+            if fcurve is None or not len(fcurve.keyframe_points):
+                strip.volume = volume
+            else:
+                # Automation keeps its shape, its loudest key plays at the
+                # normalized volume.
+                top = max(key.co[1] for key in fcurve.keyframe_points)
+                ratio = volume / top if top > 0.0 else 1.0
+                for key in fcurve.keyframe_points:
+                    key.co[1] *= ratio
+                    key.handle_left[1] *= ratio
+                    key.handle_right[1] *= ratio
+                fcurve.update()
+            set_count += 1
+
+        if set_count < len(strips):
+            self.report({'WARNING'}, "%d of %d strips were not analyzed" % (len(strips) - set_count, len(strips)))
+        return {'FINISHED'}
+
+
+# -----------------------------------------------------------------------------
+# Ducking
+#
+# Volume automation of music strips lowered under dialogue, computed from the
+# RMS of the peak cache and written as a few linear keyframes per strip.
+
+def strip_envelope(scene, strip, key="rms"):
+    """Level of a sound strip per frame of its final range, None while its peaks are computed, False without audio"""
+    data = peaks(bpy.path.abspath(strip.sound.filepath))
+    if not data:
+        return data
+    fps = scene.render.fps / scene.render.fps_base
+    rate = float(data["rate"])
+    level = peak_level(rate / fps)
+    values = data["%s_%d" % (key, level)]
+    frames = np.arange(strip.frame_final_start, strip.frame_final_end + 1)
+    cells = np.clip(((frames - strip.frame_start) / fps * rate / level).astype(np.int64), 0, len(values))
+    envelope = np.zeros(len(frames) - 1)
+    filled = cells[:-1] < cells[1:]
+    if filled.any():
+        envelope[filled] = np.maximum.reduceat(values[:cells[-1]], cells[:-1][filled])
+    return np.abs(envelope) * strip.volume
+
+
+def rdp_simplify(points, epsilon):
+    """Indices of the points kept by Ramer-Douglas-Peucker simplification"""
+    keep = np.zeros(len(points), dtype=bool)
+    keep[[0, -1]] = True
+    stack = [(0, len(points) - 1)]
+    while stack:
+        first, last = stack.pop()
+        if last - first < 2:
+            continue
+        (x0, y0), (x1, y1) = points[first], points[last]
+        inner = points[first + 1:last]
+        # Vertical distance, x is time and y the gain.
+        y = y0 + (inner[:, 0] - x0) * (y1 - y0) / (x1 - x0)
+        distances = np.abs(inner[:, 1] - y)
+        worst = int(np.argmax(distances))
+        if distances[worst] > epsilon:
+            middle = first + 1 + worst
+            keep[middle] = True
+            stack.append((first, middle))
+            stack.append((middle, last))
+    return np.flatnonzero(keep)
+
+
+def ducking_curve(speech, threshold, duck, attack, release):
+    """Gain in dB per frame lowering by duck where speech is above threshold dB"""
+    with np.errstate(divide='ignore'):
+        active = 20.0 * np.log10(speech) > threshold
+    # Start lowering attack frames before speech and hold release frames after it.
+    kernel = np.ones(attack + release + 1)
+    covered = np.convolve(active.astype(np.float64), kernel)[attack:attack + len(active)] > 0.0
+    gain = np.where(covered, duck, 0.0)
+    fade = max(attack, 1)
+    padded = np.concatenate((np.zeros(fade), gain, np.zeros(fade)))
+    return np.convolve(padded, np.ones(fade) / fade, mode='same')[fade:fade + len(gain)]
+
+
+def _volume_fcurve(scene, strip):
+    """New, empty volume F-curve of a strip, replacing the one it has"""
+    scene.animation_data_create()
+    action = scene.animation_data.action
+    if action is None:
+        action = scene.animation_data.action = bpy.data.actions.new(scene.name + "Action")
+    data_path = 'sequence_editor.sequences_all["%s"].volume' % strip.name
+    for fcurve in action.fcurves:
+        if fcurve.data_path == data_path:
+            action.fcurves.remove(fcurve)
+            break
+    return action.fcurves.new(data_path)
+
+
+class SEQUENCER_OT_DuckMusic(Operator):
+    """Lower the volume of the sound strips of a channel under the selected dialogue strips, keeping their volume animation"""
+
+    bl_idname = "sequencer.duck_music"
+    bl_label = "Duck Music"
+    bl_options = {'REGISTER', 'UNDO'}
+
+    music_channel: IntProperty(
+        name="Music Channel",
+        min=1, max=32,
+        default=1,
+        description="Channel of the sound strips to duck",
+    )
+    threshold: FloatProperty(
+        name="Threshold",
+        min=-90.0, max=0.0,
+        default=-40.0,
+        description="Dialogue RMS level above which the music is lowered, in dB",
+    )
+    duck: FloatProperty(
+        name="Duck",
+        min=-60.0, max=0.0,
+        default=-12.0,
+        description="Gain of the music under dialogue, in dB",
+    )
+    attack: IntProperty(
+        name="Attack",
+        min=0, max=250,
+        default=6,
+        description="Frames to lower the music before dialogue starts",
+    )
+    release: IntProperty(
+        name="Release",
+        min=0, max=250,
+        default=12,
+        description="Frames to hold the music down after dialogue stops",
+    )
+    tolerance: FloatProperty(
+        name="Tolerance",
+        min=0.01, max=6.0,
+        default=0.5,
+        description="Largest gain error allowed when reducing keyframes, in dB",
+    )
+
+    @classmethod
+    def poll(cls, context):
+        return (context.scene and context.scene.sequence_editor)
+
+    def execute(self, context):
+        scene = context.scene
+        sequences = scene.sequence_editor.sequences
+        sounds = [s for s in sequences if s.type == 'SOUND' and s.sound and not s.mute]
+        dialogue = [s for s in sounds if s.select and s.channel != self.music_channel]
+        music = [s for s in sounds if s.channel == self.music_channel]
+        if not dialogue or not music:
+            self.report({'ERROR'}, "Select dialogue strips and put music on channel %d" % self.music_channel)
+            return {'CANCELLED'}
+        if not bpy.data.filepath:
+            self.report({'ERROR'}, "Save the file first, the peak cache is stored next to it")
+            return {'CANCELLED'}
+
+        start = min(s.frame_final_start for s in dialogue + music)
+        end = max(s.frame_final_end for s in dialogue + music)
+        speech = np.zeros(end - start)
+        waiting = 0
+        failed = []
+        for strip in dialogue:
+            envelope = strip_envelope(scene, strip)
+            if envelope is None:
+                waiting += 1
+                continue
+            if envelope is False:
+                failed.append(strip.name)
+                continue
+            offset = strip.frame_final_start - start
+            np.maximum(speech[offset:offset + len(envelope)], envelope, out=speech[offset:offset + len(envelope)])
+        if waiting:
+            self.report({'WARNING'}, "Computing peaks of %d strips, run again when done" % waiting)
+            return {'CANCELLED'}
+        if failed:
+            self.report({'ERROR'}, "No audio to analyze in " + ", ".join(sorted(failed)))
+            if len(failed) == len(dialogue):
+                return {'CANCELLED'}
+
+        gain = ducking_curve(speech, self.threshold, self.duck, self.attack, self.release)
+        keys = 0
+        for strip in music:
+            first = strip.frame_final_start - start
+            last = strip.frame_final_end - start
+            points = np.empty((last - first, 2))
+            points[:, 0] = np.arange(strip.frame_final_start, strip.frame_final_end)
+            # The duck is multiplied into existing automation, sampled per frame.
+            existing = _volume_fcurve_find(scene, strip)
+            if existing is not None and len(existing.keyframe_points):
+                volume = np.array([existing.evaluate(frame) for frame in points[:, 0]])
+            else:
+                volume = np.full(len(points), strip.volume)
+            points[:, 1] = gain[first:last] + 20.0 * np.log10(np.maximum(volume, 1e-6))
+            points = points[rdp_simplify(points, self.tolerance)]
+            points[:, 1] = np.where(points[:, 1] > -100.0, 10.0 ** (points[:, 1] / 20.0), 0.0)
+
+            fcurve = _volume_fcurve(scene, strip)
+            fcurve.keyframe_points.add(len(points))
+            fcurve.keyframe_points.foreach_set("co", points.astype(np.float32).ravel())
+            # Linear interpolation, the gain was simplified against straight lines.
+            fcurve.keyframe_points.foreach_set("interpolation", np.ones(len(points), dtype=np.int32))
+            fcurve.update()
+            keys += len(points)
+
+        self.report({'INFO'}, "%d keyframes on %d music strips" % (keys, len(music)))
+        return {'FINISHED'}
+
+
+# -----------------------------------------------------------------------------
+# Silence removal
+#
+# Silent intervals found in the RMS of the peak cache. Selected sound and movie
+# strips are found silent together, then every strip is cut around those
+# intervals, the pieces inside deleted and everything rippled left in a single
+# pass so channels stay in sync.
+
+def silence_intervals(filepath, threshold=-45.0, min_seconds=0.5):
+    """Silent intervals of a media file in seconds, None while its peaks are computed, False without audio"""
+    data = peaks(filepath)
+    if not data:
+        return data
+    level = _PEAK_LEVELS[0]
+    seconds = level / float(data["rate"])
+    quiet = data["rms_%d" % level] <= 10.0 ** (threshold / 20.0)
+    edges = np.diff(np.concatenate(([0], quiet.astype(np.int8), [0])))
+    starts = np.flatnonzero(edges == 1)
+    ends = np.flatnonzero(edges == -1)
+    long_enough = (ends - starts) * seconds >= min_seconds
+    return np.stack((starts[long_enough], ends[long_enough]), axis=1) * seconds
+
+
+def _strip_media_path(strip):
+    if strip.type == 'SOUND':
+        return bpy.path.abspath(strip.sound.filepath) if strip.sound else None
+    return bpy.path.abspath(strip.filepath)
+
+
+class SEQUENCER_OT_RemoveSilence(Operator):
+    """Cut out the parts where the selected sound and movie strips are all silent, and close the gaps"""
+
+    bl_idname = "sequencer.remove_silence"
+    bl_label = "Remove Silence"
+    bl_options = {'REGISTER', 'UNDO'}
+
+    threshold: FloatProperty(
+        name="Threshold",
+        min=-90.0, max=0.0,
+        default=-45.0,
+        description="RMS level below which audio is silent, in dB",
+    )
+    min_duration: FloatProperty(
+        name="Minimum Duration",
+        min=0.05, max=60.0,
+        default=0.5,
+        unit='TIME_ABSOLUTE',
+        description="Shortest silence to remove, in seconds",
+    )
+    padding: FloatProperty(
+        name="Padding",
+        min=0.0, max=5.0,
+        default=0.1,
+        unit='TIME_ABSOLUTE',
+        description="Silence kept on each side of a cut, in seconds",
+    )
+    analyze_only: BoolProperty(
+        name="Analyze Only",
+        default=False,
+        description="Only report the silences without cutting anything",
+    )
+
+    @classmethod
+    def poll(cls, context):
+        return (context.scene and context.scene.sequence_editor)
+
+    def execute(self, context):
+        scene = context.scene
+        sequences, _level = _editing_sequences(scene)
+        targets = [s for s in sequences if s.select and not s.lock and s.type in {'SOUND', 'MOVIE'}]
+        if not targets:
+            self.report({'ERROR'}, "Select sound or movie strips")
+            return {'CANCELLED'}
+        if not bpy.data.filepath:
+            self.report({'ERROR'}, "Save the file first, the peak cache is stored next to it")
+            return {'CANCELLED'}
+
+        fps = scene.render.fps / scene.render.fps_base
+        first = min(s.frame_final_start for s in targets)
+        covered = np.zeros(max(s.frame_final_end for s in targets) - first, dtype=np.int32)
+        silent = np.zeros_like(covered)
+        waiting = 0
+        failed = []
+        for strip in targets:
+            path = _strip_media_path(strip)
+            intervals = silence_intervals(path, self.threshold, self.min_duration) if path else False
+            if intervals is None:
+                waiting += 1
+                continue
+            if intervals is False:
+                failed.append(strip.name)
+                continue
+            covered[strip.frame_final_start - first:strip.frame_final_end - first] += 1
+            frames = np.round(intervals * fps + strip.frame_start).astype(np.int64)
+            frames = np.clip(frames, strip.frame_final_start, strip.frame_final_end) - first
+            # Mark interval starts and ends, then integrate.
+            marks = np.zeros(len(silent) + 1, dtype=np.int32)
+            np.add.at(marks, frames[:, 0], 1)
+            np.add.at(marks, frames[:, 1], -1)
+            silent += np.cumsum(marks[:-1])
+        if waiting:
+            self.report({'WARNING'}, "Computing peaks of %d strips, run again when done" % waiting)
+            return {'CANCELLED'}
+        if failed:
+            self.report({'ERROR'}, "No audio to analyze in " + ", ".join(sorted(failed)))
+            if len(failed) == len(targets):
+                return {'CANCELLED'}
+
+        quiet = (covered > 0) & (silent == covered)
+        edges = np.diff(np.concatenate(([0], quiet.astype(np.int8), [0])))
+        pad = int(round(self.padding * fps))
+        runs = np.stack((np.flatnonzero(edges == 1) + pad, np.flatnonzero(edges == -1) - pad), axis=1) + first
+        runs = runs[(runs[:, 1] - runs[:, 0]) >= max(1, int(round(self.min_duration * fps)) - 2 * pad)]
+        removed = int((runs[:, 1] - runs[:, 0]).sum())
+        if self.analyze_only or not len(runs):
+            self.report({'INFO'}, "%d silences, %.1f seconds" % (len(runs), removed / fps))
+            return {'FINISHED'}
+
+        # Strips which would have to move can't be locked, effects follow
+        # their inputs.
+        locked = [s.name for s in sequences if s.lock and s.frame_final_end > runs[0][0]]
+        if locked:
+            self.report({'ERROR'}, "Unlock the strips in or after the first silence: " + ", ".join(sorted(locked)))
+            return {'CANCELLED'}
+        target_names = {s.name for s in targets}
+        names = {s.name for s in sequences if not getattr(s, "input_count", 0)}
+
+        # Cut from the end, the left pieces keep the names of the strips.
+        pieces = []
+        for start, end in runs[::-1].tolist():
+            for frame in (end, start):
+                bpy.ops.sequencer.select_all(action='DESELECT')
+                crossing = False
+                for name in names:
+                    s = sequences[name]
+                    if s.frame_final_start < frame < s.frame_final_end:
+                        s.select = crossing = True
+                if crossing:
+                    bpy.ops.sequencer.cut(frame=frame, type='SOFT', side='RIGHT')
+                    if frame == start:
+                        pieces.extend(s.name for s in context.selected_sequences)
+            for name in list(names):
+                s = sequences[name]
+                if start <= s.frame_final_start and s.frame_final_end <= end:
+                    pieces.append(name)
+                    names.discard(name)
+
+        bpy.ops.sequencer.select_all(action='DESELECT')
+        for name in pieces:
+            sequences[name].select = True
+        others = len(set(pieces) - target_names)
+        bpy.ops.sequencer.delete()
+
+        # Ripple: every strip moves left by the silences removed before it.
+        ends = runs[:, 1]
+        shifts = np.concatenate(([0], np.cumsum(runs[:, 1] - runs[:, 0])))
+        for s in sorted(sequences, key=attrgetter('frame_final_start')):
+            if getattr(s, "input_count", 0):
+                continue
+            shift = int(shifts[np.searchsorted(ends, s.frame_final_start, side='right')])
+            if shift:
+                s.frame_start -= shift
+
+        for name in names & target_names:
+            sequences[name].select = True
+        self.report({'INFO'}, "Removed %d silences, %.1f seconds, %d pieces of other strips" % (
+            len(runs), removed / fps, others))
+        return {'FINISHED'}
+
+
+# -----------------------------------------------------------------------------
+# Shot detection
+#
+# Movies are decoded small by ffmpeg, from their proxy when one is built, and
+# scored one frame at a time against the previous frame. Scores are cached per
+# media hash so cut frames can be picked again at any threshold for free.
+
+_SHOT_SIZE = (128, 72)
+
+
+def movie_frames(filepath, width=_SHOT_SIZE[0], height=_SHOT_SIZE[1]):
+    """Decoded RGB frames of a movie scaled to a size, one frame in memory at a time.
+
+    Raises RuntimeError after the last frame when ffmpeg failed, so partial
+    results aren't cached.
+    """
+    size = width * height * 3
+    process = subprocess.Popen(
+        [shutil.which("ffmpeg"), "-v", "error", "-i", filepath, "-an",
+         "-vf", "scale=%d:%d:flags=area" % (width, height),
+         "-f", "rawvideo", "-pix_fmt", "rgb24", "-"],
+        stdout=subprocess.PIPE,
+    )
+    try:
+        while True:
+            data = process.stdout.read(size)
+            if len(data) < size:
+                break
+            yield np.frombuffer(data, dtype=np.uint8).reshape(height, width, 3)
+        process.stdout.close()
+        if process.wait():
+            raise RuntimeError("ffmpeg failed to decode %s" % filepath)
+    finally:
+        # Consumers stopping early leave ffmpeg running.
+        process.stdout.close()
+        if process.poll() is None:
+            process.kill()
+            process.wait()
+
+
+def movie_analysis_source(scene, strip):
+    """Smallest built proxy of a movie strip, or its source file"""
+    if strip.use_proxy:
+        for size in (25, 50, 75, 100):
+            path = proxy_filepath(scene, strip, size)
+            if os.path.exists(path):
+                return path
+    return bpy.path.abspath(strip.filepath)
+
+
+def shot_scores(frames):
+    """Histogram and pixel difference of every frame to the previous one, from 0 to 1"""
+    scores = []
+    previous_hist = previous_gray = None
+    for frame in frames:
+        # 16 bins per channel.
+        hist = np.stack([
+            np.bincount((frame[..., c] >> 4).ravel(), minlength=16) for c in range(3)
+        ]) / float(frame.shape[0] * frame.shape[1])
+        gray = frame.mean(axis=2, dtype=np.float32)
+        if previous_hist is None:
+            scores.append((0.0, 0.0))
+        else:
+            scores.append((
+                np.abs(hist - previous_hist).sum() / 6.0,
+                np.abs(gray - previous_gray).mean() / 255.0,
+            ))
+        previous_hist, previous_gray = hist, gray
+    return np.array(scores, dtype=np.float32).reshape(-1, 2)
+
+
+def shot_scores_worker(source, out_path):
+    scores = shot_scores(movie_frames(source))
+    with open(out_path + ".tmp", "wb") as fh:
+        np.save(fh, scores)
+    os.replace(out_path + ".tmp", out_path)
+
+
+def _shot_scores_path(filepath):
+    return os.path.join(project_cache_dir("shots"), media_hash(filepath) + ".npy")
+
+
+def shot_cuts(scores, threshold=0.35, min_length=12):
+    """Media frames starting a new shot"""
+    # Lighting changes move the histogram but few pixels, flashes the opposite.
+    candidates = np.flatnonzero((scores[:, 0] >= threshold) & (scores[:, 1] >= threshold / 3.0))
+    cuts = []
+    for frame in candidates.tolist():
+        if frame >= min_length and (not cuts or frame - cuts[-1] >= min_length):
+            cuts.append(frame)
+    return cuts
+
+
+def cut_strips_at(context, sequences, name, frames):
+    """Cut a strip at many frames, returns the names of all its pieces from left to right"""
+    pieces = []
+    # From the end, so the left piece keeps the name for the next cut.
+    for frame in sorted(set(frames), reverse=True):
+        strip = sequences[name]
+        if not strip.frame_final_start < frame < strip.frame_final_end:
+            continue
+        bpy.ops.sequencer.select_all(action='DESELECT')
+        strip.select = True
+        bpy.ops.sequencer.cut(frame=frame, type='SOFT', side='RIGHT')
+        pieces.extend(s.name for s in context.selected_sequences)
+    return [name] + pieces[::-1]
+
+
+def add_markers(scene, frames, name):
+    existing = {m.frame for m in scene.timeline_markers}
+    count = 0
+    for frame in frames:
+        if frame not in existing:
+            scene.timeline_markers.new(name, frame=frame)
+            existing.add(frame)
+            count += 1
+    return count
+
+
+def apply_shot_cuts(context, names, output, threshold, min_length):
+    """Add markers or split the named movie strips at their cached shot cuts"""
+    scene = context.scene
+    sequences, _level = _editing_sequences(scene)
+    count = 0
+    for name in names:
+        strip = sequences.get(name)
+        if strip is None:
+            continue
+        scores = np.load(_shot_scores_path(bpy.path.abspath(strip.filepath)))
+        frames = [
+            strip.frame_start + cut for cut in shot_cuts(scores, threshold, min_length)
+            if strip.frame_final_start < strip.frame_start + cut < strip.frame_final_end
+        ]
+        if output == 'MARKERS':
+            count += add_markers(scene, frames, "Shot")
+        elif not strip.lock:
+            count += len(cut_strips_at(context, sequences, name, frames)) - 1
+    return count
+
+
+_ANALYSIS_OUTPUTS = (
+    ('MARKERS', "Markers", "Add markers on the timeline"),
+    ('SPLIT', "Split", "Split the strips"),
+)
+
+
+class SEQUENCER_OT_DetectShots(Operator):
+    """Find camera cuts in the selected movie strips, as markers or splits"""
+
+    bl_idname = "sequencer.detect_shots"
+    bl_label = "Detect Shots"
+    bl_options = {'REGISTER', 'UNDO'}
+
+    output: EnumProperty(
+        name="Output",
+        items=_ANALYSIS_OUTPUTS,
+        default='MARKERS',
+    )
+    threshold: FloatProperty(
+        name="Threshold",
+        min=0.05, max=1.0,
+        default=0.35,
+        description="Change between two frames starting a new shot",
+    )
+    min_length: IntProperty(
+        name="Minimum Length",
+        min=1, max=1000,
+        default=12,
+        description="Shortest shot, in frames",
+    )
+    workers: IntProperty(
+        name="Workers",
+        min=0, max=256,
+        default=0,
+        description="Number of worker processes, 0 for one per CPU core",
+    )
+
+    @classmethod
+    def poll(cls, context):
+        return (context.scene and context.scene.sequence_editor)
+
+    def execute(self, context):
+        if not bpy.data.filepath:
+            self.report({'ERROR'}, "Save the file first, the analysis is stored next to it")
+            return {'CANCELLED'}
+        if shutil.which("ffmpeg") is None:
+            self.report({'ERROR'}, "Shot detection needs ffmpeg on the PATH")
+            return {'CANCELLED'}
+        scene = context.scene
+        sequences, _level = _editing_sequences(scene)
+        strips = [s for s in sequences if s.select and s.type == 'MOVIE']
+        if not strips:
+            self.report({'ERROR'}, "Select movie strips")
+            return {'CANCELLED'}
+
+        names = [s.name for s in strips]
+        output, threshold, min_length = self.output, self.threshold, self.min_length
+        missing = {}
+        for strip in strips:
+            path = bpy.path.abspath(strip.filepath)
+            if not os.path.exists(_shot_scores_path(path)):
+                missing.setdefault(path, movie_analysis_source(scene, strip))
+        if not missing:
+            count = apply_shot_cuts(context, names, output, threshold, min_length)
+            self.report({'INFO'}, "%d shots found" % count)
+            return {'FINISHED'}
+
+        blend_path = save_worker_copy()
+        tasks = [
+            {"command": worker_command(
+                blend_path, "vse.shot_scores_worker(%r, %r)" % (source, _shot_scores_path(path)))}
+            for path, source in missing.items()
+        ]
+
+        # Changes made from the job's timer would miss the undo stack, they are
+        # made by the next run of the operator.
+        def on_finished(job):
+            if job.failed:
+                job.message = "%d files failed" % job.failed
+            elif not job.cancelled:
+                job.message = "Shots analyzed, run Detect Shots again to apply"
+
+        BackgroundJob("Shots", tasks, self.workers, on_finished=on_finished).start()
+        self.report({'INFO'}, "Analyzing %d files, run again when done" % len(tasks))
+        return {'FINISHED'}
+
+
+# -----------------------------------------------------------------------------
+# Duplicate frames
+#
+# A 64 bit difference hash per frame, from 9x8 frames decoded by ffmpeg and
+# cached per media hash. Runs of frames with close hashes are held or
+# duplicated frames.
+
+def frame_hashes(frames):
+    """Difference hash of every frame, brighter left pixel for every bit"""
+    hashes = []
+    weights = np.left_shift(np.uint64(1), np.arange(64, dtype=np.uint64))
+    for frame in frames:
+        gray = frame.mean(axis=2)
+        bits = (gray[:, :-1] > gray[:, 1:]).ravel()
+        hashes.append(np.bitwise_or.reduce(weights[bits]) if bits.any() else np.uint64(0))
+    return np.array(hashes, dtype=np.uint64)
+
+
+def frame_hashes_worker(source, out_path):
+    hashes = frame_hashes(movie_frames(source, 9, 8))
+    with open(out_path + ".tmp", "wb") as fh:
+        np.save(fh, hashes)
+    os.replace(out_path + ".tmp", out_path)
+
+
+def _frame_hashes_path(filepath):
+    return os.path.join(project_cache_dir("dhash"), media_hash(filepath) + ".npy")
+
+
+def duplicate_runs(hashes, tolerance=0, min_length=2):
+    """Media frame ranges [start, end) of frames within tolerance bits of the previous one"""
+    if len(hashes) < 2:
+        return np.empty((0, 2), dtype=np.int64)
+    changed = np.unpackbits((hashes[1:] ^ hashes[:-1]).view(np.uint8).reshape(-1, 8), axis=1).sum(axis=1)
+    same = np.concatenate(([0], (changed <= tolerance).astype(np.int8), [0]))
+    edges = np.diff(same)
+    # A run starts on the frame before the first repeat.
+    runs = np.stack((np.flatnonzero(edges == 1), np.flatnonzero(edges == -1) + 1), axis=1)
+    return runs[runs[:, 1] - runs[:, 0] >= min_length]
+
+
+def apply_duplicate_runs(context, names, output, tolerance, min_length):
+    """Report, mark or split around the cached duplicate frames of the named movie strips"""
+    scene = context.scene
+    sequences, _level = _editing_sequences(scene)
+    report = {}
+    for name in names:
+        strip = sequences.get(name)
+        if strip is None:
+            continue
+        hashes = np.load(_frame_hashes_path(bpy.path.abspath(strip.filepath)))
+        runs = duplicate_runs(hashes, tolerance, min_length) + strip.frame_start
+        runs = runs[(runs[:, 1] > strip.frame_final_start) & (runs[:, 0] < strip.frame_final_end)]
+        report[name] = runs.tolist()
+        if output == 'MARKERS':
+            add_markers(scene, runs[:, 0].tolist(), "Hold")
+        elif output == 'SPLIT' and not strip.lock:
+            # Repeats get their own pieces, after the frame they repeat.
+            cut_strips_at(context, sequences, name, (runs[:, 0] + 1).tolist() + runs[:, 1].tolist())
+    scene["vse_duplicate_frames"] = report
+    return report
+
+
+class SEQUENCER_OT_DetectDuplicateFrames(Operator):
+    """Find held and duplicated frames in the selected movie strips"""
+
+    bl_idname = "sequencer.detect_duplicate_frames"
+    bl_label = "Detect Duplicate Frames"
+    bl_options = {'REGISTER', 'UNDO'}
+
+    output: EnumProperty(
+        name="Output",
+        items=(('REPORT', "Report", "Only report the duplicated frames"),) + _ANALYSIS_OUTPUTS,
+        default='REPORT',
+    )
+    tolerance: IntProperty(
+        name="Tolerance",
+        min=0, max=16,
+        default=0,
+        description="Bits of the frame hash allowed to differ between duplicates",
+    )
+    min_length: IntProperty(
+        name="Minimum Length",
+        min=2, max=1000,
+        default=2,
+        description="Shortest run of identical frames, in frames",
+    )
+    workers: IntProperty(
+        name="Workers",
+        min=0, max=256,
+        default=0,
+        description="Number of worker processes, 0 for one per CPU core",
+    )
+
+    @classmethod
+    def poll(cls, context):
+        return (context.scene and context.scene.sequence_editor)
+
+    def execute(self, context):
+        if not bpy.data.filepath:
+            self.report({'ERROR'}, "Save the file first, the analysis is stored next to it")
+            return {'CANCELLED'}
+        if shutil.which("ffmpeg") is None:
+            self.report({'ERROR'}, "Duplicate frame detection needs ffmpeg on the PATH")
+            return {'CANCELLED'}
+        scene = context.scene
+        sequences, _level = _editing_sequences(scene)
+        strips = [s for s in sequences if s.select and s.type == 'MOVIE']
+        if not strips:
+            self.report({'ERROR'}, "Select movie strips")
+            return {'CANCELLED'}
+
+        names = [s.name for s in strips]
+        output, tolerance, min_length = self.output, self.tolerance, self.min_length
+        missing = {}
+        for strip in strips:
+            path = bpy.path.abspath(strip.filepath)
+            if not os.path.exists(_frame_hashes_path(path)):
+                missing.setdefault(path, movie_analysis_source(scene, strip))
+
+        # Runs per strip are kept in scene["vse_duplicate_frames"] for the panel.
+        def summary(report):
+            runs = [run for strip_runs in report.values() for run in strip_runs]
+            return "%d holds, %d duplicated frames in %d strips" % (
+                len(runs), sum(end - start - 1 for start, end in runs), sum(1 for r in report.values() if r))
+
+        if not missing:
+            self.report({'INFO'}, summary(apply_duplicate_runs(context, names, output, tolerance, min_length)))
+            return {'FINISHED'}
+
+        blend_path = save_worker_copy()
+        tasks = [
+            {"command": worker_command(
+                blend_path, "vse.frame_hashes_worker(%r, %r)" % (source, _frame_hashes_path(path)))}
+            for path, source in missing.items()
+        ]
+
+        # Like shot detection, results are applied by the next run so they can be undone.
+        def on_finished(job):
+            if job.failed:
+                job.message = "%d files failed" % job.failed
+            elif not job.cancelled:
+                job.message = "Frames analyzed, run Detect Duplicate Frames again to apply"
+
+        BackgroundJob("Duplicates", tasks, self.workers, on_finished=on_finished).start()
+        self.report({'INFO'}, "Analyzing %d files, run again when done" % len(tasks))
+        return {'FINISHED'}
+
+
+def pack_channel_layout(strips):
+    """Compute packed channels for (key, channel, start, end, locked, inputs) tuples.
+
+    Strips are dropped as low as possible in order of their original channel,
+    so a strip never ends up below a strip it overlapped and was above before
+    (compositing order), effects stay above their inputs and locked strips keep
+    their channel. Returns a {key: channel} dictionary.
+    """
+    # Per channel, sorted starts and matching ends of the placed strips.
+    placed = {}
+    new_channel = {}
+
+    def overlaps(channel, start, end):
+        starts, ends = placed.get(channel, ((), ()))
+        i = bisect_left(starts, end) - 1
+        return i >= 0 and ends[i] > start
+
+    for key, channel, start, end, locked, inputs in sorted(strips, key=lambda s: (s[1], s[2])):
+        if locked:
+            target = channel
+        else:
+            target = 1
+            for c in range(channel - 1, 0, -1):
+                if overlaps(c, start, end):
+                    target = c + 1
+                    break
+            for input_key in inputs:
+                if input_key in new_channel:
+                    target = max(target, new_channel[input_key] + 1)
+            target = min(target, channel)
+        new_channel[key] = target
+
+        starts, ends = placed.setdefault(target, ([], []))
+        i = bisect_left(starts, start)
+        starts.insert(i, start)
+        ends.insert(i, end)
+
+    return new_channel
+
+
+class SEQUENCER_OT_PackChannels(Operator):
+    """Move strips down to use the fewest channels, keeping their stacking order"""
+
+    bl_idname = "sequencer.pack_channels"
+    bl_label = "Pack Channels"
+    bl_options = {'REGISTER', 'UNDO'}
+
+    @classmethod
+    def poll(cls, context):
+        return (context.scene and context.scene.sequence_editor)
+
+    def execute(self, context):
+        sequences, _level = _editing_sequences(context.scene)
+        if not sequences:
+            return {'CANCELLED'}
+
+        strips = []
+        for s in sequences:
+            inputs = tuple(
+                i.name for i in (getattr(s, "input_1", None), getattr(s, "input_2", None))
+                if i is not None
+            )
+            strips.append((s.name, s.channel, s.frame_final_start, s.frame_final_end, s.lock, inputs))
+
+        layout = pack_channel_layout(strips)
+        used_before = len({s[1] for s in strips})
+
+        # Sorted the same way as the layout was computed, every strip then
+        # moves down into a channel range already cleared for it.
+        moved = 0
+        for name, channel, start, end, locked, inputs in sorted(strips, key=lambda s: (s[1], s[2])):
+            if layout[name] != channel:
+                sequences[name].channel = layout[name]
+                moved += 1
+
+        self.report(
+            {'INFO'},
+            "Moved %d strips, %d channels in use instead of %d" %
+            (moved, len(set(layout.values())), used_before),
+        )
+        return {'FINISHED'}
+
+
+classes = (
+    SEQUENCER_OT_CrossfadeSounds,
+    SEQUENCER_OT_CutMulticam,
+    SEQUENCER_OT_BulkPropertySet,
+    SEQUENCER_OT_DeinterlaceSelectedMovies,
+    SEQUENCER_OT_ReverseSelectedMovies,
+    SEQUENCER_OT_FlipXSelectedMovies,
+    SEQUENCER_OT_FlipYSelectedMovies,
+    SEQUENCER_OT_ShowWaveformSelectedSounds,
+    SEQUENCER_OT_SelectTimeCursor,
+    SEQUENCER_OT_SelectChannel,
+    SEQUENCER_OT_SelectAllLockedStrips,
+    SEQUENCER_OT_SelectAllMuteStrips,
+    SEQUENCER_OT_SelectQuery,
+    SEQUENCER_OT_SaveQuery,
+    SEQUENCER_OT_RemoveQuery,
+    SEQUENCER_OT_SelectionSet,
+    SEQUENCER_OT_ToggleAllModifiers,
+    SEQUENCER_OT_AudioMuteToggle,
+    SEQUENCER_OT_SetPreviewRange,
+    SEQUENCER_OT_PreviewSelected,
+    SEQUENCER_OT_SplitExtract,
+    SEQUENCER_OT_SplitLift,
+    SEQUENCER_OT_DeleteLift, 
+    SEQUENCER_OT_RippleDelete, 
+    SEQUENCER_OT_ZoomVertical,
+    SEQUENCER_OT_MatchFrame,
+    SEQUENCER_OT_Split,  
+    SEQUENCER_OT_ExtendToFill,  
+    SEQUENCER_OT_Move,
+    SEQUENCER_OT_Concatenate,
+    SEQUENCER_OT_SplitMode,
+    SEQUENCER_OT_ViewChannel,
+    SEQUENCER_OT_PackChannels,
+    SEQUENCER_OT_BackgroundJobCancel,
+    SEQUENCER_OT_BackgroundJobDismiss,
+    SEQUENCER_OT_ProxyFarm,
+    SEQUENCER_OT_ProxyShare,
+    SEQUENCER_OT_ProxyReport,
+    SEQUENCER_OT_ProxyClean,
+    SEQUENCER_OT_ProxyBuildMissing,
+    SEQUENCER_OT_PlaybackGovernor,
+    SEQUENCER_OT_PlaybackMonitor,
+    SEQUENCER_OT_PlaybackMonitorExport,
+    SEQUENCER_OT_ProfileStrips,
+    SEQUENCER_OT_BakeStrips,
+    SEQUENCER_OT_BakeRestore,
+    SEQUENCER_OT_FrameCacheBuild,
+    SEQUENCER_OT_FrameCacheClear,
+    SEQUENCER_OT_PreviewWarmup,
+    SEQUENCER_OT_SegmentedRender,
+    SEQUENCER_OT_SmartRender,
+    SEQUENCER_OT_ExportFiltergraph,
+    SEQUENCER_OT_ChunkedMixdown,
+    SEQUENCER_OT_PeakWaveforms,
+    SEQUENCER_OT_LoudnessAnalyze,
+    SEQUENCER_OT_LoudnessNormalize,
+    SEQUENCER_OT_DuckMusic,
+    SEQUENCER_OT_RemoveSilence,
+    SEQUENCER_OT_DetectShots,
+    SEQUENCER_OT_DetectDuplicateFrames,
+)
+
+
+# Application handlers of this module, (handler list, function).
+_handlers = (
+    ("load_post", _timeline_index_load_post),
+    ("undo_post", _timeline_index_undo),
+    ("redo_post", _timeline_index_undo),
+    ("depsgraph_update_post", _bake_depsgraph_update),
+    ("load_post", _bake_load_post),
+    ("load_post", _preview_warmup_load_post),
+)
+
+
+def _handler_remove(handler_list, handler):
+    # Match by name, a reload of this module leaves copies of older functions.
+    for h in list(handler_list):
+        if getattr(h, "__name__", None) == handler.__name__:
+            handler_list.remove(h)
+
+
+def register():
+    for name, handler in _handlers:
+        handler_list = getattr(bpy.app.handlers, name)
+        _handler_remove(handler_list, handler)
+        handler_list.append(handler)
+    _timeline_index_subscribe()
+    preview_warmup.subscribe()
+
+
+def unregister():
+    for name, handler in _handlers:
+        _handler_remove(getattr(bpy.app.handlers, name), handler)
+    bpy.msgbus.clear_by_owner(timeline_index)
+    bpy.msgbus.clear_by_owner(preview_warmup)
+    preview_warmup.stop()
+    # The playback toggles add the clock handler and timer while enabled.
+    if playback_governor.enabled:
+        playback_governor.enable(False)
+    if bpy.app.timers.is_registered(playback_governor._poll):
+        bpy.app.timers.unregister(playback_governor._poll)
+    playback_monitor.enable(False)
+    _handler_remove(bpy.app.handlers.frame_change_post, _playback_clock_frame_change)
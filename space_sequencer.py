@@ -25,6 +25,18 @@ from .properties_grease_pencil_common import (
     GreasePencilToolsPanel,
 )
 from bpy.app.translations import pgettext_iface as iface_
+from bl_operators.sequencer import (
+    background_jobs,
+    job_messages,
+    format_bytes,
+    frame_cache,
+    loudness,
+    playback_governor,
+    playback_monitor,
+    proxy_build_stats,
+    proxy_report,
+    timeline_index,
+)
 
 
 def act_strip(context):
@@ -97,6 +109,23 @@ class SEQUENCER_HT_header(Header):
 
         layout.template_running_jobs()
 
+        for i, job in enumerate(background_jobs):
+            row = layout.row(align=True)
+            row.label(text="%s %d/%d" % (job.label, job.done + job.failed, job.total))
+            row.operator("sequencer.background_job_cancel", text="", icon='X', emboss=False).index = i
+
+        for i, (label, message, failed) in enumerate(job_messages):
+            row = layout.row(align=True)
+            row.label(text="%s: %s" % (label, message), icon='ERROR' if failed else 'INFO', translate=False)
+            row.operator("sequencer.background_job_dismiss", text="", icon='X', emboss=False).index = i
+
+        if playback_governor.enabled and playback_governor.spaces:
+            layout.label(
+                text="%s %.1f fps" % (playback_governor.label, playback_governor.fps),
+                icon='PREVIEW_RANGE',
+                translate=False,
+            )
+
         if st.view_type in {'SEQUENCER', 'SEQUENCER_PREVIEW'}:
             layout.separator()
         
@@ -174,8 +203,13 @@ class SEQUENCER_MT_view_render(Menu):
         props = layout.operator("render.opengl", text="Viewport Render Animation", icon='RENDER_ANIMATION')
         props.animation = True
         props.sequencer = True
+        layout.operator("sequencer.segmented_render", icon='RENDER_ANIMATION')
+        layout.operator("sequencer.smart_render", icon='RENDER_ANIMATION')
+        layout.operator("sequencer.smart_render", text="Smart Render Analysis").analyze_only = True
+        layout.operator("sequencer.export_filtergraph", icon='EXPORT')
         layout.separator()        
         layout.operator("sound.mixdown", text="Audio", icon='FILE_SOUND')        
+        layout.operator("sequencer.chunked_mixdown", text="Audio (Chunked)", icon='FILE_SOUND')
 
 
 class SEQUENCER_MT_view_toggle(Menu):
@@ -362,6 +396,7 @@ class SEQUENCER_MT_transform_gaps(Menu):
         layout.operator("sequencer.gap_remove", text = "Extract at Playhead").all=False
         layout.operator("sequencer.gap_remove", text = "Extract All").all=True   
         layout.operator("sequencer.concatenate", text = "Extract after Selection") 
+        layout.operator("sequencer.remove_silence", text = "Extract Silences in Selection")
         
         layout.separator()
                             
@@ -401,6 +436,7 @@ class SEQUENCER_MT_transform(Menu):
         layout.separator()
 
         layout.menu("SEQUENCER_MT_transform_gaps")
+        layout.operator("sequencer.pack_channels")
 
         layout.separator()
         
@@ -525,6 +561,7 @@ class SEQUENCER_MT_select(Menu):
 
         layout.operator("sequencer.select_all_locked_strips", text = "Locked")
         layout.operator("sequencer.select_all_mute_strips", text ="Muted/Hidden")
+        layout.operator("sequencer.select_query", text="Query...").query = ""
         
         layout.separator()
         
@@ -705,10 +742,7 @@ class SEQUENCER_MT_add_transitions(Menu):
     bl_label = "Transitions"
 
     def draw(self, context):
-        if context.selected_sequences:
-            selected_seq = len(context.selected_sequences)
-        else:
-            selected_seq = 0
+        selected_seq = timeline_index.selected_count(context.scene)
 
         layout = self.layout
 
@@ -730,10 +764,7 @@ class SEQUENCER_MT_add_effect(Menu):
     bl_label = "Effect Strip"
 
     def draw(self, context):
-        if context.selected_sequences:
-            selected_seq = len(context.selected_sequences)
-        else:
-            selected_seq = 0
+        selected_seq = timeline_index.selected_count(context.scene)
 
         layout = self.layout
         layout.operator_context = 'INVOKE_REGION_WIN'
@@ -857,6 +888,13 @@ class SEQUENCER_MT_strip_movie(Menu):
 
         layout.operator("sequencer.rendersize")  
 
+        layout.separator()
+
+        layout.operator("sequencer.detect_shots", text = "Shots to Markers").output = 'MARKERS'
+        layout.operator("sequencer.detect_shots", text = "Split at Shots").output = 'SPLIT'
+        layout.operator("sequencer.detect_duplicate_frames", text = "Report Duplicate Frames").output = 'REPORT'
+        layout.operator("sequencer.detect_duplicate_frames", text = "Split at Duplicate Frames").output = 'SPLIT'
+
 
 class SEQUENCER_MT_strip_mute(Menu):
     bl_label = "Mute/Hide"
@@ -951,6 +989,8 @@ class SEQUENCER_MT_strip(Menu):
                     
                     #layout.prop(strip, "show_waveform") # only for active strip, but with checkbox.
                     layout.operator("sequencer.show_waveform_selected_sounds", text = "Toggle Draw Waveform")
+                layout.operator("sequencer.peak_waveforms", text = "Toggle Cached Waveforms")
+                layout.operator("sequencer.duck_music", text = "Duck Music Under Selection")
 
             if stype != 'SOUND':
 
@@ -961,11 +1001,16 @@ class SEQUENCER_MT_strip(Menu):
                 layout.operator("sequencer.toggle_all_modifiers", text ="Toggle All Modifiers")
                                         
         layout.separator()
+
+        layout.operator("sequencer.bulk_property_set", text="Set Property...")
                 
         #layout.operator("sequencer.offset_clear") #Replaced by match frame
         layout.operator("sequencer.match_frame")
        
         layout.operator("sequencer.rebuild_proxy")
+        layout.operator("sequencer.proxy_farm")
+        layout.operator("sequencer.bake_strips")
+        layout.operator("sequencer.bake_restore")
 
         layout.separator()
 
@@ -999,6 +1044,71 @@ class SequencerButtonsPanel_Output:
         return cls.has_preview(context)
 
 
+class SEQUENCER_PT_select_query(SequencerButtonsPanel, Panel):
+    bl_label = "Select by Query"
+    bl_category = "Select"
+
+    @classmethod
+    def poll(cls, context):
+        return cls.has_sequencer(context) and context.scene.sequence_editor
+
+    def draw(self, context):
+        layout = self.layout
+        scene = context.scene
+
+        row = layout.row(align=True)
+        if "vse_query" in scene:
+            row.prop(scene, '["vse_query"]', text="")
+            row.operator("sequencer.select_query", text="", icon='VIEWZOOM').query = scene["vse_query"]
+        else:
+            row.operator("sequencer.select_query", text="Query...", icon='VIEWZOOM')
+        row.operator("sequencer.save_query", text="", icon='ADD')
+
+        queries = scene.get("vse_saved_queries")
+        if queries:
+            col = layout.column(align=True)
+            for name, query in queries.items():
+                row = col.row(align=True)
+                row.operator("sequencer.select_query", text=name).query = query
+                row.operator("sequencer.remove_query", text="", icon='X').name = name
+
+
+class SEQUENCER_PT_selection_sets(SequencerButtonsPanel, Panel):
+    bl_label = "Selection Sets"
+    bl_category = "Select"
+
+    @classmethod
+    def poll(cls, context):
+        return cls.has_sequencer(context) and context.scene.sequence_editor
+
+    def draw(self, context):
+        layout = self.layout
+        scene = context.scene
+
+        props = layout.operator("sequencer.selection_set", text="Save Selection...", icon='ADD')
+        props.action = 'SAVE'
+        props.name = ""
+
+        selection_sets = scene.get("vse_selection_sets")
+        if selection_sets:
+            col = layout.column(align=True)
+            for name in selection_sets.keys():
+                row = col.row(align=True)
+                props = row.operator("sequencer.selection_set", text=name)
+                props.action = 'RECALL'
+                props.name = name
+                for action, icon in (
+                        ('UNION', 'ADD'),
+                        ('INTERSECT', 'SELECT_INTERSECT'),
+                        ('SUBTRACT', 'REMOVE'),
+                        ('SAVE', 'FILE_REFRESH'),
+                        ('REMOVE', 'X'),
+                ):
+                    props = row.operator("sequencer.selection_set", text="", icon=icon)
+                    props.action = action
+                    props.name = name
+
+
 class SEQUENCER_PT_edit(SequencerButtonsPanel, Panel):
     bl_label = "Edit Strip"
     bl_category = "Strip"
@@ -1017,6 +1127,11 @@ class SEQUENCER_PT_edit(SequencerButtonsPanel, Panel):
         row.prop(strip, "name", text=""+strip.type.title()+"")
         row.prop(strip, "lock", toggle=True, icon_only=True)
 
+        if "vse_bake" in strip:
+            row = layout.row(align=True)
+            row.label(text="Baked from %s" % strip["vse_bake"]["source"], icon='RENDER_RESULT', translate=False)
+            row.operator("sequencer.bake_restore", text="", icon='LOOP_BACK')
+
         if strip.type != 'SOUND':
 
             layout.prop(strip, "blend_type", text="Blend")
@@ -1378,6 +1493,24 @@ class SEQUENCER_PT_sound(SequencerButtonsPanel, Panel):
 
             layout.prop(sound, "use_memory_cache")
 
+            layout.separator()
+            result = loudness(bpy.path.abspath(sound.filepath))
+            col = layout.column(align=True)
+            if result:
+                for label, key, unit in (
+                        ("Loudness", "lufs", "LUFS"),
+                        ("True Peak", "true_peak", "dBTP"),
+                        ("RMS", "rms", "dBFS"),
+                ):
+                    value = result[key]
+                    split = col.split(factor=0.4, align=True)
+                    split.alignment = 'RIGHT'
+                    split.label(text=label)
+                    split.label(text="-inf" if value is None else "%.1f %s" % (value, unit))
+            row = layout.row(align=True)
+            row.operator("sequencer.loudness_analyze", text="Analyze")
+            row.operator("sequencer.loudness_normalize", text="Normalize")
+
 
 class SEQUENCER_PT_scene(SequencerButtonsPanel, Panel):
     bl_label = "Scene"
@@ -1702,6 +1835,229 @@ class SEQUENCER_PT_proxy(SequencerButtonsPanel, Panel):
         col = layout.column()
         col.operator("sequencer.enable_proxies")
         col.operator("sequencer.rebuild_proxy")
+        col.operator("sequencer.proxy_farm")
+        col.operator("sequencer.proxy_share")
+
+        passes = proxy_build_stats().get((context.scene.name, strip.name))
+        if passes:
+            frames = passes[0]["frames"]
+            seconds = sum(p["seconds"] for p in passes)
+            sizes = sorted(size for p in passes for size in p["sizes"])
+            col.label(
+                text="Last build: %s%% in %d pass(es)" % ("/".join(str(size) for size in sizes), len(passes)),
+                translate=False,
+            )
+            col.label(
+                text="%d frames, %.1fs, %.1f fps" % (frames, seconds, frames / max(seconds, 1e-6)),
+                translate=False,
+            )
+
+
+class SEQUENCER_PT_proxy_report(SequencerButtonsPanel, Panel):
+    bl_label = "Proxy Report"
+    bl_category = "Strip"
+    bl_options = {'DEFAULT_CLOSED'}
+
+    @classmethod
+    def poll(cls, context):
+        return cls.has_sequencer(context) and context.scene.sequence_editor
+
+    def draw(self, context):
+        layout = self.layout
+
+        row = layout.row(align=True)
+        row.operator("sequencer.proxy_report", icon='FILE_REFRESH')
+        row.operator("sequencer.proxy_build_missing", text="Build Missing")
+
+        if not proxy_report:
+            return
+
+        col = layout.column(align=True)
+        size = proxy_report["render_size"]
+        col.label(text="Needed: %s" % ("%d%%" % size if size else "enabled sizes"), translate=False)
+        col.label(text="Proxies: %s" % format_bytes(proxy_report["bytes"]), translate=False)
+        row = col.row()
+        row.label(
+            text="Stale: %s in %d folders" % (format_bytes(proxy_report["stale_bytes"]), len(proxy_report["stale"])),
+            translate=False,
+        )
+        row.operator("sequencer.proxy_clean", text="", icon='TRASH')
+
+        missing = proxy_report["missing"]
+        if missing:
+            col = layout.column(align=True)
+            col.label(text="Missing (%d):" % len(missing), translate=False)
+            for scene_name, strip_name, size in missing[:20]:
+                col.label(text="%s  %d%%" % (strip_name, size), icon='SEQUENCE', translate=False)
+            if len(missing) > 20:
+                col.label(text="...", translate=False)
+
+
+class SEQUENCER_PT_playback_monitor(SequencerButtonsPanel, Panel):
+    bl_label = "Playback Monitor"
+    bl_category = "View"
+    bl_options = {'DEFAULT_CLOSED'}
+
+    @classmethod
+    def poll(cls, context):
+        return cls.has_sequencer(context) and context.scene.sequence_editor
+
+    def draw(self, context):
+        layout = self.layout
+
+        row = layout.row(align=True)
+        row.operator(
+            "sequencer.playback_monitor",
+            text="Recording" if playback_monitor.enabled else "Record",
+            icon='REC',
+            depress=playback_monitor.enabled,
+        ).action = 'TOGGLE'
+        row.operator("sequencer.playback_monitor", text="", icon='TRASH').action = 'CLEAR'
+        row.operator("sequencer.playback_monitor_export", text="", icon='EXPORT')
+
+        stats = playback_monitor.stats()
+        if not stats:
+            return
+
+        col = layout.column(align=True)
+        col.label(text="Frames: %d at %.2f fps" % (stats["frames"], playback_monitor.fps), translate=False)
+        col.label(
+            text="Min %.1f  Mean %.1f  P95 %.1f ms" % (stats["min"] * 1000, stats["mean"] * 1000, stats["p95"] * 1000),
+            translate=False,
+        )
+        col.label(text="Dropped: %d  Slow: %d" % (stats["dropped"], stats["slow"]), translate=False)
+
+        scene = bpy.data.scenes.get(playback_monitor.scene_name)
+        slow_strips = playback_monitor.slow_strips(scene, limit=8) if scene else []
+        if slow_strips:
+            col = layout.column(align=True)
+            col.label(text="Showing on slow frames:")
+            for name, hits, seconds in slow_strips:
+                col.label(text="%s  %d frames, %.0f ms" % (name, hits, seconds * 1000), icon='SEQUENCE', translate=False)
+
+
+class SEQUENCER_PT_render_cost(SequencerButtonsPanel, Panel):
+    bl_label = "Render Cost"
+    bl_category = "View"
+    bl_options = {'DEFAULT_CLOSED'}
+
+    @classmethod
+    def poll(cls, context):
+        return cls.has_sequencer(context) and context.scene.sequence_editor
+
+    def draw(self, context):
+        layout = self.layout
+        scene = context.scene
+
+        layout.operator("sequencer.profile_strips", icon='TIME')
+
+        profile = scene.get("vse_render_cost")
+        if not profile:
+            return
+
+        budget = 1000.0 * scene.render.fps_base / scene.render.fps
+        col = layout.column(align=True)
+        col.label(text="Frame budget: %.1f ms" % budget, translate=False)
+        ranked = sorted(profile.items(), key=lambda item: -item[1]["self_ms"])
+        for name, cost in ranked[:15]:
+            row = col.row(align=True)
+            row.alert = cost["self_ms"] > budget
+            row.label(text=name, icon='SEQUENCE', translate=False)
+            row.label(text="%.1f ms" % cost["self_ms"], translate=False)
+            if cost["hint"]:
+                row.label(text=cost["hint"], icon='INFO')
+
+
+class SEQUENCER_PT_frame_cache(SequencerButtonsPanel, Panel):
+    bl_label = "Frame Cache"
+    bl_category = "View"
+    bl_options = {'DEFAULT_CLOSED'}
+
+    @classmethod
+    def poll(cls, context):
+        return cls.has_sequencer(context) and context.scene.sequence_editor
+
+    def draw(self, context):
+        layout = self.layout
+        scene = context.scene
+
+        row = layout.row(align=True)
+        row.operator("sequencer.frame_cache_build", icon='RENDER_ANIMATION')
+        row.operator("sequencer.frame_cache_clear", text="", icon='TRASH')
+
+        row = layout.row(align=True)
+        row.operator("sequencer.preview_warmup", icon='PREVIEW_RANGE').auto = False
+        row.operator(
+            "sequencer.preview_warmup",
+            text="",
+            icon='AUTO',
+            depress=bool(scene.get("vse_auto_warmup")),
+        ).auto = True
+
+        if "vse_frame_cache_mb" in scene:
+            layout.prop(scene, '["vse_frame_cache_mb"]', text="Budget (MB)")
+
+        cache = frame_cache(scene) if bpy.data.filepath else None
+        if cache is None:
+            layout.label(text="Save the file to use the frame cache")
+            return
+        col = layout.column(align=True)
+        col.label(text="%d frames, %s" % (len(cache.entries), format_bytes(cache.used)), translate=False)
+        if cache.hits or cache.misses:
+            col.label(text="Hits: %d  Misses: %d" % (cache.hits, cache.misses), translate=False)
+
+
+class SEQUENCER_PT_mixdown(SequencerButtonsPanel, Panel):
+    bl_label = "Mixdown"
+    bl_category = "View"
+    bl_options = {'DEFAULT_CLOSED'}
+
+    @classmethod
+    def poll(cls, context):
+        return cls.has_sequencer(context) and context.scene.sequence_editor
+
+    def draw(self, context):
+        layout = self.layout
+        scene = context.scene
+
+        layout.operator("sequencer.chunked_mixdown", icon='FILE_SOUND')
+
+        timings = scene.get("vse_mixdown_timings")
+        if not timings:
+            return
+        col = layout.column(align=True)
+        col.label(text="Last mixdown: %.1fs" % timings["seconds"], translate=False)
+        if timings.get("failed"):
+            col.label(text="%d chunks failed" % timings["failed"], icon='ERROR', translate=False)
+        for start, end, seconds in timings["chunks"]:
+            col.label(text="%d - %d: %.2fs" % (start, end, seconds), translate=False)
+
+
+class SEQUENCER_PT_duplicate_frames(SequencerButtonsPanel, Panel):
+    bl_label = "Duplicate Frames"
+    bl_category = "View"
+    bl_options = {'DEFAULT_CLOSED'}
+
+    @classmethod
+    def poll(cls, context):
+        return cls.has_sequencer(context) and context.scene.sequence_editor
+
+    def draw(self, context):
+        layout = self.layout
+        scene = context.scene
+
+        layout.operator("sequencer.detect_duplicate_frames")
+
+        report = scene.get("vse_duplicate_frames")
+        if not report:
+            return
+        for name, runs in report.items():
+            col = layout.column(align=True)
+            col.label(text="%s: %d" % (name, len(runs)), icon='SEQUENCE', translate=False)
+            for start, end in list(runs)[:20]:
+                col.label(text="%d - %d" % (start, end - 1), translate=False)
+            if len(runs) > 20:
+                col.label(text="...", translate=False)
 
 
 class SEQUENCER_PT_preview(SequencerButtonsPanel_Output, Panel):
@@ -1746,6 +2102,11 @@ class SEQUENCER_PT_view(SequencerButtonsPanel_Output, Panel):
         col = layout.column()
         col.separator()
         col.prop(st, "proxy_render_size")
+        col.operator(
+            "sequencer.playback_governor",
+            text="Adaptive Preview Size",
+            depress=playback_governor.enabled,
+        )
 
 
 class SEQUENCER_PT_view_safe_areas(SequencerButtonsPanel_Output, Panel):
@@ -1918,6 +2279,8 @@ classes = (
     SEQUENCER_MT_navigation_strip,
     SEQUENCER_MT_navigation_keyframe,  
     SEQUENCER_MT_marker,    
+    SEQUENCER_PT_select_query,
+    SEQUENCER_PT_selection_sets,
     SEQUENCER_PT_edit,
     SEQUENCER_PT_effect,
     SEQUENCER_PT_input,
@@ -1927,6 +2290,12 @@ classes = (
     SEQUENCER_PT_filter,
     SEQUENCER_PT_data,
     SEQUENCER_PT_proxy,
+    SEQUENCER_PT_proxy_report,
+    SEQUENCER_PT_playback_monitor,
+    SEQUENCER_PT_render_cost,
+    SEQUENCER_PT_frame_cache,
+    SEQUENCER_PT_mixdown,
+    SEQUENCER_PT_duplicate_frames,
     SEQUENCER_PT_preview,
     SEQUENCER_PT_view,
     SEQUENCER_PT_view_safe_areas,
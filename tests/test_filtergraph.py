@@ -0,0 +1,134 @@
+# ##### BEGIN GPL LICENSE BLOCK #####
+#
+#  This program is free software; you can redistribute it and/or
+#  modify it under the terms of the GNU General Public License
+#  as published by the Free Software Foundation; either version 2
+#  of the License, or (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program; if not, write to the Free Software Foundation,
+#  Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301, USA.
+#
+# ##### END GPL LICENSE BLOCK #####
+
+# <pep8 compliant>
+
+# Run with:
+#   blender --background --factory-startup --python-exit-code 1 --python tests/test_filtergraph.py
+
+import sys
+import unittest
+
+from bl_operators.sequencer import ffmpeg_filtergraph
+
+
+def movie(name, start, end, frame_start, channel=1, **kwargs):
+    data = {
+        "name": name,
+        "type": 'MOVIE',
+        "channel": channel,
+        "start": start,
+        "end": end,
+        "frame_start": frame_start,
+        "modifiers": 0,
+        "animated": [],
+        "blend_alpha": 1.0,
+        "transformed": False,
+        "filepath": "/media/%s.mp4" % name,
+        "duration": 100,
+        "flip_x": False,
+        "flip_y": False,
+        "reverse": False,
+    }
+    data.update(kwargs)
+    return data
+
+
+def timeline(*strips, start=1, end=51):
+    return {"fps": 25.0, "width": 1920, "height": 1080, "start": start, "end": end, "strips": list(strips)}
+
+
+class FiltergraphTest(unittest.TestCase):
+
+    def assertGraph(self, result, graph):
+        self.assertEqual(result["problems"], [])
+        self.assertEqual(result["graph"], graph)
+
+    def test_movie(self):
+        result = ffmpeg_filtergraph(timeline(movie("a", 1, 51, -9)))
+        self.assertEqual(result["inputs"], ["/media/a.mp4"])
+        self.assertEqual(result["video"], "vout")
+        self.assertGraph(result, (
+            "[0:v]trim=start_frame=10:end_frame=60,setpts=N/(25*TB),fps=25,scale=1920:1080,setsar=1[v0];\n"
+            "[v0]trim=start_frame=0:end_frame=50,setpts=PTS-STARTPTS[vout]\n"
+        ))
+
+    def test_reverse(self):
+        # Frames 10 to 59 of the strip show source frames 89 down to 40.
+        result = ffmpeg_filtergraph(timeline(movie("a", 1, 51, -9, reverse=True)))
+        self.assertGraph(result, (
+            "[0:v]trim=start_frame=40:end_frame=90,reverse,setpts=N/(25*TB),fps=25,scale=1920:1080,setsar=1[v0];\n"
+            "[v0]trim=start_frame=0:end_frame=50,setpts=PTS-STARTPTS[vout]\n"
+        ))
+
+    def test_gaps(self):
+        result = ffmpeg_filtergraph(timeline(movie("a", 11, 41, 11)))
+        self.assertGraph(result, (
+            "[0:v]trim=start_frame=0:end_frame=30,setpts=N/(25*TB),fps=25,scale=1920:1080,setsar=1[v0];\n"
+            "color=c=black:s=1920x1080:r=25:d=0.4[g0];\n"
+            "color=c=black:s=1920x1080:r=25:d=0.4[gend];\n"
+            "[g0][v0][gend]concat=n=3:v=1:a=0[vcat];\n"
+            "[vcat]trim=start_frame=0:end_frame=50,setpts=PTS-STARTPTS[vout]\n"
+        ))
+
+    def test_crossfade(self):
+        result = ffmpeg_filtergraph(timeline(
+            movie("a", 1, 31, 1),
+            movie("b", 21, 51, 11, channel=2),
+            {"name": "x", "type": 'CROSS', "channel": 3, "start": 21, "end": 31, "frame_start": 21,
+             "input_1": "a", "input_2": "b", "modifiers": 0, "animated": []},
+        ))
+        self.assertEqual(result["inputs"], ["/media/a.mp4", "/media/b.mp4"])
+        self.assertGraph(result, (
+            "[0:v]trim=start_frame=0:end_frame=30,setpts=N/(25*TB),fps=25,scale=1920:1080,setsar=1[v0];\n"
+            "[1:v]trim=start_frame=10:end_frame=40,setpts=N/(25*TB),fps=25,scale=1920:1080,setsar=1[v1];\n"
+            "[v0][v1]xfade=transition=fade:duration=0.4:offset=0.8[x1];\n"
+            "[x1]trim=start_frame=0:end_frame=50,setpts=PTS-STARTPTS[vout]\n"
+        ))
+
+    def test_overlap_without_crossfade(self):
+        result = ffmpeg_filtergraph(timeline(movie("a", 1, 31, 1), movie("b", 21, 51, 11, channel=2)))
+        self.assertEqual(result["problems"], [("b", "overlaps a without a crossfade")])
+        self.assertEqual(result["graph"], "")
+
+    def test_still_frames(self):
+        result = ffmpeg_filtergraph(timeline(movie("a", 1, 21, 11), movie("b", 21, 51, -69)))
+        self.assertEqual(result["problems"], [
+            ("a", "still frames are not supported"),
+            ("b", "still frames are not supported"),
+        ])
+        self.assertEqual(result["graph"], "")
+
+    def test_sound_volume_keys(self):
+        result = ffmpeg_filtergraph(timeline({
+            "name": "s", "type": 'SOUND', "channel": 1, "start": 11, "end": 41, "frame_start": 1,
+            "modifiers": 0, "animated": ["volume"], "filepath": "/media/s.wav",
+            "volume": 1.0, "volume_keys": [(11, 0.0), (21, 1.0)], "pan": 0.0, "pitch": 1.0,
+        }))
+        self.assertEqual(result["video"], None)
+        self.assertEqual(result["audio"], "aout")
+        self.assertGraph(result, (
+            "[0:a]atrim=start=0.4:end=1.6,asetpts=PTS-STARTPTS,"
+            "volume='if(lt(t,0),0,if(lt(t,0.4),0+(2.5)*(t-0),1))':eval=frame,adelay=400|400[a0];\n"
+            "[a0]amix=inputs=1:duration=longest:dropout_transition=0:normalize=0,atrim=end=2[aout]\n"
+        ))
+
+
+if __name__ == "__main__":
+    sys.argv = [__file__] + (sys.argv[sys.argv.index("--") + 1:] if "--" in sys.argv else [])
+    unittest.main()